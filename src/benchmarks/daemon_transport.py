@@ -0,0 +1,211 @@
+"""
+Bundle submission cost to a local IBRDTN daemon through the TCP loopback
+and through a Unix domain socket, with the synchronous and the pipelined
+client.
+
+Usage (from the src directory):
+
+    python -m benchmarks.daemon_transport [--bundles 2000] [--warmup 100]
+        [--payload-sizes 256,4096,65536] [--pipeline-depth 32] [--json]
+
+The daemon is the local IBRDTN stand-in (see
+communication_module.ibrdtn_stand_in), without injected faults. The CPU
+time is the whole process one, the stand-in included.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+
+from sensor_node.communication_module.ibrdtn_daemon import IbrdtnDaemon
+from sensor_node.communication_module.async_ibrdtn_daemon import (
+    AsyncIbrdtnDaemon,
+)
+from sensor_node.communication_module.ibrdtn_stand_in import IbrdtnStandIn
+from sensor_node.communication_module.message import Message
+
+
+TRANSPORTS = ("tcp", "unix")
+CLIENTS = ("sync", "pipelined")
+
+APP_SOURCE = "benchmark"
+DESTINATION_EID = "dtn://gateway.dtn/readings"
+
+
+def _send_sync(host=None, port=None, messages=None, pipeline_depth=None):
+    client = IbrdtnDaemon(
+        address=host,
+        port=port,
+        app_source=APP_SOURCE,
+        destination_eid=DESTINATION_EID,
+    )
+    client.create_connection(max_tries=1, retry_interval=0)
+    try:
+        started_at = time.perf_counter()
+        cpu_started_at = time.process_time()
+        for message in messages:
+            client.send_message(message)
+
+        return (
+            time.perf_counter() - started_at,
+            time.process_time() - cpu_started_at,
+        )
+    finally:
+        client.close_connection()
+
+
+def _send_pipelined(host=None, port=None, messages=None, pipeline_depth=32):
+    client = AsyncIbrdtnDaemon(
+        address=host,
+        port=port,
+        app_source=APP_SOURCE,
+        destination_eid=DESTINATION_EID,
+        max_in_flight=pipeline_depth,
+    )
+
+    async def send():
+        await client.create_connection(max_tries=1, retry_interval=0)
+        try:
+            started_at = time.perf_counter()
+            cpu_started_at = time.process_time()
+            if await client.send_many(messages) != len(messages):
+                raise RuntimeError("Bundles not delivered.")
+
+            return (
+                time.perf_counter() - started_at,
+                time.process_time() - cpu_started_at,
+            )
+        finally:
+            await client.close_connection()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(send())
+    finally:
+        loop.close()
+
+
+SENDERS = {"sync": _send_sync, "pipelined": _send_pipelined}
+
+
+def _payload(size=None):
+    """
+    Returns a binary payload of size bytes.
+    """
+    return (bytes(range(256)) * (size // 256 + 1))[:size]
+
+
+def run(
+    bundles=2000,
+    warmup=100,
+    payload_sizes=(256, 4096, 65536),
+    pipeline_depth=32,
+):
+    """
+    Returns a list with the benchmark results, one dict per transport,
+    client and payload size.
+    """
+    results = []
+    work_directory = tempfile.TemporaryDirectory(prefix="benchmark-")
+    devnull = open(os.devnull, "w")
+    try:
+        for transport in TRANSPORTS:
+            if transport == "unix":
+                host = "unix://" + os.path.join(
+                    work_directory.name, "ibrdtn.sock"
+                )
+            else:
+                host = "127.0.0.1"
+            stand_in = IbrdtnStandIn(host=host)
+            stand_in.start_thread()
+            try:
+                for client in CLIENTS:
+                    for payload_size in payload_sizes:
+                        message = Message(
+                            payload=_payload(payload_size),
+                            custody=False,
+                            lifetime=259200,
+                        )
+                        with contextlib.redirect_stdout(devnull):
+                            SENDERS[client](
+                                host,
+                                stand_in.port,
+                                [message] * warmup,
+                                pipeline_depth,
+                            )
+                            wall_time, cpu_time = SENDERS[client](
+                                host,
+                                stand_in.port,
+                                [message] * bundles,
+                                pipeline_depth,
+                            )
+
+                        results.append(
+                            {
+                                "transport": transport,
+                                "client": client,
+                                "payload_bytes": payload_size,
+                                "bundles_per_second": bundles / wall_time,
+                                "wall_us_per_bundle": (
+                                    wall_time / bundles * 1e6
+                                ),
+                                "cpu_us_per_bundle": cpu_time / bundles * 1e6,
+                            }
+                        )
+            finally:
+                stand_in.stop_thread()
+    finally:
+        devnull.close()
+        work_directory.cleanup()
+
+    return results
+
+
+def _print_table(results=None):
+    print(
+        "{:<6}{:<11}{:>9}{:>12}{:>10}{:>10}".format(
+            "via", "client", "payload", "bundles/s", "wall us", "CPU us"
+        )
+    )
+    for result in results:
+        print(
+            "{transport:<6}{client:<11}{payload_bytes:>9}"
+            "{bundles_per_second:>12.0f}{wall_us_per_bundle:>10.1f}"
+            "{cpu_us_per_bundle:>10.1f}".format(**result)
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--bundles", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--payload-sizes", default="256,4096,65536")
+    parser.add_argument("--pipeline-depth", type=int, default=32)
+    parser.add_argument(
+        "--json", action="store_true", help="print results as JSON"
+    )
+    args = parser.parse_args(argv)
+
+    if args.bundles < 1:
+        parser.error("--bundles must be a positive integer")
+
+    results = run(
+        bundles=args.bundles,
+        warmup=args.warmup,
+        payload_sizes=[int(size) for size in args.payload_sizes.split(",")],
+        pipeline_depth=args.pipeline_depth,
+    )
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Import time and memory of the sensor node entry point, checked against a
+budget.
+
+Usage (from the src directory):
+
+    python -m benchmarks.import_time [--module main] [--budget-ms 500]
+        [--top 10] [--repeat 5] [--json]
+
+Each run imports the module in a fresh interpreter with "python -X
+importtime" (the best of --repeat runs is kept, so the disk cache is warm).
+It reports the total import time, the slowest imports it made (cumulative,
+nested imports included) and the peak RSS of the interpreter, and exits
+with status 1 when the total is over the budget. Run it on the sensor node
+itself (e.g. a Raspberry Pi), where the hardware libraries are installed.
+"""
+import os
+import sys
+import json
+import argparse
+import resource
+import subprocess
+
+
+def _import_times(module=None):
+    """
+    Imports module in a new interpreter. Returns a tuple with the module
+    cumulative import time (µs), the list of (cumulative µs, package) of
+    the imports it made and the interpreter peak RSS (in KiB).
+    """
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=os.getcwd(),
+    )
+    if process.returncode != 0:
+        raise RuntimeError(
+            "Failed to import {0}:\n{1}".format(module, process.stderr)
+        )
+    # Max RSS of the terminated children (Linux: KiB)
+    peak_rss = max(
+        usage_before, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+
+    # Lines are "import time: self [us] | cumulative | imported package",
+    # an import is listed after its nested imports (indented below it). The
+    # interpreter startup imports come first, at the top level.
+    nested = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _self, cumulative, package = line.split(":", 1)[1].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+
+        if package.startswith("  "):
+            nested.append((int(cumulative), package.strip()))
+        elif package.strip() == module:
+            return int(cumulative), nested, peak_rss
+        else:
+            nested = []
+
+    raise RuntimeError("No import time reported for {0}.".format(module))
+
+
+def run(module="main", repeat=5, top=10):
+    """
+    Returns a dict with the import time results of the best run.
+    """
+    best = None
+    peak_rss = 0
+    for _run in range(repeat):
+        total, imports, rss = _import_times(module)
+        peak_rss = max(peak_rss, rss)
+        if best is None or total < best[0]:
+            best = (total, imports)
+
+    total, imports = best
+
+    return {
+        "module": module,
+        "total_ms": total / 1000,
+        "peak_rss_kib": peak_rss,
+        "slowest": [
+            {"package": package, "cumulative_ms": cumulative / 1000}
+            for cumulative, package in sorted(imports, reverse=True)[:top]
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=500)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--json", action="store_true", help="print results as JSON"
+    )
+    args = parser.parse_args(argv)
+
+    result = run(module=args.module, repeat=args.repeat, top=args.top)
+    result["budget_ms"] = args.budget_ms
+    result["within_budget"] = result["total_ms"] <= args.budget_ms
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        print(
+            "import {module}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms), "
+            "peak RSS {peak_rss_kib} KiB".format(**result)
+        )
+        for entry in result["slowest"]:
+            print("{cumulative_ms:>10.1f} ms  {package}".format(**entry))
+
+    if not result["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
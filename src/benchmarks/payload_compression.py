@@ -0,0 +1,149 @@
+"""
+Payload size and CPU cost per bundle of the payload codecs, with and without
+compression.
+
+Usage (from the src directory):
+
+    python -m benchmarks.payload_compression [--batch-sizes 1,10,60]
+        [--repeat 200] [--json]
+
+Run it on the sensor node itself (e.g. a Raspberry Pi) to get the CPU cost
+on the target hardware. The CPU budget column is the share of a reading
+interval (SENSOR_NODE_READING_INTERVAL, 60 seconds by default) spent
+encoding one bundle.
+"""
+import sys
+import json
+import time
+import argparse
+
+from sensor_node.communication_module.payload_codec import (
+    create_payload_codec,
+    decode_payload,
+)
+
+from .readings import generate_payloads
+
+
+# (codec, compression) pairs measured
+CONFIGURATIONS = (
+    ("json", "none"),
+    ("json", "zlib"),
+    ("binary", "none"),
+    ("binary", "zlib"),
+    ("columnar", "none"),
+    ("columnar", "zlib"),
+)
+
+
+def _cpu_time_per_call(function=None, repeat=1):
+    """
+    Returns the mean CPU time (in seconds) of a function call.
+    """
+    started_at = time.process_time()
+    for _index in range(repeat):
+        function()
+
+    return (time.process_time() - started_at) / repeat
+
+
+def run(batch_sizes=(1, 10, 60), repeat=200, reading_interval=60):
+    """
+    Returns a list with the benchmark results, one dict per codec
+    configuration and batch size.
+    """
+    results = []
+
+    for batch_size in batch_sizes:
+        payloads = generate_payloads(count=batch_size)
+        legacy_size = sum(
+            len(json.dumps(payload).encode("UTF-8")) for payload in payloads
+        )
+
+        for codec_name, compression in CONFIGURATIONS:
+            codec = create_payload_codec(
+                name=codec_name, compression=compression
+            )
+            encoded = codec.encode(payloads)
+            if isinstance(encoded, str):
+                encoded = encoded.encode("UTF-8")
+
+            if decode_payload(encoded) != codec.decode(encoded):
+                raise RuntimeError("Inconsistent payload decoding.")
+
+            encode_time = _cpu_time_per_call(
+                lambda: codec.encode(payloads), repeat
+            )
+            decode_time = _cpu_time_per_call(
+                lambda: decode_payload(encoded), repeat
+            )
+
+            results.append(
+                {
+                    "codec": codec_name,
+                    "compression": compression,
+                    "batch_size": batch_size,
+                    "bytes": len(encoded),
+                    "bytes_per_reading": len(encoded) / batch_size,
+                    # Compared to one legacy JSON message per reading
+                    "ratio": legacy_size / len(encoded),
+                    "encode_cpu_us": encode_time * 1e6,
+                    "decode_cpu_us": decode_time * 1e6,
+                    "cpu_budget_percent": (
+                        encode_time / (reading_interval * batch_size) * 100
+                    ),
+                }
+            )
+
+    return results
+
+
+def _print_table(results=None):
+    print(
+        "{:<10}{:<7}{:>6}{:>8}{:>11}{:>8}{:>12}{:>12}{:>11}".format(
+            "codec",
+            "zip",
+            "batch",
+            "bytes",
+            "B/reading",
+            "ratio",
+            "encode us",
+            "decode us",
+            "budget %",
+        )
+    )
+    for result in results:
+        print(
+            "{codec:<10}{compression:<7}{batch_size:>6}{bytes:>8}"
+            "{bytes_per_reading:>11.1f}{ratio:>8.2f}{encode_cpu_us:>12.1f}"
+            "{decode_cpu_us:>12.1f}{cpu_budget_percent:>11.5f}".format(
+                **result
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--batch-sizes", default="1,10,60")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--reading-interval", type=int, default=60)
+    parser.add_argument(
+        "--json", action="store_true", help="print results as JSON"
+    )
+    args = parser.parse_args(argv)
+
+    results = run(
+        batch_sizes=[int(size) for size in args.batch_sizes.split(",")],
+        repeat=args.repeat,
+        reading_interval=args.reading_interval,
+    )
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+End-to-end benchmark of the sensor node pipeline: read the sensors, build
+the reading payload, encode it and send the bundle to the DTN daemon.
+
+Usage (from the src directory):
+
+    python -m benchmarks.pipeline [--cycles 200] [--warmup 10]
+        [--codec json] [--compression none] [--batch-readings 1] [--mq]
+        [--sensor-latency 0] [--error-rate 0] [--daemon-latency 0]
+        [--network-delay 0] [--pipeline-depth 0] [--transport tcp]
+        [--seed 0] [--json] [--output results.json]
+
+It runs off a Raspberry Pi: the sensors are the simulated backend (see
+sensing_module.sensors.simulation) and the daemon is the local IBRDTN
+stand-in (see communication_module.ibrdtn_stand_in). Readings are taken
+back-to-back (zero interval), the BME280 snapshot is not cached and the
+sensor node output is discarded. --transport unix connects to the daemon
+through a Unix domain socket instead of the TCP loopback.
+
+It reports the cycle latency percentiles, the readings per second, the
+bytes per reading (bundle payloads and on the wire, commands included), the
+wall and CPU time (whole process) per stage and the peak RSS. --json (or
+--output) writes the results as JSON, with the git commit, to compare
+commits.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import contextlib
+import subprocess
+
+
+# Node under benchmark: the settings below override the .env ones
+NODE_UUID = "7d9f3c52-5d0b-4c3e-9a1b-2f6c8e4a1d00"
+BENCHMARK_ENV = {
+    "SENSOR_NODE_UUID": NODE_UUID,
+    "SENSOR_NODE_READING_INTERVAL": "1",
+    "SENSOR_NODE_PIPELINE_ENABLED": "False",
+    "SENSOR_BACKEND": "simulated",
+    "SIMULATION_TRACE_PATH": "",
+    "SIMULATION_PMS7003_FRAME_INTERVAL": "0.05",
+    "DTN_DAEMON_ADDRESS": "127.0.0.1",
+    "DTN_DAEMON_ENDPOINTS": "",
+    "DTN_SENSOR_APP_SOURCE": "benchmark",
+    "DTN_DESTINATION_EID": "dtn://gateway.dtn/readings",
+    "DTN_DAEMON_RECONNECT_TRIES": "3",
+    "DTN_DAEMON_RECONNECT_INTERVAL": "0",
+    "MESSAGE_CUSTODY": "False",
+    "MESSAGE_LIFETIME": "259200",
+    "MESSAGE_BATCH_MAX_BYTES": "0",
+    "MESSAGE_BATCH_MAX_AGE": "0",
+    "BME280_I2C_ADDRESS": "0x76",
+    "BME280_SNAPSHOT_TTL": "0",
+    "BME280_SAMPLING_INTERVAL": "0",
+    "PMS7003_CALIBRATION_TIME": "0",
+    "PMS7003_UART_SERIAL_ADDRESS": "/dev/serial0",
+    "PMS7003_MIN_HUMIDITY": "0.0",
+    "PMS7003_MAX_HUMIDITY": "99.0",
+    "PMS7003_MIN_TEMPERATURE": "-10.0",
+    "PMS7003_MAX_TEMPERATURE": "60.0",
+    "PMS7003_DUTY_CYCLE_ENABLED": "False",
+    "PMS7003_SAMPLING_INTERVAL": "0",
+    "MQ_SAMPLING_INTERVAL": "0",
+    "MQ135_ENABLED": "False",
+    "MQ131_ENABLED": "False",
+}
+
+# MQ sensors (--mq), read from the background ADC samples
+MQ_ENV = {
+    "MQ135_ENABLED": "True",
+    "MQ131_ENABLED": "True",
+    "MQ_PREHEAT_TIME": "0",
+    "MQ_RO_REFRESH_ENABLED": "False",
+    "ADC_SAMPLING_ENABLED": "True",
+    "ADC_SAMPLING_INTERVAL": "0.1",
+    "ADC_SAMPLING_WINDOW": "2.5",
+    "MQ135_NAME": "MQ-135",
+    "MQ135_R1": "10000.0",
+    "MQ135_R2": "20000.0",
+    "MQ135_MQ_ADC_PIN": "0",
+    "MQ135_RL_VALUE": "30000.0",
+    "MQ135_RO_CLEAN_AIR": "1890.88",
+    "MQ135_A_EXPO": "556.166",
+    "MQ135_M_EXPO": "-3.885",
+    "MQ135_RSRO_CLEAN_AIR": "3.6",
+    "MQ135_MIN_CONCENTRATION": "10.0",
+    "MQ135_MAX_CONCENTRATION": "200.0",
+    "MQ135_MIN_HUMIDITY": "0.0",
+    "MQ135_MAX_HUMIDITY": "95.0",
+    "MQ135_MIN_TEMPERATURE": "-10.0",
+    "MQ135_MAX_TEMPERATURE": "45.0",
+    "MQ131_NAME": "MQ-131",
+    "MQ131_R1": "360000.0",
+    "MQ131_R2": "750000.0",
+    "MQ131_MQ_ADC_PIN": "1",
+    "MQ131_RL_VALUE": "1110000.0",
+    "MQ131_RO_CLEAN_AIR": "10706753.932",
+    "MQ131_A_EXPO": "10.229",
+    "MQ131_M_EXPO": "2.215",
+    "MQ131_RSRO_CLEAN_AIR": "1.0",
+    "MQ131_MIN_CONCENTRATION": "10.0",
+    "MQ131_MAX_CONCENTRATION": "1000.0",
+    "MQ131_MIN_HUMIDITY": "0.0",
+    "MQ131_MAX_HUMIDITY": "95.0",
+    "MQ131_MIN_TEMPERATURE": "-10.0",
+    "MQ131_MAX_TEMPERATURE": "50.0",
+}
+
+# Daemon API transports (see IbrdtnDaemon address)
+TRANSPORTS = ("tcp", "unix")
+
+# Stages of a cycle, "encode", "bundle" and "send" are part of "submit"
+# ("bundle" is part of "send" when pipelined)
+STAGES = ("read", "payload", "submit", "encode", "bundle", "send")
+
+
+class StageTimer:
+    """
+    Wall and CPU (time.process_time, every thread) seconds spent in each
+    stage.
+    """
+
+    def __init__(self):
+        self.wall = {stage: 0.0 for stage in STAGES}
+        self.cpu = {stage: 0.0 for stage in STAGES}
+        self.enabled = False
+
+    def wrap(self, stage=None, function=None):
+        """
+        Returns function, timed as stage while enabled.
+        """
+
+        def timed(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+
+            started_at = time.perf_counter()
+            cpu_started_at = time.process_time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.cpu[stage] += time.process_time() - cpu_started_at
+                self.wall[stage] += time.perf_counter() - started_at
+
+        return timed
+
+    def instrument(self, obj=None, name=None, stage=None):
+        """
+        Times the obj method name as stage.
+        """
+        setattr(obj, name, self.wrap(stage, getattr(obj, name)))
+
+
+def percentile(values=None, fraction=None):
+    """
+    Returns the fraction (0 to 1) percentile of the values, interpolated
+    between the closest ranks.
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower
+    )
+
+
+def git_commit():
+    """
+    Returns the checked out git commit, None outside a git repository.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    cycles=200,
+    warmup=10,
+    codec="json",
+    compression="none",
+    batch_readings=1,
+    mq=False,
+    sensor_latency=0,
+    error_rate=0,
+    daemon_latency=0,
+    network_delay=0,
+    pipeline_depth=0,
+    transport="tcp",
+    seed=0,
+):
+    """
+    Runs the benchmark, returns a dict with its results.
+    """
+    # The stand-in does not need the sensor node settings
+    from sensor_node.communication_module.ibrdtn_stand_in import (
+        IbrdtnStandIn,
+    )
+
+    if transport not in TRANSPORTS:
+        raise ValueError("Unknown daemon transport {0}.".format(transport))
+
+    work_directory = tempfile.TemporaryDirectory(prefix="benchmark-")
+    if transport == "unix":
+        host = "unix://" + os.path.join(work_directory.name, "ibrdtn.sock")
+    else:
+        host = BENCHMARK_ENV["DTN_DAEMON_ADDRESS"]
+    stand_in = IbrdtnStandIn(
+        host=host,
+        latency=daemon_latency,
+        network_delay=network_delay,
+        seed=seed,
+    )
+    stand_in.start_thread()
+
+    settings = dict(BENCHMARK_ENV)
+    if mq:
+        settings.update(MQ_ENV)
+    settings.update(
+        {
+            "DTN_DAEMON_ADDRESS": host,
+            "DTN_DAEMON_PORT": str(stand_in.port),
+            "OUTBOX_DATABASE_PATH": os.path.join(
+                work_directory.name, "outbox.sqlite3"
+            ),
+            "MQ_RO_STORE_PATH": os.path.join(
+                work_directory.name, "mq_ro.json"
+            ),
+            "MESSAGE_PAYLOAD_CODEC": codec,
+            "MESSAGE_PAYLOAD_COMPRESSION": compression,
+            "MESSAGE_BATCH_MAX_READINGS": str(batch_readings),
+            "DTN_DAEMON_PIPELINE_DEPTH": str(pipeline_depth),
+            "SIMULATION_SEED": str(seed),
+            "SIMULATION_LATENCY": str(sensor_latency),
+            "SIMULATION_ERROR_RATE": str(error_rate),
+        }
+    )
+    # Set before the sensor node modules are imported (and read the .env)
+    os.environ.update(settings)
+
+    from sensor_node.sensor_node import SensorNode
+
+    timer = StageTimer()
+    devnull = open(os.devnull, "w")
+    node = None
+    try:
+        with contextlib.redirect_stdout(devnull):
+            node = SensorNode()
+            sensing_module = node.sensing_module
+            communication_module = node.communication_module
+
+            timer.instrument(sensing_module, "read_sensors", "read")
+            timer.instrument(
+                node, "_generate_sensor_node_reading_payload", "payload"
+            )
+            timer.instrument(communication_module, "submit_payload", "submit")
+            timer.instrument(communication_module._codec, "encode", "encode")
+            dtn_client = communication_module._dtn_client
+            if pipeline_depth > 0:
+                # Bundles are created while sending them
+                timer.instrument(
+                    communication_module, "_deliver_many", "send"
+                )
+            else:
+                timer.instrument(dtn_client, "_create_bundle", "bundle")
+                timer.instrument(dtn_client, "_send_bundle", "send")
+
+            node.startup()
+            if not sensing_module.wait_until_ready(timeout=60):
+                raise RuntimeError("Simulated sensors not ready.")
+            # The PMS7003 frames buffer is emptied after its warm-up
+            ready_at = time.monotonic() + 10
+            while not _cycle_reading(node):
+                if time.monotonic() > ready_at:
+                    raise RuntimeError("No reading from simulated sensors.")
+                time.sleep(0.01)
+
+            for _cycle in range(warmup):
+                _cycle_reading(node)
+
+            bundles_before = len(stand_in.bundles)
+            bytes_before = stand_in.stats["bytes_received"]
+            resets_before = stand_in.stats["resets"]
+            latencies = []
+            readings = 0
+            timer.enabled = True
+            started_at = time.perf_counter()
+            cpu_started_at = time.process_time()
+
+            for _cycle in range(cycles):
+                cycle_started_at = time.perf_counter()
+                if _cycle_reading(node):
+                    readings += 1
+                latencies.append(time.perf_counter() - cycle_started_at)
+
+            # The readings of an incomplete batch are part of the run
+            communication_module.flush_batch(force=True)
+            elapsed = time.perf_counter() - started_at
+            cpu_time = time.process_time() - cpu_started_at
+            timer.enabled = False
+    finally:
+        with contextlib.redirect_stdout(devnull):
+            if node is not None:
+                node.sensing_module.stop_sampling()
+                node.communication_module.close_connections()
+        stand_in.stop_thread()
+        devnull.close()
+        work_directory.cleanup()
+
+    bundles = stand_in.bundles[bundles_before:]
+    wire_bytes = stand_in.stats["bytes_received"] - bytes_before
+    per_reading = max(readings, 1)
+
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {
+            "cycles": cycles,
+            "warmup": warmup,
+            "codec": codec,
+            "compression": compression,
+            "batch_readings": batch_readings,
+            "mq": mq,
+            "sensor_latency": sensor_latency,
+            "error_rate": error_rate,
+            "daemon_latency": daemon_latency,
+            "network_delay": network_delay,
+            "pipeline_depth": pipeline_depth,
+            "transport": transport,
+            "seed": seed,
+        },
+        "readings": readings,
+        "failed_readings": cycles - readings,
+        "bundles": len(bundles),
+        "daemon_resets": stand_in.stats["resets"] - resets_before,
+        "readings_per_second": readings / elapsed,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000,
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p90": percentile(latencies, 0.9) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "payload_bytes_per_reading": (
+            sum(len(bundle.payload) for bundle in bundles) / per_reading
+        ),
+        "wire_bytes_per_reading": wire_bytes / per_reading,
+        "cpu_ms_per_cycle": cpu_time / cycles * 1000,
+        "stages_ms_per_cycle": {
+            stage: {
+                "wall": timer.wall[stage] / cycles * 1000,
+                "cpu": timer.cpu[stage] / cycles * 1000,
+            }
+            for stage in STAGES
+        },
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _cycle_reading(node=None):
+    """
+    Takes and submits a reading, like the sensing mode. Returns True when
+    the sensors were read.
+    """
+    reading = node.sensing_module.read_sensors()
+    if reading is None:
+        node.communication_module.flush_batch()
+        return False
+
+    node._send_reading(reading=reading)
+
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--cycles", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--codec", default="json")
+    parser.add_argument("--compression", default="none")
+    parser.add_argument("--batch-readings", type=int, default=1)
+    parser.add_argument(
+        "--mq", action="store_true", help="simulate the MQ sensors too"
+    )
+    parser.add_argument("--sensor-latency", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--daemon-latency", type=float, default=0)
+    parser.add_argument("--network-delay", type=float, default=0)
+    parser.add_argument("--pipeline-depth", type=int, default=0)
+    parser.add_argument("--transport", choices=TRANSPORTS, default="tcp")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--json", action="store_true", help="print results as JSON"
+    )
+    parser.add_argument("--output", help="write results as JSON to a file")
+    args = parser.parse_args(argv)
+
+    if args.cycles < 1:
+        parser.error("--cycles must be a positive integer")
+
+    result = run(
+        cycles=args.cycles,
+        warmup=args.warmup,
+        codec=args.codec,
+        compression=args.compression,
+        batch_readings=args.batch_readings,
+        mq=args.mq,
+        sensor_latency=args.sensor_latency,
+        error_rate=args.error_rate,
+        daemon_latency=args.daemon_latency,
+        network_delay=args.network_delay,
+        pipeline_depth=args.pipeline_depth,
+        transport=args.transport,
+        seed=args.seed,
+    )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(result, output_file, indent=2)
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+
+    print(
+        "{readings} readings ({failed_readings} failed) in {bundles} "
+        "bundles: {readings_per_second:.1f} readings/s, "
+        "peak RSS {peak_rss_kib} KiB".format(**result)
+    )
+    print(
+        "cycle latency: p50 {p50:.2f} ms, p90 {p90:.2f} ms, "
+        "p99 {p99:.2f} ms, max {max:.2f} ms".format(**result["latency_ms"])
+    )
+    print(
+        "bytes per reading: {payload_bytes_per_reading:.1f} payload, "
+        "{wire_bytes_per_reading:.1f} on the wire".format(**result)
+    )
+    print("CPU per cycle: {0:.3f} ms".format(result["cpu_ms_per_cycle"]))
+    for stage, times in result["stages_ms_per_cycle"].items():
+        print(
+            "{0:>10}: {wall:8.3f} ms wall {cpu:8.3f} ms CPU".format(
+                stage, **times
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import random
+import datetime
+
+
+def generate_payloads(
+    count=1,
+    seed=0,
+    interval=60,
+    node_id="3f2504e0-4f89-11d3-9a0c-0305e82c3301",
+):
+    """
+    Returns a list of synthetic sensor node reading payloads, taken every
+    interval seconds.
+
+    Values follow a seeded random walk around typical urban conditions, so
+    consecutive readings change slowly like the real ones. PM values are
+    None (out of the PMS7003 working range) in about 5% of the readings.
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(
+        2020, 1, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=-3))
+    )
+
+    pm25, pm10 = 12.0, 20.0
+    temperature, humidity, pressure = 27.0, 70.0, 1008.0
+
+    payloads = []
+    for index in range(count):
+        pm25 = max(0.0, pm25 + rng.gauss(0, 1.5))
+        pm10 = max(pm25, pm10 + rng.gauss(0, 2.0))
+        temperature += rng.gauss(0, 0.05)
+        humidity = min(99.0, max(0.0, humidity + rng.gauss(0, 0.2)))
+        pressure += rng.gauss(0, 0.02)
+        in_range = rng.random() > 0.05
+
+        collected_at = start + datetime.timedelta(seconds=index * interval)
+        payloads.append(
+            {
+                "sensor_node": {"id": node_id},
+                "reading": {
+                    "pm25": int(pm25) if in_range else None,
+                    "pm10": int(pm10) if in_range else None,
+                    "temperature": round(temperature, 3),
+                    "relative_humidity": round(humidity, 3),
+                    "pressure": round(pressure, 3),
+                    "collected_at": collected_at.isoformat(),
+                },
+            }
+        )
+
+    return payloads
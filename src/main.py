@@ -1,3 +1,5 @@
+import asyncio
+
 import settings  # Load enviroment variables
 
 from sensor_node.sensor_node import SensorNode, SensorNodeCreationError
@@ -12,13 +14,17 @@ if __name__ == "__main__":
 
         node.startup()
 
-        node.sensing_mode()
+        if node.pipeline_enabled:
+            asyncio.run(node.async_sensing_mode())
+        else:
+            node.sensing_mode()
     except SensorNodeCreationError as error:
         print("Error creating sensor node instance: ", error)
     except Exception as error:
         print("Exception: {0}".format(error))
     finally:
         if node is not None:
+            node.sensing_module.stop_sampling()
             node.communication_module.close_connections()
         else:
             print("Failed to create a sensor node instance!")
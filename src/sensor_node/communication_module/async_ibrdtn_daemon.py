@@ -0,0 +1,244 @@
+import asyncio
+
+from .ibrdtn_daemon import (
+    BundleSerializer,
+    DaemonConnectionError,
+    DaemonProtocolError,
+    unix_socket_path,
+)
+
+
+class AsyncIbrdtnDaemon:
+    """
+    Asyncio client of the IBRDTN daemon API (extended protocol), pipelining
+    the bundles submission.
+
+    The synchronous client waits for the response of every command, three
+    round-trips per bundle. This one writes the commands of many bundles
+    ("bundle put plain", the bundle, "bundle send") without waiting, and
+    matches the responses to the bundles by their order and status codes,
+    so sending a backlog is limited by the daemon throughput instead of the
+    round-trip latency.
+
+    Attributes
+    ----------
+    address, port, app_source, destination_eid :
+        See IbrdtnDaemon.
+
+    max_in_flight : int
+        Max amount of bundles sent and not yet acknowledged by the daemon.
+
+    response_timeout : float
+        Seconds waited for a daemon response before giving up the
+        connection.
+    """
+
+    # Expected status codes of "bundle put plain" (before and after the
+    # bundle) and "bundle send"
+    _PUT_READY = 100
+    _OK = 200
+
+    def __init__(
+        self,
+        address=None,
+        port=None,
+        app_source=None,
+        destination_eid=None,
+        max_in_flight=32,
+        response_timeout=30,
+    ):
+        if address is None:
+            raise ValueError("Daemon address must be informed.")
+        if port is None and unix_socket_path(address) is None:
+            raise ValueError("Daemon port must be informed.")
+        if app_source is None:
+            raise ValueError("DTN app source must be informed.")
+        if destination_eid is None:
+            raise ValueError("DTN destination eid must be informed.")
+        if max_in_flight < 1:
+            raise ValueError("Max bundles in flight must be positive.")
+
+        self._daemon_address = address
+        self._daemon_port = port
+        self._app_source = app_source
+        self._destination_eid = destination_eid
+        self._max_in_flight = max_in_flight
+        self._response_timeout = response_timeout
+        self._reader = None
+        self._writer = None
+        self._dtn_source_eid = None
+        self._serializer = None
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    async def create_connection(self, max_tries=20, retry_interval=30):
+        """
+        Attempts to connect to the IBRDTN daemon max_tries times, waiting
+        retry_interval seconds between tries. Raises a DaemonConnectionError
+        when unsuccessful.
+        """
+        for current_try in range(max_tries):
+            print(
+                "IBRDTNDaemon (async): Trying to connect to daemon, "
+                "try n° {0}".format(current_try + 1)
+            )
+            try:
+                await self._connect_to_daemon()
+                print("IBRDTNDaemon (async): connected!")
+                return
+            except (ConnectionError, OSError, DaemonProtocolError) as error:
+                print("IBRDTNDaemon (async): connection failed.", error)
+                self._abort()
+                if current_try + 1 < max_tries:
+                    await asyncio.sleep(retry_interval)
+
+        raise DaemonConnectionError(
+            "Failed to create_connection to IBRDTN after {0} tries. "
+            "Please, check IBRDTN daemon.".format(max_tries)
+        )
+
+    async def _connect_to_daemon(self):
+        """
+        Opens the connection, sets the protocol extended mode and the
+        endpoint app source, then gets the full DTN Endpoint identifier of
+        this application.
+        """
+        socket_path = unix_socket_path(self._daemon_address)
+        if socket_path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                socket_path
+            )
+        else:
+            self._reader, self._writer = await asyncio.open_connection(
+                self._daemon_address, self._daemon_port
+            )
+        # Daemon header
+        await self._read_line()
+
+        self._writer.write(b"protocol extended\n")
+        await self._expect(self._OK)
+        self._writer.write(
+            "set endpoint {0}\n".format(self._app_source).encode("UTF-8")
+        )
+        await self._expect(self._OK)
+        self._writer.write(b"registration list\n")
+        await self._expect(self._OK)
+        self._dtn_source_eid = (await self._read_line()).decode().rstrip()
+        # Last empty line of the registration list
+        await self._read_line()
+        self._serializer = BundleSerializer(
+            source_eid=self._dtn_source_eid,
+            destination_eid=self._destination_eid,
+        )
+
+    async def close_connection(self):
+        """
+        Closes the connection to the IBRDTN daemon.
+        """
+        writer = self._writer
+        self._abort()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def send_message(self, message=None):
+        """
+        Sends a message as a bundle. Raises a DaemonConnectionError when it
+        was not delivered.
+        """
+        if await self.send_many([message]) != 1:
+            raise DaemonConnectionError("Failed to send dtn message.")
+
+    async def send_many(self, messages=None):
+        """
+        Sends the messages as bundles, pipelined (see max_in_flight).
+
+        Returns the amount of messages delivered, in order: the delivery
+        stops at the first failure (connection lost, or bundle rejected),
+        then the connection is closed. The messages after the delivered
+        ones may have reached the daemon, they should be sent again.
+        """
+        if not self.connected:
+            print("IBRDTNDaemon (async): Not connected to the daemon.")
+            return 0
+
+        # Commands and bundle segments, written without joining them
+        bundles = [
+            [b"bundle put plain\n"]
+            + self._serializer.segments(
+                payload=message.payload,
+                custody=message.custody,
+                lifetime=message.lifetime,
+            )
+            + [b"bundle send\n"]
+            for message in messages
+        ]
+
+        window = asyncio.Semaphore(self._max_in_flight)
+        sender = asyncio.ensure_future(self._write_bundles(bundles, window))
+        delivered = 0
+        try:
+            for _bundle in bundles:
+                await self._expect(self._PUT_READY)
+                # Bundle in the daemon register, then bundle sent
+                await self._expect(self._OK)
+                await self._expect(self._OK)
+                delivered += 1
+                window.release()
+        except (ConnectionError, OSError, DaemonProtocolError) as error:
+            print(
+                "IBRDTNDaemon (async): {0} of {1} bundles sent, "
+                "connection closed.".format(delivered, len(bundles)),
+                error,
+            )
+            self._abort()
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
+
+        return delivered
+
+    async def _write_bundles(self, bundles=None, window=None):
+        for bundle in bundles:
+            await window.acquire()
+            self._writer.writelines(bundle)
+            await self._writer.drain()
+
+    async def _expect(self, status=None):
+        """
+        Reads a response, raises a DaemonProtocolError when its status code
+        is not status.
+        """
+        response = await self._read_line()
+        if response[:3] != str(status).encode():
+            raise DaemonProtocolError(
+                "Expected status {0}, IBRDTN daemon answered: {1}".format(
+                    status, response.decode(errors="replace").rstrip()
+                )
+            )
+
+        return response
+
+    async def _read_line(self):
+        try:
+            line = await asyncio.wait_for(
+                self._reader.readline(), timeout=self._response_timeout
+            )
+        except asyncio.TimeoutError:
+            raise ConnectionError("No response from the IBRDTN daemon.")
+        if not line:
+            raise ConnectionError("Connection closed by the IBRDTN daemon.")
+
+        return line
+
+    def _abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        self._dtn_source_eid = None
+        self._serializer = None
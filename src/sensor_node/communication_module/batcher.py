@@ -0,0 +1,117 @@
+import time
+
+
+class MessageBatcher:
+    """
+    Groups payloads to be sent together in a single message (DTN bundle).
+
+    A batch is flushed when one of the following limits is reached:
+      - max_count: amount of payloads in the batch;
+      - max_bytes: encoded size of the batch (in bytes), measured with
+        size_function. A payload that would exceed the limit starts a new
+        batch;
+      - max_age: age (in seconds) of the oldest payload in the batch.
+
+    A limit set to None (or 0) is disabled. Pending payloads are kept in
+    memory, so max_age also bounds how many readings a crash may lose.
+    """
+
+    def __init__(
+        self, max_count=1, max_bytes=None, max_age=None, size_function=None
+    ):
+        if max_count is None or max_count < 1:
+            raise ValueError("Batch max count must be a positive integer.")
+        if max_bytes and size_function is None:
+            raise ValueError(
+                "A size function must be informed to limit the batch size."
+            )
+
+        self._max_count = max_count
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._size_function = size_function
+
+        self._payloads = []
+        # Monotonic time of the oldest payload in the batch
+        self._started_at = None
+        # Batch size estimate: its last measured size plus the size of each
+        # payload added since then, encoded alone. Payloads encoded alone
+        # repeat the batch header (and compress worse), so it is an upper
+        # bound of the batch size
+        self._size = 0
+
+    def add(self, payload=None):
+        """
+        Adds a payload to the current batch.
+
+        Returns a list with the batches (lists of payloads) ready to be sent,
+        which may be empty.
+        """
+        ready = []
+        measured = True
+
+        if self._max_bytes:
+            # The batch is only encoded whole when the estimate reaches the
+            # limit, so filling a batch does not encode it on every add
+            payload_size = self._size_function([payload])
+            size = self._size + payload_size
+            measured = not self._payloads
+            if self._payloads and size > self._max_bytes:
+                size = self._size_function(self._payloads + [payload])
+                measured = True
+                if size > self._max_bytes:
+                    ready.append(self.flush())
+                    size = payload_size
+
+        if not self._payloads:
+            self._started_at = time.monotonic()
+        self._payloads.append(payload)
+        if self._max_bytes:
+            self._size = size
+
+        if (
+            len(self._payloads) >= self._max_count
+            or self.due()
+            or self._size_reached(measured)
+        ):
+            ready.append(self.flush())
+
+        return ready
+
+    def _size_reached(self, measured=None):
+        """
+        Returns True if the batch reached max_bytes. The batch is measured
+        when its size estimate reached the limit and it was not just
+        measured.
+        """
+        if not self._max_bytes or self._size < self._max_bytes:
+            return False
+        if not measured:
+            self._size = self._size_function(self._payloads)
+
+        return self._size >= self._max_bytes
+
+    def due(self):
+        """
+        Returns True if the oldest payload of the batch reached max_age.
+        Otherwise, returns False.
+        """
+        return bool(
+            self._max_age
+            and self._payloads
+            and time.monotonic() - self._started_at >= self._max_age
+        )
+
+    def flush(self):
+        """
+        Returns the pending payloads (oldest first) and starts a new batch.
+        """
+        batch = self._payloads
+        self._payloads = []
+        self._started_at = None
+        self._size = 0
+
+        return batch
+
+    def __len__(self):
+        return len(self._payloads)
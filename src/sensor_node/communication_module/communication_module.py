@@ -1,11 +1,18 @@
 import json
+import asyncio
 
+from time import sleep
 from environs import Env
 from .ibrdtn_daemon import (
     IbrdtnDaemon,
     DaemonConnectionError,
 )
+from .async_ibrdtn_daemon import AsyncIbrdtnDaemon
+from .batcher import MessageBatcher
+from .daemon_pool import DaemonEndpoint, DaemonPool, parse_endpoints
 from .message import Message
+from .outbox import Outbox, OutboxException
+from .payload_codec import PayloadCodecError, create_payload_codec
 
 env = Env()
 env.read_env()
@@ -24,6 +31,9 @@ class CommunicationModuleCreationError(CommunicationModuleException):
 
 
 class CommunicationModule:
+    # Amount of messages loaded from the outbox at once during a replay
+    _OUTBOX_REPLAY_BATCH = 50
+
     def __init__(self):
         try:
 
@@ -31,49 +41,362 @@ class CommunicationModule:
             self._port = env.int("DTN_DAEMON_PORT", default=None)
             self._app_source = env.str("DTN_SENSOR_APP_SOURCE", default=None)
             self._destination_eid = env.str("DTN_DESTINATION_EID", default=None)
+            # Connection tries made before giving up a delivery, the pending
+            # messages stay in the outbox until the next delivery
+            self._reconnect_tries = env.int(
+                "DTN_DAEMON_RECONNECT_TRIES", default=1
+            )
+            self._reconnect_interval = env.int(
+                "DTN_DAEMON_RECONNECT_INTERVAL", default=30
+            )
 
-            self._dtn_client = IbrdtnDaemon(
-                address=self._address,
-                port=self._port,
-                app_source=self._app_source,
-                destination_eid=self._destination_eid,
+            # Daemons the bundles can be sent to, the first reachable one is
+            # used (see DaemonPool.candidates). Defaults to the
+            # DTN_DAEMON_ADDRESS one
+            endpoints = parse_endpoints(
+                env.str("DTN_DAEMON_ENDPOINTS", default="")
+            ) or [DaemonEndpoint(address=self._address, port=self._port)]
+            self._daemon_pool = DaemonPool(
+                endpoints=endpoints,
+                probe_interval=env.float(
+                    "DTN_DAEMON_PROBE_INTERVAL", default=10
+                ),
+                probe_timeout=env.float("DTN_DAEMON_PROBE_TIMEOUT", default=2),
+            )
+            self._endpoint = None
+            self._dtn_client = None
+
+            self._outbox = Outbox(
+                path=env.str("OUTBOX_DATABASE_PATH", default="outbox.sqlite3"),
+                max_messages=env.int("OUTBOX_MAX_MESSAGES", default=100000),
+            )
+
+            # Payload encoding: json (legacy) or binary, optionally
+            # compressed (zlib)
+            compression = env.str(
+                "MESSAGE_PAYLOAD_COMPRESSION", default="none"
+            )
+            level = env.int("MESSAGE_PAYLOAD_COMPRESSION_LEVEL", default=9)
+            self._codec = create_payload_codec(
+                name=env.str("MESSAGE_PAYLOAD_CODEC", default="json"),
+                compression=compression,
+                level=level,
+            )
+            # Encodes the batches the configured codec fails to encode, so
+            # their readings are not lost
+            self._fallback_codec = create_payload_codec(
+                name="json", compression=compression, level=level
+            )
+
+            # Readings batching: several readings sent in a single bundle
+            self._batcher = MessageBatcher(
+                max_count=env.int("MESSAGE_BATCH_MAX_READINGS", default=1),
+                max_bytes=env.int("MESSAGE_BATCH_MAX_BYTES", default=0),
+                max_age=env.int("MESSAGE_BATCH_MAX_AGE", default=0),
+                size_function=self._encoded_size,
+            )
+
+            # Bundles sent to the daemon without waiting for the previous
+            # ones to be acknowledged (0 sends them one by one)
+            self._pipeline_depth = env.int(
+                "DTN_DAEMON_PIPELINE_DEPTH", default=0
             )
+            if self._pipeline_depth < 0:
+                raise ValueError(
+                    "DTN_DAEMON_PIPELINE_DEPTH must not be negative."
+                )
 
-            self._dtn_client.create_connection()
+            self._loop = None
+            if self._pipeline_depth > 0:
+                # The pipelined client runs on a private event loop, the
+                # module methods stay synchronous
+                self._loop = asyncio.new_event_loop()
 
-        except (ValueError, DaemonConnectionError) as error:
+        except (ValueError, OutboxException) as error:
             raise CommunicationModuleCreationError(
                 "Failed to create a communication module instance: ", error
             )
 
+        # A daemon down at boot does not stop the node: the readings are
+        # kept in the outbox, delivered once a daemon is reachable
+        try:
+            self._connect(
+                max_tries=self._reconnect_tries,
+                retry_interval=self._reconnect_interval,
+            )
+        except DaemonConnectionError as error:
+            print(
+                "Communication module: IBRDTN daemon unreachable, the "
+                "messages are kept in the outbox until it is back. \n",
+                error,
+            )
+        self._daemon_pool.start()
+
     def send_message(self, message=None):
         """
         Sends a message over DTN.
 
+        The message is appended to the outbox, then the outbox is replayed in
+        order to the IBRDTN daemon. When the daemon is unreachable, the
+        messages stay in the outbox and are delivered on a later call after
+        the connection is recovered.
+
         Parameters
         ----------
             message : A Message object
 
-        Raises
-        ------
-            CommunicationModuleException
-                Exception raised when module fails to connect to IBRDTN daemon.
+        Returns
+        -------
+            The amount of messages delivered to the IBRDTN daemon.
+        """
+        self._outbox.append(message=message)
+
+        return self.flush_outbox()
+
+    def submit_payload(self, payload=None):
+        """
+        Adds a reading payload to the current batch. When the batch is ready
+        (see MessageBatcher), its payloads are sent in a single message.
+
+        Parameters
+        ----------
+            payload : dict
+                A sensor node reading payload.
+
+        Returns
+        -------
+            The amount of messages delivered to the IBRDTN daemon.
+        """
+        for batch in self._batcher.add(payload=payload):
+            self._outbox.append(message=self.generate_batch_message(batch))
+
+        return self.flush_batch()
+
+    def flush_batch(self, force=False):
+        """
+        Sends the current batch if it reached its max age (or if force is
+        True), then replays the outbox.
+
+        Returns the amount of messages delivered to the IBRDTN daemon.
+        """
+        if len(self._batcher) > 0 and (force or self._batcher.due()):
+            self._outbox.append(
+                message=self.generate_batch_message(self._batcher.flush())
+            )
+
+        if len(self._outbox) == 0:
+            return 0
+
+        return self.flush_outbox()
+
+    def flush_outbox(self):
+        """
+        Delivers the messages stored in the outbox to the IBRDTN daemon,
+        oldest first. Stops at the first message that could not be delivered.
+
+        Returns the amount of messages delivered.
+        """
+        if self._loop is not None:
+            return self._flush_outbox_pipelined()
+
+        delivered = 0
+
+        while True:
+            entries = self._outbox.peek(limit=self._OUTBOX_REPLAY_BATCH)
+            if not entries:
+                return delivered
+
+            for message_id, message in entries:
+                if not self._deliver(message=message):
+                    print(
+                        "Communication module: IBRDTN daemon unreachable, "
+                        "{0} message(s) kept in the outbox.".format(
+                            self.pending_messages()
+                        )
+                    )
+                    return delivered
+
+                self._outbox.remove(message_id=message_id)
+                delivered += 1
+
+    def _flush_outbox_pipelined(self):
+        """
+        Same as flush_outbox, sending the messages of each outbox batch
+        pipelined (see AsyncIbrdtnDaemon.send_many).
+        """
+        delivered = 0
+
+        while True:
+            entries = self._outbox.peek(limit=self._OUTBOX_REPLAY_BATCH)
+            if not entries:
+                return delivered
+
+            sent = self._deliver_many(
+                messages=[message for _message_id, message in entries]
+            )
+            for message_id, _message in entries[:sent]:
+                self._outbox.remove(message_id=message_id)
+            delivered += sent
+
+            if sent < len(entries):
+                print(
+                    "Communication module: IBRDTN daemon unreachable, "
+                    "{0} message(s) kept in the outbox.".format(
+                        self.pending_messages()
+                    )
+                )
+                return delivered
+
+    def pending_messages(self):
+        """
+        Returns the amount of messages waiting in the outbox.
+        """
+        return len(self._outbox)
+
+    def _deliver(self, message=None):
+        """
+        Sends a message to the IBRDTN daemon, reconnecting once if the
+        connection was lost (or never made).
+
+        Returns True when the message was delivered. Otherwise, returns False.
         """
-        sent = False
-        while not sent:
+        if self._dtn_client is not None:
             try:
                 self._dtn_client.send_message(message)
-                sent = True
+                return True
             except DaemonConnectionError:
+                self._daemon_pool.mark_failed(self._endpoint)
+                self._disconnect()
+
+        try:
+            self._connect(
+                max_tries=self._reconnect_tries,
+                retry_interval=self._reconnect_interval,
+            )
+            self._dtn_client.send_message(message)
+            return True
+        except DaemonConnectionError as error:
+            print(
+                "Communication module: Unable to send message due to a "
+                "connection problem to IBRDTN daemon, perhaps not running "
+                "or crashed? \n",
+                error,
+            )
+            return False
+
+    def _deliver_many(self, messages=None):
+        """
+        Sends the messages pipelined to the IBRDTN daemon, reconnecting once
+        if the connection was lost (or never made). The messages not
+        acknowledged by the lost daemon are sent again to the daemon
+        reconnected to.
+
+        Returns the amount of messages delivered, in order.
+        """
+        sent = 0
+        if self._dtn_client is not None:
+            sent = self._run(self._dtn_client.send_many(messages))
+            if sent == len(messages):
+                return sent
+
+            self._daemon_pool.mark_failed(self._endpoint)
+            self._disconnect()
+
+        try:
+            self._connect(
+                max_tries=self._reconnect_tries,
+                retry_interval=self._reconnect_interval,
+            )
+        except DaemonConnectionError as error:
+            print(
+                "Communication module: Unable to send message due to a "
+                "connection problem to IBRDTN daemon, perhaps not running "
+                "or crashed? \n",
+                error,
+            )
+            return sent
+
+        return sent + self._run(self._dtn_client.send_many(messages[sent:]))
+
+    def _connect(self, max_tries=20, retry_interval=30):
+        """
+        Connects to a daemon of the pool, trying every endpoint (see
+        DaemonPool.candidates) up to max_tries times, waiting retry_interval
+        seconds between the rounds of tries. Raises a DaemonConnectionError
+        when unsuccessful.
+        """
+        for current_try in range(max_tries):
+            for endpoint in self._daemon_pool.candidates():
+                client = self._create_client(endpoint=endpoint)
                 try:
-                    self._dtn_client.create_connection()
-                except DaemonConnectionError as error:
-                    raise CommunicationModuleException(
-                        "Communication module: Unable to send message due to \
-                          a connection problem to IBRDTN daemon, perhaps not \
-                          running or crashed? \n",
-                        error,
-                    )
+                    if self._loop is not None:
+                        self._run(
+                            client.create_connection(
+                                max_tries=1, retry_interval=0
+                            )
+                        )
+                    else:
+                        client.create_connection(
+                            max_tries=1, retry_interval=0
+                        )
+                except DaemonConnectionError:
+                    self._daemon_pool.mark_failed(endpoint)
+                    continue
+
+                self._daemon_pool.mark_connected(endpoint)
+                self._dtn_client = client
+                self._endpoint = endpoint
+                return
+
+            if current_try + 1 < max_tries:
+                sleep(retry_interval)
+
+        raise DaemonConnectionError(
+            "Failed to connect to an IBRDTN daemon ({0}) after {1} "
+            "tries.".format(
+                ", ".join(map(str, self._daemon_pool.endpoints)), max_tries
+            )
+        )
+
+    def _disconnect(self):
+        """
+        Closes the connection to the current daemon, if any.
+        """
+        if self._dtn_client is None:
+            return
+
+        if self._loop is not None:
+            self._run(self._dtn_client.close_connection())
+        else:
+            self._dtn_client.close_connection()
+        self._dtn_client = None
+
+    def _create_client(self, endpoint=None):
+        """
+        Returns a (not connected) client of the daemon at endpoint, the
+        pipelined one when DTN_DAEMON_PIPELINE_DEPTH is positive.
+        """
+        if self._loop is not None:
+            return AsyncIbrdtnDaemon(
+                address=endpoint.address,
+                port=endpoint.port,
+                app_source=self._app_source,
+                destination_eid=self._destination_eid,
+                max_in_flight=self._pipeline_depth,
+            )
+
+        return IbrdtnDaemon(
+            address=endpoint.address,
+            port=endpoint.port,
+            app_source=self._app_source,
+            destination_eid=self._destination_eid,
+        )
+
+    def _run(self, coroutine=None):
+        """
+        Runs a coroutine of the pipelined client to completion.
+        """
+        return self._loop.run_until_complete(coroutine)
 
     def generate_message(self, payload=None):
         """
@@ -99,5 +422,65 @@ class CommunicationModule:
             lifetime=env.int("MESSAGE_LIFETIME", default=604800),
         )
 
+    def generate_batch_message(self, payloads=None):
+        """
+        Generates a message containing a batch of reading payloads of this
+        sensor node.
+
+        The payloads are encoded with the configured payload codec (see
+        payload_codec module), or as JSON when it fails to encode them.
+        """
+        return Message(
+            payload=self._encode_payloads(payloads),
+            custody=env.bool("MESSAGE_CUSTODY", default=None),
+            lifetime=env.int("MESSAGE_LIFETIME", default=604800),
+        )
+
+    def check_node_id(self, node_id=None):
+        """
+        Checks if the sensor node id can be encoded by the configured payload
+        codec. Raises a ValueError otherwise.
+        """
+        self._codec.check_node_id(node_id=node_id)
+
+    def _encoded_size(self, payloads=None):
+        """
+        Returns the size in bytes of an encoded batch of reading payloads.
+        """
+        payload = self._encode_payloads(payloads, verbose=False)
+        if isinstance(payload, str):
+            payload = payload.encode("UTF-8")
+
+        return len(payload)
+
+    def _encode_payloads(self, payloads=None, verbose=True):
+        """
+        Returns the batch of reading payloads encoded with the configured
+        codec, or with the JSON codec when the configured one fails (reported
+        when verbose is True).
+        """
+        try:
+            return self._codec.encode(payloads)
+        except PayloadCodecError as error:
+            if not verbose:
+                return self._fallback_codec.encode(payloads)
+
+            print(
+                "Communication module: Failed to encode {0} reading(s), "
+                "sent as JSON instead. \n".format(len(payloads)),
+                error,
+            )
+            return self._fallback_codec.encode(payloads)
+
     def close_connections(self):
-        self._dtn_client.close_connection()
+        # Keeps the readings of the current batch in the outbox, to be
+        # delivered on the next start
+        if len(self._batcher) > 0:
+            self._outbox.append(
+                message=self.generate_batch_message(self._batcher.flush())
+            )
+        self._daemon_pool.stop()
+        self._disconnect()
+        if self._loop is not None:
+            self._loop.close()
+        self._outbox.close()
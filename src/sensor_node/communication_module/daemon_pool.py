@@ -0,0 +1,277 @@
+import time
+import random
+import socket
+import threading
+
+from .ibrdtn_daemon import unix_socket_path
+
+
+class DaemonEndpoint:
+    """
+    An IBRDTN daemon API endpoint and its health.
+
+    Attributes
+    ----------
+    address, port :
+        See IbrdtnDaemon.
+
+    healthy : Boolean
+        False after a failed probe or connection, until the next successful
+        one.
+
+    latency : float
+        Moving average of the probes latency in seconds, None before the
+        first successful probe.
+
+    failures : int
+        Failed probes and connections in a row.
+    """
+
+    def __init__(self, address=None, port=None):
+        self.address = address
+        self.port = port
+        self.healthy = True
+        self.latency = None
+        self.failures = 0
+
+    def __str__(self):
+        if unix_socket_path(self.address) is not None:
+            return self.address
+        if ":" in self.address:
+            # IPv6 address, as parsed by parse_endpoints
+            return "[{0}]:{1}".format(self.address, self.port)
+
+        return "{0}:{1}".format(self.address, self.port)
+
+
+def parse_endpoints(value=None):
+    """
+    Returns the DaemonEndpoint list of a comma separated list of daemon
+    addresses, as address:port (e.g. 192.168.0.10:4550, [::1]:4550) or
+    unix:// followed by a socket path. Raises a ValueError when an address
+    is invalid.
+    """
+    endpoints = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+
+        if unix_socket_path(item) is not None:
+            endpoints.append(DaemonEndpoint(address=item))
+            continue
+
+        address, _separator, port = item.rpartition(":")
+        address = address.strip("[]")
+        if not address or not port.isdigit():
+            raise ValueError(
+                "Invalid IBRDTN daemon endpoint {0}, expected address:port "
+                "or unix://path.".format(item)
+            )
+        endpoints.append(DaemonEndpoint(address=address, port=int(port)))
+
+    return endpoints
+
+
+class DaemonPool:
+    """
+    IBRDTN daemons the sensor node can send its bundles to (e.g. the daemon
+    of the node and a DTN relay of the LAN), health checked in background.
+
+    A probe connects to a daemon and waits for its header line: it measures
+    the latency and whether the daemon accepts connections, without sending
+    any command.
+
+    Attributes
+    ----------
+    endpoints : list
+        DaemonEndpoint list, in the configuration order.
+
+    probe_interval : float
+        Seconds between probes of the endpoints, 0 disables the probes.
+
+    probe_timeout : float
+        Seconds waited for a daemon header line before the probe fails.
+
+    latency_alpha : float
+        Weight of the latest probe in the latency moving average.
+
+    seed : int
+        Seed of the endpoints selection random generator, None seeds it
+        from the system.
+    """
+
+    def __init__(
+        self,
+        endpoints=None,
+        probe_interval=10,
+        probe_timeout=2,
+        latency_alpha=0.3,
+        seed=None,
+    ):
+        if not endpoints:
+            raise ValueError("At least one daemon endpoint must be informed.")
+        if probe_interval < 0:
+            raise ValueError("Probe interval must not be negative.")
+        if probe_timeout <= 0:
+            raise ValueError("Probe timeout must be positive.")
+
+        self.endpoints = list(endpoints)
+        self._probe_interval = probe_interval
+        self._probe_timeout = probe_timeout
+        self._latency_alpha = latency_alpha
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Probes the endpoints, then keeps probing them every probe_interval
+        seconds in a background thread. Does nothing with a single endpoint
+        or when the probes are disabled.
+        """
+        if len(self.endpoints) < 2 or self._probe_interval == 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self.probe_all()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="daemon-pool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background probes, after the probe being done (if any).
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def candidates(self):
+        """
+        Returns the endpoints in the order they should be tried: the healthy
+        ones first, in a random order weighted by the inverse of their
+        latency (faster daemons are picked more often), then the unhealthy
+        ones, fewest failures first.
+        """
+        with self._lock:
+            healthy = [
+                endpoint for endpoint in self.endpoints if endpoint.healthy
+            ]
+            unhealthy = sorted(
+                (
+                    endpoint
+                    for endpoint in self.endpoints
+                    if not endpoint.healthy
+                ),
+                key=lambda endpoint: endpoint.failures,
+            )
+            # Latency unknown (not probed yet) counted as the probe timeout
+            weights = [
+                1 / max(
+                    endpoint.latency
+                    if endpoint.latency is not None
+                    else self._probe_timeout,
+                    1e-6,
+                )
+                for endpoint in healthy
+            ]
+
+        ordered = []
+        while healthy:
+            index = self._weighted_index(weights)
+            ordered.append(healthy.pop(index))
+            weights.pop(index)
+
+        return ordered + unhealthy
+
+    def mark_connected(self, endpoint=None):
+        """
+        Records a successful connection to the endpoint.
+        """
+        with self._lock:
+            if not endpoint.healthy:
+                print(
+                    "Daemon pool: IBRDTN daemon {0} is back.".format(endpoint)
+                )
+            endpoint.healthy = True
+            endpoint.failures = 0
+
+    def mark_failed(self, endpoint=None):
+        """
+        Records a failed connection (or connection lost) to the endpoint,
+        tried after the healthy ones until a probe or connection succeeds.
+        """
+        with self._lock:
+            if endpoint.healthy:
+                print(
+                    "Daemon pool: IBRDTN daemon {0} unreachable.".format(
+                        endpoint
+                    )
+                )
+            endpoint.healthy = False
+            endpoint.failures += 1
+
+    def probe_all(self):
+        """
+        Probes every endpoint once.
+        """
+        for endpoint in self.endpoints:
+            self.probe(endpoint)
+
+    def probe(self, endpoint=None):
+        """
+        Probes the endpoint, updating its health and latency. Returns True
+        when the daemon answered.
+        """
+        socket_path = unix_socket_path(endpoint.address)
+        started_at = time.monotonic()
+        try:
+            if socket_path is not None:
+                sock = socket.socket(socket.AF_UNIX)
+            else:
+                # IPv4 or IPv6 address, or host name
+                sock = socket.create_connection(
+                    (endpoint.address, endpoint.port), self._probe_timeout
+                )
+            with sock:
+                sock.settimeout(self._probe_timeout)
+                if socket_path is not None:
+                    sock.connect(socket_path)
+                # The daemon header line, read whole to close gracefully
+                with sock.makefile("rb") as stream:
+                    if not stream.readline().endswith(b"\n"):
+                        raise ConnectionError("No IBRDTN daemon header.")
+        except OSError:
+            self.mark_failed(endpoint)
+            return False
+
+        latency = time.monotonic() - started_at
+        self.mark_connected(endpoint)
+        with self._lock:
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self._latency_alpha * (
+                    latency - endpoint.latency
+                )
+
+        return True
+
+    def _weighted_index(self, weights=None):
+        threshold = self._random.random() * sum(weights)
+        for index, weight in enumerate(weights):
+            threshold -= weight
+            if threshold < 0:
+                return index
+
+        return len(weights) - 1
+
+    def _run(self):
+        while not self._stop.wait(self._probe_interval):
+            self.probe_all()
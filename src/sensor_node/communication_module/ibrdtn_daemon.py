@@ -1,6 +1,6 @@
 # comments about connecting to the daemon API: https://mail.ibr.cs.tu-bs.de/pipermail/ibr-dtn/2014-January/000538.html
 import socket
-import base64
+import binascii
 
 from time import sleep
 from environs import Env
@@ -10,6 +10,10 @@ from environs import Env
 env = Env()
 env.read_env()
 
+# Daemon address prefix of the API Unix domain socket (api_socket in the
+# daemon configuration), e.g. unix:///tmp/ibrdtn.sock
+UNIX_SOCKET_SCHEME = "unix://"
+
 
 class IbrdtnDaemonException(Exception):
     """
@@ -29,6 +33,12 @@ class DaemonConnectionError(ConnectionError):
     """
 
 
+class DaemonProtocolError(IbrdtnDaemonException):
+    """
+    Unexpected response (status code) of the IBRDTN daemon API.
+    """
+
+
 # class DaemonBundleUploadError(IbrdtnDaemonException):
 #     """
 #     Unable to send bundles to the DTN Daemon. Check if the file descriptor
@@ -50,10 +60,11 @@ class IbrdtnDaemon:
     Attributes
     ----------
     address : String
-        IBRDTN daemon address.
+        IBRDTN daemon address, or unix:// followed by the path of the
+        daemon API Unix domain socket (same protocol, local daemon only).
 
     port : int
-        IBRDTN daemon port.
+        IBRDTN daemon port (not used with a Unix domain socket).
 
     app_source : String
         Application message source, which will be concatenated with the DTN
@@ -75,7 +86,7 @@ class IbrdtnDaemon:
     ):
         if address is None:
             raise ValueError("Daemon address must be informed.")
-        if port is None:
+        if port is None and unix_socket_path(address) is None:
             raise ValueError("Daemon port must be informed.")
         if app_source is None:
             raise ValueError("DTN app source must be informed.")
@@ -93,21 +104,24 @@ class IbrdtnDaemon:
         self._daemon_socket = None
         self._daemon_stream = None
         self._dtn_source_eid = None
+        # Bundle serializer of the connection (see _connect_to_daemon)
+        self._serializer = None
 
-    def create_connection(self):
+    def create_connection(self, max_tries=20, retry_interval=30):
         """
-          Attempts to create connection to IBRDTN daemon 20 times,
-          taking a 30 seconds interval between each try.
+          Attempts to create connection to IBRDTN daemon max_tries times
+          (20 by default), taking a retry_interval seconds interval
+          (30 by default) between each try.
           If connection is unsuccessful, throws a DaemonConnectionError
           exception.
         """
         self._daemon_socket = None
         self._daemon_stream = None
         self._dtn_source_eid = None
+        self._serializer = None
 
         connected = False
         current_try = 0
-        max_tries = 20
 
         while not connected and current_try < max_tries:
             try:
@@ -127,7 +141,8 @@ class IbrdtnDaemon:
                 )
             except ConnectionError:
                 current_try += 1
-                sleep(30)
+                if current_try < max_tries:
+                    sleep(retry_interval)
 
         if not connected and current_try == max_tries:
             raise DaemonConnectionError(
@@ -145,35 +160,46 @@ class IbrdtnDaemon:
         identifier of this application.
         """
         try:
-            # Create socket to communicate with the DTN daemon
-            self._daemon_socket = socket.socket()
-            # Connect to the DTN daemon
-            self._daemon_socket.connect(
-                (self._daemon_address, self._daemon_port)
-            )
+            socket_path = unix_socket_path(self._daemon_address)
+            if socket_path is not None:
+                # Local daemon API socket, skips the TCP loopback stack
+                self._daemon_socket = socket.socket(socket.AF_UNIX)
+                self._daemon_socket.connect(socket_path)
+            else:
+                # Connect to the DTN daemon (IPv4 or IPv6 address, or host
+                # name)
+                self._daemon_socket = socket.create_connection(
+                    (self._daemon_address, self._daemon_port)
+                )
             # Get a file object (file descriptor/stream) associated with the
             # daemon's socket
             self._daemon_stream = self._daemon_socket.makefile()
             # Read daemon"s header response
             self._daemon_stream.readline()
             # Switch into extended protocol mode
-            self._daemon_socket.send(b"protocol extended\n")
+            self._daemon_socket.sendall(b"protocol extended\n")
             # Read protocol switch response
             self._daemon_stream.readline()
             # Set endpoint identifier
-            self._daemon_socket.send(
+            self._daemon_socket.sendall(
                 bytes("set endpoint %s\n" % self._app_source, encoding="UTF-8",)
             )
             # Read protocol set EID response
             self._daemon_stream.readline()
-            self._daemon_socket.send(b"registration list\n")
+            self._daemon_socket.sendall(b"registration list\n")
             # Read the header of registration list response
             self._daemon_stream.readline()
             # Read the full DTN Endpoint identifier of this application
             self._dtn_source_eid = self._daemon_stream.readline().rstrip()
             # Read the last empty line of the response
             self._daemon_stream.readline()
-        except ConnectionError as error:
+            self._serializer = BundleSerializer(
+                source_eid=self._dtn_source_eid,
+                destination_eid=self._destination_eid,
+            )
+        except OSError as error:
+            # Also the errors not being ConnectionError (e.g. the daemon
+            # socket file missing while it restarts, host unreachable)
             raise ConnectionError(
                 "Failed to create a socket and stream to the IBRDTN daemon.\n",
                 error,
@@ -185,6 +211,7 @@ class IbrdtnDaemon:
         """
         print("Closing connection to IBRDRN...")
         self._dtn_source_eid = None
+        self._serializer = None
         if self._daemon_stream:
             self._daemon_stream.close()
 
@@ -224,12 +251,14 @@ class IbrdtnDaemon:
 
     def _create_bundle(self, payload=None, custody=None, lifetime=None):
         """
-        Returns a bundle containing the payload string.
+        Returns a bundle containing the payload, as a list of bytes segments
+        (see BundleSerializer).
 
         Parameters
         ----------
-        payload : String
-            The payload contains a string value (e.g: a JSON string).
+        payload : String or bytes
+            The payload contains a string value (e.g: a JSON string) or a
+            binary payload.
 
         custody : Boolean
             Enables the custody processing flag. The bundle processing flags
@@ -241,27 +270,14 @@ class IbrdtnDaemon:
         lifetime : int
             Bundle lifetime.
         """
-        # The bundle payload is a Base64 encoded string
-        bundle = "Source: %s\n" % self._dtn_source_eid
-        bundle += "Destination: %s\n" % self._destination_eid
-        # Set bundle custody processing flag
-        if custody is True:
-            bundle += "Processing flags: 156\n"
-        else:
-            bundle += "Processing flags: 148\n"
-        bundle += "Lifetime: %d\n" % lifetime
-        bundle += "Blocks: 1\n\n"
-
-        bundle += "Block: 1\n"
-        bundle += "Flags: LAST_BLOCK\n"
-        bundle += "Length: %d\n\n" % len(bytes(payload, encoding="UTF-8"))
-
-        bundle += "%s\n\n" % str(
-            base64.b64encode(payload.encode(encoding="UTF-8")),
-            encoding="UTF-8",
-        )
+        if self._serializer is None:
+            raise DaemonConnectionError(
+                "Could not create bundle! Not connected to the daemon.\n"
+            )
 
-        return bundle
+        return self._serializer.segments(
+            payload=payload, custody=custody, lifetime=lifetime
+        )
 
     def _send_bundle(self, bundle=None):
         """
@@ -269,25 +285,131 @@ class IbrdtnDaemon:
 
         Parameters
         ----------
-        bundle : String
-          A DTN bundle to be sent. It is formatted according to the format
-          accepted by the IBRDTN daemon API.
+        bundle : list
+          A DTN bundle to be sent, as bytes segments (see _create_bundle).
+          They are written at once (scatter-gather), without joining them.
         """
 
+        if self._daemon_socket is None:
+            raise DaemonConnectionError(
+                "Could not send bundle! Not connected to the daemon.\n"
+            )
+
         try:
-            self._daemon_socket.send(b"bundle put plain\n")
+            self._daemon_socket.sendall(b"bundle put plain\n")
             self._daemon_stream.readline()
-            self._daemon_socket.send(bytes(bundle, encoding="UTF-8"))
+            send_segments(self._daemon_socket, bundle)
             self._daemon_stream.readline()
-            self._daemon_socket.send(b"bundle send\n")
+            self._daemon_socket.sendall(b"bundle send\n")
             self._daemon_stream.readline()
 
-            print("Following message converted to bundle:\n")
-            print("%s" % (bundle))
-            print("Bundle sent!\n")
+            print(
+                "Bundle sent! ({0} bytes)\n".format(
+                    sum(len(segment) for segment in bundle)
+                )
+            )
 
         except (ConnectionError, BrokenPipeError) as error:
             raise DaemonConnectionError(
                 "Could not send bundle! Try to connect to daemon again.\n",
                 error,
             )
+
+
+class BundleSerializer:
+    """
+    Serializes bundles in the plain format of the IBRDTN daemon API
+    ("bundle put plain" command) as a list of bytes segments, to be written
+    at once (see send_segments) without joining them.
+
+    The headers constant for a connection (source, destination and
+    processing flags) are encoded once.
+
+    Attributes
+    ----------
+    source_eid : String
+        Full DTN Endpoint identifier of the sending application.
+
+    destination_eid : String
+        DTN Endpoint identifier of the destination application.
+    """
+
+    # Bundle processing flags, with and without custody
+    _FLAGS_CUSTODY = 156
+    _FLAGS_NO_CUSTODY = 148
+
+    def __init__(self, source_eid=None, destination_eid=None):
+        headers = "Source: {0}\nDestination: {1}\n".format(
+            source_eid, destination_eid
+        )
+        # {custody: primary block headers}
+        self._headers = {
+            True: "{0}Processing flags: {1}\n".format(
+                headers, self._FLAGS_CUSTODY
+            ).encode("UTF-8"),
+            False: "{0}Processing flags: {1}\n".format(
+                headers, self._FLAGS_NO_CUSTODY
+            ).encode("UTF-8"),
+        }
+
+    def segments(self, payload=None, custody=None, lifetime=None):
+        """
+        Returns the bundle segments.
+
+        Parameters
+        ----------
+        payload : String or bytes
+            The payload contains a string value (e.g: a JSON string) or a
+            binary payload.
+
+        custody : Boolean
+            Enables the custody processing flag (True), otherwise the bundle
+            does not require custody.
+
+        lifetime : int
+            Bundle lifetime.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode(encoding="UTF-8")
+
+        return [
+            self._headers[custody is True],
+            b"Lifetime: %d\nBlocks: 1\n\nBlock: 1\nFlags: LAST_BLOCK\n"
+            b"Length: %d\n\n" % (lifetime, len(payload)),
+            # The bundle payload is Base64 encoded, straight from the payload
+            # buffer to its own one
+            binascii.b2a_base64(payload, newline=False),
+            b"\n\n",
+        ]
+
+
+def unix_socket_path(address=None):
+    """
+    Returns the socket path of a unix:// daemon address, None for a TCP
+    address.
+    """
+    if address.startswith(UNIX_SOCKET_SCHEME):
+        return address[len(UNIX_SOCKET_SCHEME):]
+
+    return None
+
+
+def send_segments(sock=None, segments=None):
+    """
+    Writes the bytes segments to the socket with scatter-gather writes
+    (sendmsg), resuming after partial writes. Falls back to sendall of the
+    joined segments where sendmsg is not available.
+    """
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(segments))
+        return
+
+    views = [memoryview(segment) for segment in segments if len(segment)]
+    while views:
+        sent = sock.sendmsg(views)
+        # Drops the segments fully written, slices the partially written one
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
@@ -0,0 +1,539 @@
+"""
+Local stand-in of the IBRDTN daemon API, to run and measure the
+communication module without a DTN daemon.
+
+It serves the extended text protocol subset used by IbrdtnDaemon
+("protocol extended", "set endpoint", "registration list", "bundle put
+plain" and "bundle send") over TCP or a Unix domain socket (unix://
+address), records the bundles sent and injects faults: per-command
+latency, connection resets, responses written in small chunks (partial
+reads on the client) and a slow reading of the requests (slow consumer,
+pushing back on the client sends).
+
+Usage (from the src directory):
+
+    python -m sensor_node.communication_module.ibrdtn_stand_in
+        [--host 127.0.0.1 | unix:///tmp/ibrdtn.sock] [--port 4550]
+        [--latency 0] [--network-delay 0] [--reset-rate 0]
+        [--reset-after 0] [--chunk-size 0] [--chunk-delay 0]
+        [--read-chunk-size 65536] [--read-delay 0] [--seed 0]
+"""
+import os
+import stat
+import time
+import base64
+import random
+import socket
+import struct
+import asyncio
+import argparse
+import threading
+
+from collections import namedtuple
+
+from .ibrdtn_daemon import unix_socket_path
+
+
+# Seconds between the Unix epoch and the DTN epoch (2000-01-01)
+DTN_EPOCH = 946684800
+
+# A bundle sent through the stand-in, received_at is its time.monotonic()
+# value
+ReceivedBundle = namedtuple(
+    "ReceivedBundle",
+    [
+        "source",
+        "destination",
+        "processing_flags",
+        "lifetime",
+        "payload",
+        "received_at",
+    ],
+)
+
+
+class IbrdtnStandIn:
+    """
+    IBRDTN daemon API stand-in server (asyncio).
+
+    Attributes
+    ----------
+    host : String
+        Listening address, or unix:// followed by the path of a Unix domain
+        socket (created on start, removed on stop).
+
+    port : int
+        Listening port, 0 picks a free one (see the port attribute once
+        started). Not used with a Unix domain socket.
+
+    node_eid : String
+        DTN Endpoint identifier of the simulated node.
+
+    latency : float or dict
+        Seconds waited before answering a command, for every command or
+        per command name (e.g. {"bundle send": 0.05}): the daemon processing
+        time, the next commands wait.
+
+    network_delay : float
+        Seconds the responses take to reach the client (half a round-trip),
+        the next commands are processed meanwhile. Delayed responses are
+        written at once (see chunk_size).
+
+    reset_rate : float
+        Probability of resetting the connection (TCP RST, or abrupt close
+        of a Unix domain socket) on a command.
+
+    reset_after : int
+        Resets every connection after this amount of commands (0 never).
+
+    chunk_size : int
+        Responses are written in chunks of chunk_size bytes, chunk_delay
+        seconds apart (0 writes them at once).
+
+    read_chunk_size : int
+        Bytes read from a connection at once; read_delay seconds are waited
+        after each read. The connection buffer is limited to this size, so
+        a slow reading pushes back on the client.
+
+    seed : int
+        Seed of the faults random generator.
+    """
+
+    COMMANDS = (
+        "protocol extended",
+        "set endpoint",
+        "registration list",
+        "bundle put plain",
+        "bundle send",
+    )
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        node_eid="dtn://stand-in.dtn",
+        latency=0,
+        network_delay=0,
+        reset_rate=0,
+        reset_after=0,
+        chunk_size=0,
+        chunk_delay=0,
+        read_chunk_size=65536,
+        read_delay=0,
+        seed=0,
+        verbose=False,
+    ):
+        if read_chunk_size < 1:
+            raise ValueError("Read chunk size must be a positive integer.")
+        if not 0 <= reset_rate <= 1:
+            raise ValueError("Reset rate must be in the [0, 1] range.")
+
+        self.host = host
+        self.port = port
+        self.node_eid = node_eid
+        self._latency = latency
+        self._network_delay = network_delay
+        self._reset_rate = reset_rate
+        self._reset_after = reset_after
+        self._chunk_size = chunk_size
+        self._chunk_delay = chunk_delay
+        self._read_chunk_size = read_chunk_size
+        self._read_delay = read_delay
+        self._random = random.Random(seed)
+        self._verbose = verbose
+
+        self._server = None
+        self._handlers = set()
+        self._loop = None
+        self._thread = None
+
+        # Bundles sent, oldest first
+        self.bundles = []
+        self.stats = {
+            "connections": 0,
+            "commands": 0,
+            "resets": 0,
+            "bytes_received": 0,
+        }
+
+    async def start(self):
+        """
+        Starts listening, returns once bound.
+        """
+        socket_path = unix_socket_path(self.host)
+        if socket_path is not None:
+            self._remove_socket_file(socket_path)
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection,
+                path=socket_path,
+                limit=self._read_chunk_size,
+            )
+            self._log("Listening on {0}".format(self.host))
+            return
+
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            host=self.host,
+            port=self.port,
+            limit=self._read_chunk_size,
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._log("Listening on {0}:{1}".format(self.host, self.port))
+
+    async def stop(self):
+        """
+        Stops listening and closes the open connections.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            socket_path = unix_socket_path(self.host)
+            if socket_path is not None:
+                self._remove_socket_file(socket_path)
+
+        for handler in list(self._handlers):
+            handler.cancel()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers))
+
+    def start_thread(self):
+        """
+        Runs the server in an event loop of a background thread, for
+        synchronous callers (e.g. the communication module). Returns once
+        bound.
+        """
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self.start())
+            except Exception as error:
+                errors.append(error)
+                started.set()
+                self._loop.close()
+                return
+
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(
+            target=run, name="ibrdtn-stand-in", daemon=True
+        )
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._thread.join()
+            raise errors[0]
+
+    def stop_thread(self):
+        if self._thread is None:
+            return
+
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    async def _handle_connection(self, reader=None, writer=None):
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        self.stats["connections"] += 1
+        connection = _Connection(
+            reader, self._read_chunk_size, self._read_delay, self.stats
+        )
+        # Endpoint registered and bundle in the register of the connection
+        state = {"endpoint": None, "bundle": None, "commands": 0}
+
+        try:
+            await self._respond(
+                writer, None, "IBR-DTN 1.0.1 (stand-in) API 1.0\n"
+            )
+            while True:
+                line = await connection.readline()
+                if line is None:
+                    return
+
+                command = line.decode("UTF-8", errors="replace").strip()
+                if not command:
+                    continue
+
+                self.stats["commands"] += 1
+                state["commands"] += 1
+                if self._must_reset(state["commands"]):
+                    self._reset(writer)
+                    return
+
+                await self._run_command(connection, writer, command, state)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(handler)
+
+    async def _run_command(
+        self, connection=None, writer=None, command=None, state=None
+    ):
+        name = next(
+            (name for name in self.COMMANDS if command.startswith(name)), None
+        )
+
+        if name == "protocol extended":
+            await self._respond(writer, name, "200 SWITCHED TO EXTENDED\n")
+        elif name == "set endpoint":
+            state["endpoint"] = command[len(name) :].strip()
+            await self._respond(writer, name, "200 OK\n")
+        elif name == "registration list":
+            await self._respond(
+                writer,
+                name,
+                "200 REGISTRATION LIST\n{0}/{1}\n\n".format(
+                    self.node_eid, state["endpoint"] or "stand-in"
+                ),
+            )
+        elif name == "bundle put plain":
+            await self._respond(writer, None, "100 PUT BUNDLE PLAIN\n")
+            try:
+                state["bundle"] = await self._read_bundle(connection)
+            except (ValueError, TypeError):
+                await self._respond(writer, name, "400 BUNDLE PARSE ERROR\n")
+                return
+
+            await self._respond(
+                writer,
+                name,
+                "200 BUNDLE IN REGISTER {0} {1} {2}\n".format(
+                    int(time.time()) - DTN_EPOCH,
+                    len(self.bundles),
+                    state["bundle"].source,
+                ),
+            )
+        elif name == "bundle send":
+            if state["bundle"] is None:
+                await self._respond(
+                    writer, name, "400 NO BUNDLE IN REGISTER\n"
+                )
+                return
+
+            self.bundles.append(state["bundle"])
+            self._log(
+                "Bundle {0} received from {1} ({2} bytes)".format(
+                    len(self.bundles),
+                    state["bundle"].source,
+                    len(state["bundle"].payload),
+                )
+            )
+            state["bundle"] = None
+            await self._respond(writer, name, "200 BUNDLE SENT\n")
+        else:
+            await self._respond(writer, None, "400 UNKNOWN COMMAND\n")
+
+    async def _read_bundle(self, connection=None):
+        """
+        Reads a plain bundle: the primary block headers, then each block
+        headers and Base64 payload, all ended by an empty line.
+        """
+        headers = await self._read_headers(connection)
+        payload = b""
+        for _block in range(int(headers.get("Blocks", 0))):
+            await self._read_headers(connection)
+            lines = []
+            while True:
+                line = await connection.readline()
+                if line is None:
+                    raise ConnectionError("Connection closed in a bundle.")
+                if not line.strip():
+                    break
+                lines.append(line.strip())
+            payload += base64.b64decode(b"".join(lines), validate=True)
+
+        return ReceivedBundle(
+            source=headers.get("Source"),
+            destination=headers.get("Destination"),
+            processing_flags=int(headers.get("Processing flags", 0)),
+            lifetime=int(headers.get("Lifetime", 0)),
+            payload=payload,
+            received_at=time.monotonic(),
+        )
+
+    async def _read_headers(self, connection=None):
+        headers = {}
+        while True:
+            line = await connection.readline()
+            if line is None:
+                raise ConnectionError("Connection closed in a bundle.")
+            line = line.decode("UTF-8").strip()
+            if not line:
+                return headers
+            key, _separator, value = line.partition(":")
+            headers[key.strip()] = value.strip()
+
+    async def _respond(self, writer=None, command=None, response=None):
+        """
+        Writes the response of the command, after its latency.
+        """
+        latency = self._latency
+        if isinstance(latency, dict):
+            latency = latency.get(command, 0)
+        if command is not None and latency:
+            await asyncio.sleep(latency)
+
+        data = response.encode("UTF-8")
+        if self._network_delay:
+            # Sent in order, the delay being the same for every response
+            asyncio.get_event_loop().call_later(
+                self._network_delay, self._write_delayed, writer, data
+            )
+            return
+
+        if not self._chunk_size:
+            writer.write(data)
+            await writer.drain()
+            return
+
+        for offset in range(0, len(data), self._chunk_size):
+            writer.write(data[offset : offset + self._chunk_size])
+            await writer.drain()
+            if self._chunk_delay:
+                await asyncio.sleep(self._chunk_delay)
+
+    def _write_delayed(self, writer=None, data=None):
+        if not writer.is_closing():
+            writer.write(data)
+
+    def _must_reset(self, commands=None):
+        if self._reset_after and commands > self._reset_after:
+            return True
+
+        return (
+            self._reset_rate > 0 and self._random.random() < self._reset_rate
+        )
+
+    def _reset(self, writer=None):
+        """
+        Aborts the connection with a TCP RST, the client gets a
+        ConnectionResetError.
+        """
+        self.stats["resets"] += 1
+        sock = writer.get_extra_info("socket")
+        # No RST on a Unix domain socket, the abort is an abrupt close
+        if sock is not None and sock.family != socket.AF_UNIX:
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+            )
+        writer.transport.abort()
+        self._log("Connection reset")
+
+    @staticmethod
+    def _remove_socket_file(path=None):
+        """
+        Removes the Unix domain socket file at path (e.g. left by a previous
+        run), refusing to remove any other kind of file.
+        """
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            return
+
+        if not stat.S_ISSOCK(mode):
+            raise OSError("{0} exists and is not a socket.".format(path))
+        os.unlink(path)
+
+    def _log(self, text=None):
+        if self._verbose:
+            print("IBRDTN stand-in: {0}".format(text))
+
+
+class _Connection:
+    """
+    Line reader of a connection, reading read_chunk_size bytes at once and
+    waiting read_delay seconds after each read. The bytes read are counted
+    in stats.
+    """
+
+    def __init__(
+        self, reader=None, read_chunk_size=65536, read_delay=0, stats=None
+    ):
+        self._reader = reader
+        self._read_chunk_size = read_chunk_size
+        self._read_delay = read_delay
+        self._stats = stats
+        self._buffer = bytearray()
+
+    async def readline(self):
+        """
+        Returns the next line (bytes), None when the connection is closed.
+        """
+        while b"\n" not in self._buffer:
+            chunk = await self._reader.read(self._read_chunk_size)
+            if not chunk:
+                return None
+            self._buffer += chunk
+            self._stats["bytes_received"] += len(chunk)
+            if self._read_delay:
+                await asyncio.sleep(self._read_delay)
+
+        end = self._buffer.index(b"\n") + 1
+        line = bytes(self._buffer[:end])
+        del self._buffer[:end]
+
+        return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4550)
+    parser.add_argument("--node-eid", default="dtn://stand-in.dtn")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--network-delay", type=float, default=0)
+    parser.add_argument("--reset-rate", type=float, default=0)
+    parser.add_argument("--reset-after", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=0)
+    parser.add_argument("--chunk-delay", type=float, default=0)
+    parser.add_argument("--read-chunk-size", type=int, default=65536)
+    parser.add_argument("--read-delay", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stand_in = IbrdtnStandIn(
+        host=args.host,
+        port=args.port,
+        node_eid=args.node_eid,
+        latency=args.latency,
+        network_delay=args.network_delay,
+        reset_rate=args.reset_rate,
+        reset_after=args.reset_after,
+        chunk_size=args.chunk_size,
+        chunk_delay=args.chunk_delay,
+        read_chunk_size=args.read_chunk_size,
+        read_delay=args.read_delay,
+        seed=args.seed,
+        verbose=True,
+    )
+
+    async def serve():
+        await stand_in.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await stand_in.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print(
+            "IBRDTN stand-in: {0} bundles, {connections} connections, "
+            "{commands} commands, {resets} resets".format(
+                len(stand_in.bundles), **stand_in.stats
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
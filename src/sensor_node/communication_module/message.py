@@ -12,7 +12,8 @@ class Message:
 
     A message have following attributes:
     
-      - payload (String): A JSON string to be sent over the network;
+      - payload (String or bytes): A JSON string or a binary payload
+        (see payload_codec) to be sent over the network;
 
       - custody (Boolean): A boolean flag indicating if DTN custody 
         will be used.
@@ -58,8 +59,11 @@ class Message:
 
     @payload.setter
     def payload(self, value):
-        if not self._is_json(str_json=value) or value is None:
-            raise ValueError("Payload must be a JSON string")
+        if isinstance(value, (bytes, bytearray)):
+            if not value:
+                raise ValueError("Binary payload must not be empty")
+        elif value is None or not self._is_json(str_json=value):
+            raise ValueError("Payload must be a JSON string or bytes")
         self._payload = value
 
     @payload.getter
@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import time
+
+from .message import Message
+
+
+class OutboxException(Exception):
+    """
+    Generic Outbox error.
+    """
+
+
+class Outbox:
+    """
+    Crash-safe, append-only local store of the messages waiting to be
+    delivered to the IBRDTN daemon.
+
+    Messages are kept in a SQLite database in WAL mode with synchronous FULL,
+    so an appended message survives a process crash or a power loss. They are
+    replayed in the same order they were appended and are only removed after
+    being delivered to the daemon (at-least-once delivery: a crash between
+    the delivery and the removal sends the message again).
+
+    Attributes
+    ----------
+    path : String
+        Path of the SQLite database file.
+
+    max_messages : int
+        Maximum amount of messages stored. When the outbox is full, the oldest
+        messages are discarded to make room for the new ones, which keeps the
+        disk usage bounded during long daemon outages.
+    """
+
+    def __init__(self, path=None, max_messages=None):
+        if path is None:
+            raise ValueError("Outbox database path must be informed.")
+        if max_messages is None or max_messages < 1:
+            raise ValueError("Outbox max messages must be a positive integer.")
+
+        self._max_messages = max_messages
+        # The outbox is shared between the sensing and the sending threads
+        self._lock = threading.Lock()
+
+        try:
+            # Autocommit mode, each statement is its own transaction
+            self._connection = sqlite3.connect(
+                path, isolation_level=None, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=FULL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "payload BLOB NOT NULL, "
+                "custody INTEGER, "
+                "lifetime INTEGER NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+        except sqlite3.Error as error:
+            raise OutboxException(
+                "Failed to open outbox database {0}.\n".format(path), error
+            )
+
+    def append(self, message=None):
+        """
+        Appends a message to the end of the outbox.
+
+        Returns the amount of old messages discarded to keep the outbox size
+        under max_messages.
+        """
+        custody = None if message.custody is None else int(message.custody)
+
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute(
+                    "INSERT INTO messages (payload, custody, lifetime, "
+                    "created_at) VALUES (?, ?, ?, ?)",
+                    (message.payload, custody, message.lifetime, time.time()),
+                )
+                discarded = self._connection.execute(
+                    "DELETE FROM messages WHERE id <= (SELECT id FROM "
+                    "messages ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (self._max_messages,),
+                ).rowcount
+                self._connection.execute("COMMIT")
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                raise
+
+        if discarded > 0:
+            print(
+                "Outbox full: {0} oldest message(s) discarded.".format(
+                    discarded
+                )
+            )
+
+        return discarded
+
+    def peek(self, limit=1):
+        """
+        Returns a list with up to limit (id, Message) tuples, oldest first,
+        without removing them from the outbox.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, payload, custody, lifetime FROM messages "
+                "ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+        return [
+            (
+                message_id,
+                Message(
+                    payload=payload,
+                    custody=None if custody is None else bool(custody),
+                    lifetime=lifetime,
+                ),
+            )
+            for message_id, payload, custody, lifetime in rows
+        ]
+
+    def remove(self, message_id=None):
+        """
+        Removes a delivered message from the outbox.
+        """
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM messages WHERE id = ?", (message_id,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM messages"
+            ).fetchone()[0]
+
+    def close(self):
+        """
+        Closes the outbox database.
+        """
+        with self._lock:
+            self._connection.close()
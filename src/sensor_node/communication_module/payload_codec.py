@@ -0,0 +1,887 @@
+import json
+import math
+import uuid
+import zlib
+import struct
+import datetime
+
+
+class PayloadCodecError(ValueError):
+    """
+    Failed to encode or decode a message payload.
+    """
+
+
+class JsonPayloadCodec:
+    """
+    Legacy codec: payloads are sent as a JSON string.
+
+    A single reading payload is sent as is:
+
+        {"sensor_node": {"id": ...}, "reading": {...}}
+
+    A batch sends the sensor node info once followed by the readings:
+
+        {"sensor_node": {"id": ...}, "readings": [{...}, {...}]}
+
+    JSON payloads have no codec id, receivers identify them by the first
+    character ("{").
+    """
+
+    NAME = "json"
+
+    def check_node_id(self, node_id=None):
+        """
+        Any sensor node id can be sent in a JSON payload.
+        """
+
+    def encode(self, payloads=None):
+        """
+        Returns the JSON string of a list of reading payloads.
+        """
+        if len(payloads) == 1:
+            return json.dumps(payloads[0])
+
+        return json.dumps(
+            {
+                "sensor_node": payloads[0]["sensor_node"],
+                "readings": [payload["reading"] for payload in payloads],
+            }
+        )
+
+    def decode(self, data=None):
+        """
+        Returns the list of reading payloads of a JSON payload.
+        """
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode("UTF-8")
+
+        try:
+            content = json.loads(data)
+        except ValueError as error:
+            raise PayloadCodecError("Invalid JSON payload.", error)
+
+        if "readings" not in content:
+            return [content]
+
+        return [
+            {"sensor_node": content["sensor_node"], "reading": reading}
+            for reading in content["readings"]
+        ]
+
+
+# Window statistics of a field of an aggregated reading (see
+# Reading.statistics), the mean being the field value: (name, struct format,
+# scale), a None format and scale meaning the ones of the field
+_STATISTICS_COLUMNS = (
+    ("min", None, None),
+    ("max", None, None),
+    ("stddev", None, None),
+    ("count", "H", 1),
+)
+# Separator of the field and statistic names in the statistics columns keys
+# (e.g. "pm25.max")
+_STATISTICS_SEPARATOR = "."
+
+
+def _statistics_schema(fields=None):
+    """
+    Returns the schema fields followed by the window statistics columns of
+    each field.
+    """
+    columns = list(fields)
+    for key, fmt, scale in fields:
+        for name, column_fmt, column_scale in _STATISTICS_COLUMNS:
+            columns.append(
+                (
+                    key + _STATISTICS_SEPARATOR + name,
+                    column_fmt or fmt,
+                    column_scale or scale,
+                )
+            )
+
+    return tuple(columns)
+
+
+class BinaryPayloadCodec:
+    """
+    Compact binary codec with an explicit schema version.
+
+    All integers are big-endian. A payload is a header followed by one row
+    per reading:
+
+        Header (20 bytes):
+            codec id (uint8) | schema version (uint8) | node uuid (16 bytes) |
+            readings count (uint16)
+
+        Row (18 bytes in schema version 1, 24 bytes in version 2, 67 bytes
+        in version 3 and 99 bytes in version 4):
+            collected_at (uint32, seconds since epoch) |
+            UTC offset (int8, in quarters of hour) |
+            null bitmap (uint8, uint32 in version 3 and uint64 in version 4,
+            bit N set means field N is None) |
+            fields (fixed-point integers, see SCHEMAS)
+
+    Each field is stored as round(value * scale) using the struct format of
+    its schema, so the values keep the precision given by the scale. Values
+    out of the range of their struct format (or not finite) are sent as
+    None. The smallest schema version having all the fields of the readings
+    is used, so a node without MQ sensors sends version 1 payloads.
+    Aggregated readings use versions 3 and 4, which add the window
+    statistics (min, max, stddev and count) of every field. The sensor node
+    id must be an UUID.
+    """
+
+    NAME = "binary"
+    CODEC_ID = 0x01
+    # Schema version => fields as (reading key, struct format, scale)
+    SCHEMAS = {
+        1: (
+            ("pm25", "H", 10),
+            ("pm10", "H", 10),
+            ("temperature", "h", 100),
+            ("relative_humidity", "H", 100),
+            ("pressure", "I", 100),
+        ),
+        # MQ sensors gases: carbon monoxide in ppm (MQ135) and ozone in
+        # µg/m³ (MQ131)
+        2: (
+            ("pm25", "H", 10),
+            ("pm10", "H", 10),
+            ("temperature", "h", 100),
+            ("relative_humidity", "H", 100),
+            ("pressure", "I", 100),
+            ("carbon_monoxide", "I", 100),
+            ("ozone", "H", 10),
+        ),
+    }
+    # Aggregated readings: the versions 1 and 2 fields, followed by their
+    # window statistics
+    SCHEMAS[3] = _statistics_schema(SCHEMAS[1])
+    SCHEMAS[4] = _statistics_schema(SCHEMAS[2])
+
+    # Struct format => range of the values it stores
+    _FORMAT_RANGES = {
+        "H": (0, 0xFFFF),
+        "h": (-0x8000, 0x7FFF),
+        "I": (0, 0xFFFFFFFF),
+    }
+
+    _HEADER = struct.Struct("!BB16sH")
+    _ROW_PREFIX = "!Ib"
+    # Null bitmap struct formats, the smallest one with a bit per field is
+    # used
+    _BITMAP_FORMATS = ("B", "H", "I", "Q")
+
+    def __init__(self):
+        self._rows = {
+            version: struct.Struct(
+                self._ROW_PREFIX
+                + self._bitmap_format(len(fields))
+                + "".join(field[1] for field in fields)
+            )
+            for version, fields in self.SCHEMAS.items()
+        }
+
+    def check_node_id(self, node_id=None):
+        """
+        Raises a PayloadCodecError if the sensor node id is not an UUID.
+        """
+        self._node_id_bytes(node_id)
+
+    def encode(self, payloads=None):
+        """
+        Returns the binary payload (bytes) of a list of reading payloads.
+        """
+        readings = self._flatten_readings(payloads)
+        version = self._select_schema(readings)
+        fields = self.SCHEMAS[version]
+        row = self._rows[version]
+
+        try:
+            data = bytearray(
+                self._HEADER.pack(
+                    self.CODEC_ID,
+                    version,
+                    self._node_id_bytes(payloads[0]["sensor_node"]["id"]),
+                    len(payloads),
+                )
+            )
+
+            for reading in readings:
+                timestamp, offset = self._encode_datetime(
+                    reading["collected_at"]
+                )
+
+                null_bitmap = 0
+                values = []
+                for index, (key, fmt, scale) in enumerate(fields):
+                    value = self._fixed_point(reading.get(key), fmt, scale)
+                    if value is None:
+                        null_bitmap |= 1 << index
+                        values.append(0)
+                    else:
+                        values.append(value)
+
+                data += row.pack(timestamp, offset, null_bitmap, *values)
+        except (struct.error, KeyError, TypeError) as error:
+            raise PayloadCodecError("Failed to encode binary payload.", error)
+
+        return bytes(data)
+
+    def decode(self, data=None):
+        """
+        Returns the list of reading payloads of a binary payload.
+        """
+        try:
+            (
+                codec_id,
+                version,
+                node_id,
+                count,
+            ) = self._HEADER.unpack_from(data, 0)
+
+            if codec_id != self.CODEC_ID:
+                raise PayloadCodecError(
+                    "Invalid codec id: 0x{:02x}".format(codec_id)
+                )
+            if version not in self.SCHEMAS:
+                raise PayloadCodecError(
+                    "Unknown schema version: {0}".format(version)
+                )
+
+            fields = self.SCHEMAS[version]
+            row = self._rows[version]
+            sensor_node = {"id": str(uuid.UUID(bytes=node_id))}
+
+            payloads = []
+            offset = self._HEADER.size
+            for _index in range(count):
+                timestamp, utc_offset, null_bitmap, *values = row.unpack_from(
+                    data, offset
+                )
+                offset += row.size
+
+                reading = {}
+                for index, (key, _fmt, scale) in enumerate(fields):
+                    if null_bitmap & (1 << index):
+                        reading[key] = None
+                    else:
+                        reading[key] = values[index] / scale
+                reading["collected_at"] = self._decode_datetime(
+                    timestamp, utc_offset
+                )
+
+                payloads.append(
+                    {
+                        "sensor_node": dict(sensor_node),
+                        "reading": self._unflatten_statistics(reading),
+                    }
+                )
+        except struct.error as error:
+            raise PayloadCodecError("Truncated binary payload.", error)
+
+        return payloads
+
+    def _flatten_readings(self, payloads=None):
+        """
+        Returns the readings of the payloads, the window statistics of the
+        aggregated ones as statistics columns (see _STATISTICS_COLUMNS).
+        """
+        readings = []
+        try:
+            for payload in payloads:
+                reading = payload["reading"]
+                statistics = reading.get("statistics")
+                if statistics is not None:
+                    reading = dict(reading)
+                    del reading["statistics"]
+                    for field, aggregates in statistics.items():
+                        for name, value in aggregates.items():
+                            # The mean is the field value
+                            if name != "mean":
+                                key = field + _STATISTICS_SEPARATOR + name
+                                reading[key] = value
+                readings.append(reading)
+        except (KeyError, TypeError, AttributeError) as error:
+            raise PayloadCodecError(
+                "Invalid reading payload for the {0} codec.".format(self.NAME),
+                error,
+            )
+
+        return readings
+
+    def _unflatten_statistics(self, reading=None):
+        """
+        Returns the decoded reading with its statistics columns back in the
+        statistics dict, left out when the reading has no statistics.
+        """
+        statistics = {}
+        for key in list(reading):
+            field, separator, name = key.partition(_STATISTICS_SEPARATOR)
+            if not separator:
+                continue
+
+            value = reading.pop(key)
+            if value is None:
+                continue
+            if name == "count":
+                value = int(value)
+            aggregates = statistics.setdefault(
+                field, {"mean": reading.get(field)}
+            )
+            aggregates[name] = value
+
+        if statistics:
+            collected_at = reading.pop("collected_at")
+            reading["statistics"] = statistics
+            reading["collected_at"] = collected_at
+
+        return reading
+
+    def _select_schema(self, readings=None):
+        """
+        Returns the smallest schema version having all the fields of the
+        readings (flattened, see _flatten_readings).
+        """
+        keys = set()
+        for reading in readings:
+            keys.update(reading)
+        keys.discard("collected_at")
+
+        for version in sorted(self.SCHEMAS):
+            if keys.issubset(field[0] for field in self.SCHEMAS[version]):
+                return version
+
+        raise PayloadCodecError(
+            "No {0} payload schema for the reading fields: {1}".format(
+                self.NAME, ", ".join(sorted(keys))
+            )
+        )
+
+    def _bitmap_format(self, size=None):
+        """
+        Returns the struct format of a null bitmap of size fields.
+        """
+        for fmt in self._BITMAP_FORMATS:
+            if size <= struct.calcsize(fmt) * 8:
+                return fmt
+
+        raise ValueError("Too many fields for a null bitmap: {0}".format(size))
+
+    def _fixed_point(self, value=None, fmt=None, scale=None):
+        """
+        Returns the fixed-point integer of a field value, None when the value
+        is None, not finite or out of the range of the struct format.
+        """
+        if value is None or not math.isfinite(value):
+            return None
+
+        value = int(round(value * scale))
+        low, high = self._FORMAT_RANGES[fmt]
+        if not low <= value <= high:
+            return None
+
+        return value
+
+    def _node_id_bytes(self, node_id=None):
+        try:
+            return uuid.UUID(node_id).bytes
+        except (ValueError, TypeError, AttributeError):
+            raise PayloadCodecError(
+                "The {0} payload codec requires an UUID sensor node id, "
+                "got: {1}".format(self.NAME, node_id)
+            )
+
+    def _encode_datetime(self, collected_at=None):
+        """
+        Returns the (epoch seconds, UTC offset in quarters of hour) of an
+        ISO 8601 datetime string.
+        """
+        moment = datetime.datetime.fromisoformat(collected_at)
+        if moment.tzinfo is None:
+            moment = moment.astimezone()
+
+        quarters = int(moment.utcoffset().total_seconds() // 900)
+
+        return int(moment.timestamp()), quarters
+
+    def _decode_datetime(self, timestamp=None, quarters=None):
+        """
+        Returns the ISO 8601 datetime string of an epoch timestamp.
+        """
+        timezone = datetime.timezone(datetime.timedelta(minutes=15 * quarters))
+
+        return datetime.datetime.fromtimestamp(timestamp, timezone).isoformat()
+
+
+class ColumnarPayloadCodec(BinaryPayloadCodec):
+    """
+    Columnar codec for batches of readings, using the same schemas (fields
+    and fixed-point scales) of the binary codec.
+
+    Readings are stored column by column, each value as the varint of the
+    zigzag delta to the previous value of its column. Timestamps advance by
+    the reading interval and the sensor values change slowly, so most
+    values take a single byte. Payload format:
+
+        Header (20 bytes):
+            codec id (uint8) | schema version (uint8) | node uuid (16 bytes) |
+            readings count (uint16)
+
+        Columns: collected_at (seconds since epoch), UTC offset (quarters of
+        hour), then the schema fields in order. Each column is:
+            flags (uint8) | null bitmap | values
+
+    Column flags: bit 0 set means there is a null bitmap (ceil(count / 8)
+    bytes, bit N set means value N is None); bit 1 set means all non-null
+    values are equal and only the first one is stored. Values are varints
+    (7 bits per byte, least significant group first) of the zigzag encoded
+    deltas, the first value being a delta to 0. Values not finite, or
+    beyond 2**53 once scaled, are sent as None.
+
+    The columns are transformed with NumPy, imported on first use (the
+    other codecs do not need it). The codec saves size, not time: parsing
+    the readings dominates, so encoding and decoding cost about the same as
+    the binary codec (a bit more for small batches).
+    """
+
+    NAME = "columnar"
+    CODEC_ID = 0x02
+
+    _HAS_NULLS = 0x01
+    _CONSTANT = 0x02
+
+    # Max amount of bytes of a 64 bits varint
+    _VARINT_MAX_BYTES = 10
+    # Largest integer exactly represented by a float64
+    _MAX_EXACT_INTEGER = 2 ** 53
+
+    def encode(self, payloads=None):
+        """
+        Returns the columnar payload (bytes) of a list of reading payloads.
+        """
+        import numpy as np
+
+        readings = self._flatten_readings(payloads)
+        version = self._select_schema(readings)
+        fields = self.SCHEMAS[version]
+
+        try:
+            data = bytearray(
+                self._HEADER.pack(
+                    self.CODEC_ID,
+                    version,
+                    self._node_id_bytes(payloads[0]["sensor_node"]["id"]),
+                    len(payloads),
+                )
+            )
+
+            timestamps, offsets = zip(
+                *(
+                    self._encode_datetime(reading["collected_at"])
+                    for reading in readings
+                )
+            )
+            data += self._encode_column(np.array(timestamps, dtype=np.int64))
+            data += self._encode_column(np.array(offsets, dtype=np.int64))
+
+            for key, _fmt, scale in fields:
+                column = np.array(
+                    [reading.get(key) for reading in readings], dtype=object
+                )
+                nulls = np.equal(column, None)
+                values = np.zeros(len(column), dtype=np.float64)
+                values[~nulls] = column[~nulls]
+                values = np.rint(values * scale)
+                # Not finite values, and the ones not exact as float64
+                # integers, are sent as None
+                nulls |= ~(np.abs(values) <= self._MAX_EXACT_INTEGER)
+                values[nulls] = 0
+                data += self._encode_column(values.astype(np.int64), nulls)
+        except (struct.error, KeyError, TypeError, ValueError) as error:
+            raise PayloadCodecError(
+                "Failed to encode columnar payload.", error
+            )
+
+        return bytes(data)
+
+    def decode(self, data=None):
+        """
+        Returns the list of reading payloads of a columnar payload.
+        """
+        import numpy as np
+
+        try:
+            codec_id, version, node_id, count = self._HEADER.unpack_from(
+                data, 0
+            )
+        except struct.error as error:
+            raise PayloadCodecError("Truncated columnar payload.", error)
+
+        if codec_id != self.CODEC_ID:
+            raise PayloadCodecError(
+                "Invalid codec id: 0x{:02x}".format(codec_id)
+            )
+        if version not in self.SCHEMAS:
+            raise PayloadCodecError(
+                "Unknown schema version: {0}".format(version)
+            )
+
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        position = self._HEADER.size
+
+        timestamps, _nulls, position = self._decode_column(
+            buffer, position, count
+        )
+        offsets, _nulls, position = self._decode_column(
+            buffer, position, count
+        )
+        columns = []
+        for key, _fmt, scale in self.SCHEMAS[version]:
+            values, nulls, position = self._decode_column(
+                buffer, position, count
+            )
+            scaled = (values / scale).tolist()
+            columns.append(
+                (
+                    key,
+                    [
+                        None if null else value
+                        for value, null in zip(scaled, nulls.tolist())
+                    ],
+                )
+            )
+
+        sensor_node = {"id": str(uuid.UUID(bytes=node_id))}
+        payloads = []
+        for index, (timestamp, offset) in enumerate(
+            zip(timestamps.tolist(), offsets.tolist())
+        ):
+            reading = {key: values[index] for key, values in columns}
+            reading["collected_at"] = self._decode_datetime(timestamp, offset)
+            payloads.append(
+                {
+                    "sensor_node": dict(sensor_node),
+                    "reading": self._unflatten_statistics(reading),
+                }
+            )
+
+        return payloads
+
+    def _encode_column(self, values=None, nulls=None):
+        """
+        Returns the encoded column (bytes) of an int64 array. Values flagged
+        in the nulls boolean array are left out.
+        """
+        import numpy as np
+
+        flags = 0
+        bitmap = b""
+        if nulls is not None and nulls.any():
+            flags |= self._HAS_NULLS
+            bitmap = np.packbits(nulls, bitorder="little").tobytes()
+            values = values[~nulls]
+
+        if len(values) > 1 and (values == values[0]).all():
+            flags |= self._CONSTANT
+            values = values[:1]
+
+        deltas = np.diff(values, prepend=0)
+        zigzag = ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+
+        return bytes((flags,)) + bitmap + self._encode_varints(zigzag)
+
+    def _decode_column(self, buffer=None, position=None, count=None):
+        """
+        Returns the (int64 values, boolean nulls, next position) of the
+        column starting at position. Null values are returned as 0.
+        """
+        import numpy as np
+
+        if position >= len(buffer):
+            raise PayloadCodecError("Truncated columnar payload.")
+
+        flags = int(buffer[position])
+        position += 1
+
+        nulls = np.zeros(count, dtype=bool)
+        if flags & self._HAS_NULLS:
+            bitmap_size = (count + 7) // 8
+            nulls = np.unpackbits(
+                buffer[position : position + bitmap_size],
+                count=count,
+                bitorder="little",
+            ).astype(bool)
+            position += bitmap_size
+
+        present = count - int(nulls.sum())
+        stored = min(present, 1) if flags & self._CONSTANT else present
+
+        zigzag, position = self._decode_varints(buffer, position, stored)
+        deltas = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(
+            zigzag & np.uint64(1)
+        ).astype(np.int64)
+        stored_values = np.cumsum(deltas)
+
+        values = np.zeros(count, dtype=np.int64)
+        if flags & self._CONSTANT:
+            values[~nulls] = stored_values[0] if stored else 0
+        else:
+            values[~nulls] = stored_values
+
+        return values, nulls, position
+
+    def _encode_varints(self, values=None):
+        """
+        Returns the varints (bytes) of an uint64 array.
+        """
+        import numpy as np
+
+        if len(values) == 0:
+            return b""
+
+        shifts = np.arange(self._VARINT_MAX_BYTES, dtype=np.uint64) * 7
+        groups = (values[:, None] >> shifts) & np.uint64(0x7F)
+
+        # Amount of bytes of each varint: up to its highest non-zero group
+        # (one byte for 0)
+        non_zero = groups != 0
+        highest = self._VARINT_MAX_BYTES - 1 - np.argmax(non_zero[:, ::-1], 1)
+        lengths = np.where(non_zero.any(axis=1), highest + 1, 1)
+
+        indexes = np.arange(self._VARINT_MAX_BYTES)
+        used = indexes < lengths[:, None]
+        # Continuation bit on every byte but the last one of each varint
+        continuation = indexes < (lengths - 1)[:, None]
+
+        encoded = groups.astype(np.uint8) | (
+            continuation.astype(np.uint8) << 7
+        )
+
+        return encoded[used].tobytes()
+
+    def _decode_varints(self, buffer=None, position=None, count=None):
+        """
+        Returns the (uint64 array, next position) of count varints starting
+        at position.
+        """
+        import numpy as np
+
+        if count == 0:
+            return np.zeros(0, dtype=np.uint64), position
+
+        window = buffer[position : position + count * self._VARINT_MAX_BYTES]
+        ends = np.flatnonzero(window < 0x80)[:count]
+        if len(ends) < count:
+            raise PayloadCodecError("Truncated columnar payload.")
+
+        size = int(ends[-1]) + 1
+        window = window[:size]
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        # Index of each byte inside its varint
+        owners = np.repeat(np.arange(count), ends - starts + 1)
+        shifts = (np.arange(size) - starts[owners]).astype(np.uint64) * 7
+
+        groups = (window & 0x7F).astype(np.uint64) << shifts
+        values = np.bitwise_or.reduceat(groups, starts)
+
+        return values, position + size
+
+
+class ZlibPayloadCodec:
+    """
+    Compression stage wrapping another payload codec.
+
+    The encoded payload of the inner codec is compressed with raw deflate
+    (zlib). JSON payloads use a preset dictionary built from the reading
+    schema, which lets even a single small reading be compressed; the
+    binary codecs have no text to match, they use no preset dictionary.
+    Payload format:
+
+        codec id (uint8) | dictionary version (uint8) | deflate stream
+
+    The decompressed data is a payload of the inner codec (with its own codec
+    id), so receivers can decode it with decode_payload. Payloads deflate
+    does not make smaller are sent uncompressed, as the inner codec
+    payload.
+    """
+
+    NAME = "zlib"
+    CODEC_ID = 0x10
+    # Inner codec name => preset dictionary version (see DICTIONARIES), the
+    # other codecs use version 0 (no preset dictionary)
+    DICTIONARY_VERSIONS = {JsonPayloadCodec.NAME: 1}
+
+    # Raw deflate stream, without zlib header and checksum (the bundle
+    # already has its own integrity checks)
+    _WBITS = -15
+
+    def __init__(self, codec=None, level=9):
+        if codec is None:
+            raise ValueError("Inner payload codec must be informed.")
+        if level < 0 or level > 9:
+            raise ValueError("Compression level must be between 0 and 9.")
+
+        self._codec = codec
+        self._level = level
+        self._dictionary_version = self.DICTIONARY_VERSIONS.get(
+            codec.NAME, 0
+        )
+
+    def check_node_id(self, node_id=None):
+        self._codec.check_node_id(node_id=node_id)
+
+    def encode(self, payloads=None):
+        """
+        Returns the compressed payload (bytes) of a list of reading payloads,
+        or the inner codec payload when it is not larger.
+        """
+        encoded = self._codec.encode(payloads)
+        data = encoded
+        if isinstance(data, str):
+            data = data.encode("UTF-8")
+
+        compressor = zlib.compressobj(
+            self._level,
+            zlib.DEFLATED,
+            self._WBITS,
+            zdict=DICTIONARIES[self._dictionary_version],
+        )
+        compressed = (
+            bytes((self.CODEC_ID, self._dictionary_version))
+            + compressor.compress(data)
+            + compressor.flush()
+        )
+        if len(compressed) >= len(data):
+            return encoded
+
+        return compressed
+
+    def decode(self, data=None):
+        """
+        Returns the list of reading payloads of a compressed payload, or of
+        the inner codec payload sent uncompressed.
+        """
+        return decode_payload(data)
+
+    @classmethod
+    def decompress(cls, data=None):
+        """
+        Returns the inner codec payload (bytes) of a compressed payload.
+        """
+        if len(data) < 2 or data[0] != cls.CODEC_ID:
+            raise PayloadCodecError("Invalid compressed payload header.")
+        if data[1] not in DICTIONARIES:
+            raise PayloadCodecError(
+                "Unknown compression dictionary version: {0}".format(data[1])
+            )
+
+        decompressor = zlib.decompressobj(
+            cls._WBITS, zdict=DICTIONARIES[data[1]]
+        )
+        try:
+            inner = decompressor.decompress(data[2:]) + decompressor.flush()
+        except zlib.error as error:
+            raise PayloadCodecError("Corrupted compressed payload.", error)
+
+        return inner
+
+
+def _build_json_dictionary():
+    """
+    Returns the preset dictionary of the JSON payloads: the payload keys and
+    the frequent value fragments, the most frequent ones last (deflate
+    encodes closer matches with fewer bits). The collected_at fragment has
+    no UTC offset, so it matches the readings of any timezone.
+    """
+    fragments = [
+        "0123456789",
+        '"readings": [{',
+        '{"sensor_node": {"id": "',
+        '"}, "reading": {',
+        "null, ",
+        '"collected_at": "20',
+        ':00"}',
+        '"pressure": 10',
+        '"relative_humidity": ',
+        '"temperature": ',
+        '"ozone": ',
+        '"carbon_monoxide": ',
+        '"pm10": ',
+        '"pm25": ',
+    ]
+
+    return "".join(fragments).encode("UTF-8")
+
+
+# Dictionary version => preset dictionary. Receivers must keep every version
+# that was ever used, a new version must be added for a different dictionary.
+DICTIONARIES = {
+    # No preset dictionary
+    0: b"",
+    1: _build_json_dictionary(),
+}
+
+
+# Available payload codecs, selected by the MESSAGE_PAYLOAD_CODEC config
+PAYLOAD_CODECS = {
+    JsonPayloadCodec.NAME: JsonPayloadCodec,
+    BinaryPayloadCodec.NAME: BinaryPayloadCodec,
+    ColumnarPayloadCodec.NAME: ColumnarPayloadCodec,
+}
+
+# Available compression stages, selected by the MESSAGE_PAYLOAD_COMPRESSION
+# config ("none" disables compression)
+PAYLOAD_COMPRESSIONS = {
+    ZlibPayloadCodec.NAME: ZlibPayloadCodec,
+}
+
+# Codec id (first payload byte) => codec, used by receivers
+_CODECS_BY_ID = {
+    BinaryPayloadCodec.CODEC_ID: BinaryPayloadCodec,
+    ColumnarPayloadCodec.CODEC_ID: ColumnarPayloadCodec,
+}
+
+
+def create_payload_codec(name=None, compression="none", level=9):
+    """
+    Returns a payload codec instance given its name, optionally wrapped by a
+    compression stage.
+    """
+    if name not in PAYLOAD_CODECS:
+        raise ValueError(
+            "Invalid payload codec {0}, must be one of: {1}".format(
+                name, ", ".join(PAYLOAD_CODECS)
+            )
+        )
+    if compression != "none" and compression not in PAYLOAD_COMPRESSIONS:
+        raise ValueError(
+            "Invalid payload compression {0}, must be none or one of: "
+            "{1}".format(compression, ", ".join(PAYLOAD_COMPRESSIONS))
+        )
+
+    codec = PAYLOAD_CODECS[name]()
+    if compression == "none":
+        return codec
+
+    return PAYLOAD_COMPRESSIONS[compression](codec=codec, level=level)
+
+
+def decode_payload(data=None):
+    """
+    Returns the list of reading payloads of a message payload encoded by any
+    of the payload codecs.
+    """
+    if isinstance(data, str):
+        return JsonPayloadCodec().decode(data)
+    if not data:
+        raise PayloadCodecError("Empty payload.")
+    if data[:1] == b"{":
+        return JsonPayloadCodec().decode(data)
+    if data[0] == ZlibPayloadCodec.CODEC_ID:
+        return decode_payload(ZlibPayloadCodec.decompress(data))
+    if data[0] not in _CODECS_BY_ID:
+        raise PayloadCodecError("Unknown codec id: 0x{:02x}".format(data[0]))
+
+    return _CODECS_BY_ID[data[0]]().decode(data)
@@ -0,0 +1,89 @@
+import asyncio
+
+
+# Overflow policies applied when a reading arrives and the queue is full:
+#   - drop_oldest: discards the oldest queued reading to make room for the
+#     new one;
+#   - drop_newest: discards the new reading, keeping the queued ones;
+#   - block: the producer waits until the consumer frees a slot.
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class ReadingQueue:
+    """
+    Bounded asyncio queue joining the sensing task (producer) and the DTN
+    delivery task (consumer) of the sensor node.
+
+    It must be created inside a running event loop.
+
+    Attributes
+    ----------
+    maxsize : int
+        Maximum amount of items waiting to be delivered.
+
+    overflow_policy : String
+        What to do when an item arrives and the queue is full. Must be one of
+        OVERFLOW_POLICIES.
+    """
+
+    def __init__(self, maxsize=None, overflow_policy=DROP_OLDEST):
+        if maxsize is None or maxsize < 1:
+            raise ValueError("Queue maxsize must be a positive integer.")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "Invalid queue overflow policy, must be one of: {0}".format(
+                    ", ".join(OVERFLOW_POLICIES)
+                )
+            )
+
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._overflow_policy = overflow_policy
+        # Amount of items discarded due to the overflow policy
+        self.dropped = 0
+
+    async def put(self, item):
+        """
+        Puts an item in the queue applying the overflow policy.
+
+        Returns True if the item was queued. Otherwise, returns False.
+        """
+        if self._overflow_policy == BLOCK:
+            await self._queue.put(item)
+            return True
+
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+            if self._overflow_policy == DROP_NEWEST:
+                return False
+
+            # DROP_OLDEST: frees a slot discarding the oldest item
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self._queue.put_nowait(item)
+
+        return True
+
+    async def get(self):
+        """
+        Removes and returns the oldest item, waiting until one is available.
+        """
+        return await self._queue.get()
+
+    def task_done(self):
+        """
+        Indicates that a item retrieved with get was processed.
+        """
+        self._queue.task_done()
+
+    def qsize(self):
+        """
+        Returns the amount of items waiting in the queue.
+        """
+        return self._queue.qsize()
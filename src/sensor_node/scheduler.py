@@ -0,0 +1,126 @@
+import time
+import asyncio
+
+
+class DeadlineScheduler:
+    """
+    Fires cycles on a fixed grid of time.monotonic() deadlines, so the
+    period does not drift with the time spent in each cycle.
+
+    The grid is aligned to wall-clock multiples of the interval (e.g. every
+    minute at :00 seconds for a 60 seconds interval), so readings from
+    different nodes line up in time. It is realigned when the wall clock
+    phase drifts more than max_phase_error seconds (e.g. the system clock
+    set by NTP after booting without a RTC).
+
+    A cycle that runs over the next deadline makes the next one start late
+    (counted in 'late'), and the slots that passed entirely are skipped
+    (counted in 'missed').
+
+    Attributes
+    ----------
+    interval : float
+        Seconds between cycles.
+
+    align : bool
+        Aligns the deadlines to wall-clock multiples of the interval.
+
+    max_phase_error : float
+        Seconds of wall clock phase error before realigning the grid.
+
+    clock : function
+        Monotonic clock, in seconds (time.monotonic).
+
+    wall_clock : function
+        Wall clock, in seconds since epoch (time.time).
+    """
+
+    def __init__(
+        self,
+        interval=None,
+        align=True,
+        max_phase_error=1.0,
+        clock=time.monotonic,
+        wall_clock=time.time,
+    ):
+        if interval is None or interval <= 0:
+            raise ValueError("Scheduler interval must be positive.")
+
+        self._interval = interval
+        self._align = align
+        self._max_phase_error = max_phase_error
+        self._clock = clock
+        self._wall_clock = wall_clock
+
+        self._deadline = self._first_deadline()
+        self.cycles = 0
+        self.late = 0
+        self.missed = 0
+        self.realignments = 0
+
+    @property
+    def next_deadline(self):
+        """
+        time.monotonic() value of the next cycle start.
+        """
+        return self._deadline
+
+    def wait(self):
+        """
+        Blocks until the next deadline.
+
+        Returns the amount of slots skipped since the previous cycle.
+        """
+        delay, missed = self.advance()
+        if delay > 0:
+            time.sleep(delay)
+
+        return missed
+
+    async def async_wait(self):
+        """
+        Asyncio version of wait.
+        """
+        delay, missed = self.advance()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        return missed
+
+    def _first_deadline(self):
+        if not self._align:
+            return self._clock()
+
+        return self._clock() + (-self._wall_clock()) % self._interval
+
+    def advance(self):
+        """
+        Consumes the next deadline, returns (seconds until it, missed slots).
+        Used by wait, or directly when sleeping on something else (e.g. a
+        threading.Event wait, to be interruptible).
+        """
+        now = self._clock()
+        deadline = self._deadline
+        missed = 0
+
+        if self.cycles == 0 and not self._align:
+            # Not aligned, the grid starts with the first cycle (the deadline
+            # set at creation has just passed)
+            deadline = now
+
+        if now > deadline:
+            missed = int((now - deadline) // self._interval)
+            deadline += missed * self._interval
+            self.missed += missed
+            if now > deadline:
+                self.late += 1
+        elif self._align:
+            phase = (self._wall_clock() + deadline - now) % self._interval
+            if min(phase, self._interval - phase) > self._max_phase_error:
+                deadline = self._first_deadline()
+                self.realignments += 1
+
+        self._deadline = deadline + self._interval
+        self.cycles += 1
+
+        return max(0.0, deadline - now), missed
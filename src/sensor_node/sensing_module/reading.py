@@ -14,12 +14,21 @@ class Reading:
         temperature=None,
         relative_humidity=None,
         pressure=None,
+        gases=None,
+        statistics=None,
     ):
         self.pm25 = pm25
         self.pm10 = pm10
         self.temperature = temperature
         self.relative_humidity = relative_humidity
         self.pressure = pressure
+        # Gas concentrations measured by the MQ sensors fitted in the node
+        # (e.g. {"carbon_monoxide": 12.5}), only the fitted sensors appear
+        self.gases = dict(gases) if gases is not None else {}
+        # Aggregated readings: the values are window means and statistics
+        # has the window aggregates per field, as {field: {"mean": ...,
+        # "min": ..., "max": ..., "stddev": ..., "count": ...}}
+        self.statistics = statistics
         self.collected_at = self._register_collected_at_date()
 
     def _register_collected_at_date(self):
@@ -46,7 +55,10 @@ class Reading:
             "temperature": self.temperature,
             "relative_humidity": self.relative_humidity,
             "pressure": self.pressure,
-            "collected_at": self.collected_at,
         }
+        reading.update(self.gases)
+        if self.statistics is not None:
+            reading["statistics"] = self.statistics
+        reading["collected_at"] = self.collected_at
 
         return reading
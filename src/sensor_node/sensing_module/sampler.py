@@ -0,0 +1,85 @@
+import threading
+
+from ..scheduler import DeadlineScheduler
+
+
+class PeriodicSampler:
+    """
+    Background thread calling a sampling function every interval seconds,
+    on the deadline grid of a DeadlineScheduler.
+
+    Attributes
+    ----------
+    name : String
+        Sampler name, used in the thread name and messages.
+
+    interval : float
+        Seconds between samples.
+
+    sample : function
+        Takes a sample. The exceptions in exceptions are counted in 'errors'
+        and reported, the sampler keeps running.
+
+    exceptions : tuple
+        Exceptions expected from the sample function.
+    """
+
+    def __init__(self, name=None, interval=None, sample=None, exceptions=()):
+        if sample is None:
+            raise ValueError("Sampling function must be informed.")
+
+        self.name = name
+        self._sample = sample
+        self._interval = interval
+        self._exceptions = exceptions
+        self._scheduler = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.errors = 0
+
+    @property
+    def next_deadline(self):
+        """
+        time.monotonic() value of the next sample, None when not started.
+        """
+        if self._scheduler is None:
+            return None
+
+        return self._scheduler.next_deadline
+
+    def start(self):
+        """
+        Starts the sampler thread, if not running yet.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._scheduler = DeadlineScheduler(
+            interval=self._interval, align=False
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="sampler-{0}".format(self.name), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the sampler thread, after the sample being taken (if any).
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            delay, _missed = self._scheduler.advance()
+            if self._stop.wait(delay):
+                return
+
+            try:
+                self._sample()
+            except self._exceptions as e:
+                self.errors += 1
+                print("Failed to sample {0}: ".format(self.name), e)
@@ -1,12 +1,20 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
 from environs import Env
 
-from pms7003 import PmsSensorException
+from .sensors.pms_uart import PmsSensorException
 from .sensors.bme280 import BME280Exception
 
 from .sensors.bme280 import BME280
 from .sensors.pms import PMS7003
+from .sensors.adc_sampler import AdcSampler
+from .sensors.ro_store import RoStore
 
 from .reading import Reading
+from .sampler import PeriodicSampler
+from .statistics import RunningStatistics
 
 # Load enviroment variables
 env = Env()
@@ -28,6 +36,20 @@ class SensingModuleCreationError(SensingModuleException):
 class SensingModule:
     """
     Class that represents the sensing module of the Sensor Node.
+
+    Independent sensors are read concurrently on a small thread pool, so a
+    reading cycle takes about as long as the slowest sensor.
+
+    Sensors can also be sampled at their own rate (BME280_SAMPLING_INTERVAL,
+    PMS7003_SAMPLING_INTERVAL and MQ_SAMPLING_INTERVAL, in seconds) by
+    background samplers. A reading then reports, for each field, the
+    aggregates (mean, min, max, stddev and count) of the samples taken since
+    the previous reading, with the means as the reading values. Sensors
+    without a sampling interval are sampled once per reading.
+
+    The sensors warm up concurrently in the background (see
+    calibrate_sensors). Until a sensor is ready, the readings have its
+    fields as None (invalid) and the other sensors fields are reported.
     """
 
     def __init__(self):
@@ -35,20 +57,236 @@ class SensingModule:
         try:
             self._bme280 = BME280()
             self._pms7003 = PMS7003()
+
+            # Optional MQ sensors, as {reading field: (sensor, getter)}
+            self._mq_sensors = {}
+            self._read_exceptions = (
+                BME280Exception,
+                PmsSensorException,
+                ValueError,
+                RuntimeError,
+            )
+
+            if env.bool("MQ135_ENABLED", default=False):
+                from .sensors.mq import MQSensorException
+                from .sensors.mq135 import MQ135
+
+                mq135 = MQ135()
+                self._mq_sensors["carbon_monoxide"] = (
+                    mq135,
+                    mq135.get_carbon_monoxide,
+                )
+                self._read_exceptions += (MQSensorException,)
+
+            if env.bool("MQ131_ENABLED", default=False):
+                from .sensors.mq import MQSensorException
+                from .sensors.mq131 import MQ131
+
+                mq131 = MQ131()
+                self._mq_sensors["ozone"] = (mq131, mq131.get_ozone)
+                self._read_exceptions += (MQSensorException,)
+
+            # MQ sensors Ro calibrations, saved and reused across restarts,
+            # and refreshed in clean air (see _refresh_ro)
+            self._ro_refresh = None
+            self._ro_refresh_enabled = env.bool(
+                "MQ_RO_REFRESH_ENABLED", default=True
+            )
+            self._ro_refresh_alpha = env.float(
+                "MQ_RO_REFRESH_ALPHA", default=0.1
+            )
+            self._ro_refresh_interval = env.float(
+                "MQ_RO_REFRESH_INTERVAL", default=86400
+            )
+            self._clean_air_max_pm25 = env.float(
+                "MQ_CLEAN_AIR_MAX_PM25", default=12.0
+            )
+            self._clean_air_max_pm10 = env.float(
+                "MQ_CLEAN_AIR_MAX_PM10", default=54.0
+            )
+            ro_store_path = env.str("MQ_RO_STORE_PATH", default="mq_ro.json")
+            if self._mq_sensors and ro_store_path:
+                ro_store = RoStore(path=ro_store_path)
+                for sensor, _getter in self._mq_sensors.values():
+                    sensor.attach_ro_store(ro_store)
+
+            # MQ sensors ADC channels sampled in the background, so their
+            # readings do not block sampling and sleeping
+            self._adc_sampler = None
+            if self._mq_sensors and env.bool(
+                "ADC_SAMPLING_ENABLED", default=False
+            ):
+                from .sensors.adc import ADC
+
+                # All the channels raw values read in a single SPI
+                # transaction, converted by the MQ sensors RS tables
+                self._adc_sampler = AdcSampler(
+                    interval=env.float("ADC_SAMPLING_INTERVAL", default=0.1),
+                    window=env.float("ADC_SAMPLING_WINDOW", default=2.5),
+                    ema_alpha=env.float("ADC_SAMPLING_EMA_ALPHA", default=0),
+                    scan=lambda channels: ADC.scan(channels)[0],
+                )
+                for sensor, _getter in self._mq_sensors.values():
+                    sensor.attach_sampler(self._adc_sampler)
+
+            # Multi-rate sampling: {sensors group: sampling function}, the
+            # groups with a sampling interval get a background sampler
+            sampling = {
+                "bme280": self._sample_environment,
+                "pms7003": self._sample_particulate_matter,
+            }
+            intervals = {
+                "bme280": env.float("BME280_SAMPLING_INTERVAL", default=0),
+                "pms7003": env.float("PMS7003_SAMPLING_INTERVAL", default=0),
+            }
+            if self._mq_sensors:
+                sampling["mq"] = self._sample_gases
+                intervals["mq"] = env.float("MQ_SAMPLING_INTERVAL", default=0)
+
+            self._samplers = {}
+            for group, interval in intervals.items():
+                if interval < 0:
+                    raise ValueError(
+                        "{0} sampling interval must not be negative".format(
+                            group
+                        )
+                    )
+                if interval > 0:
+                    self._samplers[group] = PeriodicSampler(
+                        name=group,
+                        interval=interval,
+                        sample=sampling[group],
+                        exceptions=self._read_exceptions,
+                    )
+            # Sampled once per reading, as {sensors group: sampling function}
+            self._unsampled = {
+                group: sample
+                for group, sample in sampling.items()
+                if group not in self._samplers
+            }
+
+            # Warm-up state, as {sensors group: threading.Event set when
+            # the group is ready}
+            self._ready = {group: threading.Event() for group in sampling}
+            self._sampling_started = False
+            self._sampling_lock = threading.Lock()
+
+            # Aggregates of the current window, as {field: RunningStatistics}
+            self._statistics = {}
+            self._statistics_lock = threading.Lock()
+
+            # One worker per independent sensor (BME280, PMS7003 and each MQ)
+            self._executor = ThreadPoolExecutor(
+                max_workers=env.int(
+                    "SENSING_MODULE_WORKERS",
+                    default=2 + len(self._mq_sensors),
+                )
+            )
         except ValueError as error:
             raise SensingModuleCreationError(
                 "Failed to create the Sensing Module: ", error
             )
 
     def calibrate_sensors(self):
-        self._bme280.calibrate()
-        self._pms7003.calibrate()
+        """
+        Starts the warm-up of every sensor, concurrently, and returns
+        immediately. Each sensor is ready (see is_ready) when its warm-up
+        ends, so the startup takes the longest warm-up (e.g. the MQ sensors
+        pre-heat) instead of their sum.
+        """
+        warm_ups = {
+            "bme280": self._bme280.calibrate,
+            "pms7003": self._pms7003.calibrate,
+        }
+        # The MQ sensors pre-heat can be done once for all the MQ sensors
+        if self._mq_sensors:
+            if self._adc_sampler is not None:
+                self._adc_sampler.start()
+            sensor, _getter = next(iter(self._mq_sensors.values()))
+            warm_ups["mq"] = sensor.calibrate
+
+        for group, warm_up in warm_ups.items():
+            threading.Thread(
+                target=self._warm_up,
+                args=(group, warm_up),
+                name="warm-up-{0}".format(group),
+                daemon=True,
+            ).start()
+
+    def is_ready(self, group=None):
+        """
+        Returns True if the sensors group ("bme280", "pms7003" or "mq")
+        finished its warm-up. Otherwise, returns False.
+        """
+        return self._ready[group].is_set()
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Blocks until every sensor is ready, or timeout seconds. Returns True
+        if every sensor is ready. Otherwise, returns False.
+        """
+        for ready in self._ready.values():
+            if not ready.wait(timeout):
+                return False
+
+        return True
+
+    def _warm_up(self, group=None, warm_up=None):
+        try:
+            warm_up()
+        except Exception as e:
+            # The sensor is read anyway, its readings report the problem
+            print("Failed to warm up {0}: ".format(group), e)
+
+        with self._sampling_lock:
+            self._ready[group].set()
+            if self._sampling_started and group in self._samplers:
+                self._samplers[group].start()
+        print("Sensors {0} ready.".format(group))
+
+    def start_sampling(self):
+        """
+        Starts the background samplers of the sensors with a sampling
+        interval, if any. The sampler of a sensor still warming up starts
+        when it is ready.
+        """
+        with self._sampling_lock:
+            self._sampling_started = True
+            for group, sampler in self._samplers.items():
+                if self.is_ready(group):
+                    sampler.start()
+
+    def stop_sampling(self):
+        for sampler in self._samplers.values():
+            sampler.stop()
+        if self._adc_sampler is not None:
+            self._adc_sampler.stop()
 
     def read_sensors(self):
         """
         When successful to read sensors, returns a Reading object.
         Otherwise, returns None.
+
+        The BME280, the PMS7003 and the MQ sensors are read concurrently. The
+        PMS7003 and MQ working conditions checks depend on the temperature
+        and humidity read by the BME280, so they wait for it.
+
+        With multi-rate sampling, returns the aggregated reading of the
+        samples taken since the previous reading.
+
+        The fields of the sensors not ready yet are None.
         """
+        if self._samplers:
+            return self._read_aggregates()
+
+        if not self.is_ready("bme280"):
+            # Working conditions of the other sensors are unknown
+            print("Waiting for the BME280 warm-up...")
+            return None
+
+        pms_ready = self.is_ready("pms7003")
+        mq_ready = bool(self._mq_sensors) and self.is_ready("mq")
+        futures = []
 
         try:
             # Reads DHT11 (Can take up to 30 seconds)
@@ -64,44 +302,233 @@ class SensingModule:
             #     humidity = self._dht11.get_humidity()
             #     time.sleep(2)
 
-            # Reads MQ135
-            # carbon_monoxide = self._mq135.get_carbon_monoxide(
-            #     current_humidity=relative_humidity,
-            #     current_temperature=temperature,
-            # )
-
-            # Reads MQ131
-            # ozone = self._mq131.get_ozone(
-            #     current_humidity=relative_humidity,
-            #     current_temperature=temperature,
-            # )
-
-            relative_humidity = self._bme280.get_humidity()
-            temperature = self._bme280.get_temperature()
-            pressure = self._bme280.get_pressure()
-
-            particulate_matter = self._pms7003.get_particulate_matter(
-                current_humidity=relative_humidity,
-                current_temperature=temperature,
-            )
+            # Acquisition: every sensor is queried at the same time
+            environment = self._executor.submit(self._read_environment)
+            futures = [environment]
+            if pms_ready:
+                particulate_matter = self._executor.submit(
+                    self._pms7003.read_particulate_matter
+                )
+                futures.append(particulate_matter)
+            gas_concentrations = {}
+            if mq_ready:
+                gas_concentrations = {
+                    field: self._executor.submit(
+                        sensor.measure_gas_concentration
+                    )
+                    for field, (sensor, _getter) in self._mq_sensors.items()
+                }
+                futures += list(gas_concentrations.values())
+
+            # Working conditions checks: depend on temperature and humidity
+            relative_humidity, temperature, pressure = environment.result()
+
+            if pms_ready:
+                particulate_matter = self._pms7003.get_particulate_matter(
+                    current_humidity=relative_humidity,
+                    current_temperature=temperature,
+                    particulate_matter=particulate_matter,
+                )
+            else:
+                particulate_matter = {"pm2_5": None, "pm10": None}
 
-            return Reading(
+            gases = {}
+            for field, (_sensor, getter) in self._mq_sensors.items():
+                gases[field] = None
+                if mq_ready:
+                    gases[field] = getter(
+                        current_humidity=relative_humidity,
+                        current_temperature=temperature,
+                        gas_concentration=gas_concentrations[field].result(),
+                    )
+
+            reading = Reading(
                 pm25=particulate_matter["pm2_5"],
                 pm10=particulate_matter["pm10"],
                 temperature=temperature,
                 relative_humidity=relative_humidity,
                 pressure=pressure,
+                gases=gases,
             )
+            self._refresh_ro(reading)
+
+            return reading
 
-        except (
-            BME280Exception,
-            # MQSensorException,
-            PmsSensorException,
-            ValueError,
-            RuntimeError,
-        ) as e:
+        except self._read_exceptions as e:
             print("Failed to get sensors reading, try again...\n", e)
             return None
+        finally:
+            # Never leaves a sensor being read by the next cycle
+            wait(futures)
+
+    def schedule_next_reading(self, next_reading_at=None):
+        """
+        Informs the time of the next reading (time.monotonic() value), so
+        duty-cycled sensors can sleep until their warm-up must start.
+        """
+        if "pms7003" in self._samplers or not self.is_ready("pms7003"):
+            # Scheduled by its sampler, before each sample, and never put to
+            # sleep while warming up
+            return
+
+        try:
+            self._pms7003.schedule_next_reading(
+                next_reading_at=next_reading_at
+            )
+        except PmsSensorException as e:
+            print("Failed to put the PMS7003 to sleep.\n", e)
+
+    def _read_aggregates(self):
+        """
+        Samples the sensors without a sampling interval, then returns a
+        Reading with the aggregates of the current window and starts a new
+        window. Returns None when there is no sample in the window.
+        """
+        futures = [
+            self._executor.submit(sample)
+            for group, sample in self._unsampled.items()
+            if self.is_ready(group)
+        ]
+        try:
+            for future in futures:
+                future.result()
+        except self._read_exceptions as e:
+            print("Failed to get sensors reading, try again...\n", e)
+        finally:
+            wait(futures)
+
+        with self._statistics_lock:
+            statistics = self._statistics
+            self._statistics = {}
+
+        if not statistics:
+            print("No sensor samples since the previous reading.")
+            return None
+
+        means = {
+            field: round(aggregate.mean, 3)
+            for field, aggregate in statistics.items()
+        }
+
+        reading = Reading(
+            pm25=means.get("pm25"),
+            pm10=means.get("pm10"),
+            temperature=means.get("temperature"),
+            relative_humidity=means.get("relative_humidity"),
+            pressure=means.get("pressure"),
+            gases={field: means.get(field) for field in self._mq_sensors},
+            statistics={
+                field: aggregate.to_dict()
+                for field, aggregate in statistics.items()
+            },
+        )
+        self._refresh_ro(reading)
+
+        return reading
+
+    def _refresh_ro(self, reading=None):
+        """
+        When the reading PM values show clean air (MQ_CLEAN_AIR_MAX_PM25 and
+        MQ_CLEAN_AIR_MAX_PM10), refreshes the MQ sensors Ro in the
+        background (see MQSensor.refresh_ro). Does not wait for it.
+        """
+        if (
+            not self._mq_sensors
+            or not self._ro_refresh_enabled
+            or not self.is_ready("mq")
+            or reading.pm25 is None
+            or reading.pm10 is None
+            or reading.temperature is None
+            or reading.relative_humidity is None
+            or reading.pm25 > self._clean_air_max_pm25
+            or reading.pm10 > self._clean_air_max_pm10
+            or (self._ro_refresh is not None and not self._ro_refresh.done())
+        ):
+            return
+
+        self._ro_refresh = self._executor.submit(
+            self._refresh_mq_ro,
+            reading.relative_humidity,
+            reading.temperature,
+        )
+
+    def _refresh_mq_ro(self, relative_humidity=None, temperature=None):
+        for sensor, _getter in self._mq_sensors.values():
+            try:
+                sensor.refresh_ro(
+                    current_humidity=relative_humidity,
+                    current_temperature=temperature,
+                    alpha=self._ro_refresh_alpha,
+                    min_interval=self._ro_refresh_interval,
+                )
+            except (self._read_exceptions + (OSError,)) as e:
+                print("Failed to refresh {0} Ro: ".format(sensor.NAME), e)
+
+    def _aggregate(self, values=None):
+        """
+        Adds the sampled values (a dict by reading field) to the current
+        window aggregates, skipping None (invalid) values.
+        """
+        with self._statistics_lock:
+            for field, value in values.items():
+                if value is not None:
+                    self._statistics.setdefault(
+                        field, RunningStatistics()
+                    ).add(value)
+
+    def _sample_environment(self):
+        relative_humidity, temperature, pressure = self._read_environment()
+
+        self._aggregate(
+            {
+                "temperature": temperature,
+                "relative_humidity": relative_humidity,
+                "pressure": pressure,
+            }
+        )
+
+    def _sample_particulate_matter(self):
+        # Working conditions of the latest BME280 snapshot
+        relative_humidity, temperature, _pressure = self._read_environment()
+
+        particulate_matter = self._pms7003.get_particulate_matter(
+            current_humidity=relative_humidity,
+            current_temperature=temperature,
+        )
+        self._aggregate(
+            {
+                "pm25": particulate_matter["pm2_5"],
+                "pm10": particulate_matter["pm10"],
+            }
+        )
+
+        sampler = self._samplers.get("pms7003")
+        if sampler is not None:
+            self._pms7003.schedule_next_reading(
+                next_reading_at=sampler.next_deadline
+            )
+
+    def _sample_gases(self):
+        relative_humidity, temperature, _pressure = self._read_environment()
+
+        self._aggregate(
+            {
+                field: getter(
+                    current_humidity=relative_humidity,
+                    current_temperature=temperature,
+                )
+                for field, (_sensor, getter) in self._mq_sensors.items()
+            }
+        )
+
+    def _read_environment(self):
+        """
+        Returns the (humidity, temperature, pressure) read by the BME280,
+        all from the same snapshot.
+        """
+        snapshot = self._bme280.snapshot()
+
+        return snapshot.humidity, snapshot.temperature, snapshot.pressure
 
     # def calibrate_mq135_ro(self):
     #     """
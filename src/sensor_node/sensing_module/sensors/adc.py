@@ -1,70 +1,165 @@
-import busio
-import digitalio
-import board
+import threading
 
-import adafruit_mcp3xxx.mcp3008 as MCP
-from adafruit_mcp3xxx.analog_in import AnalogIn
+import numpy as np
 
+from .backends import HARDWARE, create_backend, register_backend
 
-class ADC:
-
-    # Its the same spi bus, cs object and mcp object for all ADC instances.
-    # The difference between instances is the channel attribute
 
-    # create the spi bus
-    _spi = busio.SPI(clock=board.SCK, MISO=board.MISO, MOSI=board.MOSI)
-
-    # create the cs (chip select)
-    _cs = digitalio.DigitalInOut(board.D5)
+class ADC:
 
-    # create the mcp object
-    _mcp = MCP.MCP3008(_spi, _cs)
+    # Its the same spi bus and cs object for all ADC instances.
+    # The difference between instances is the channel attribute.
+    # They are created on first use (see _get_bus), so importing this module
+    # does not need the SPI bus nor the Adafruit libraries.
+    _spi = None
+    _cs = None
+    _hardware_lock = threading.Lock()
 
     # ADC maximum resolution value
     ADC_MAX_RESOLUTION = 1023.0
+    # ADC reference voltage (Raspberry 3.3V)
+    REFERENCE_VOLTAGE = 3.3
+
+    # SPI clock of the scans (the MCP3008 supports up to 1.35MHz at 2.7V)
+    SPI_BAUDRATE = 1000000
+    # MCP3008 channels and amount of possible raw values (10 bits)
+    CHANNELS = 8
+    CODES = 1024
 
     def __init__(self, pin_adc=None):
 
         # ADC channel value, be careful to not use one channel for more than one device!
-        self._channel = None
-
-        # Create an analog input channel on the MCP3008 according to pin_adc value
         if pin_adc is None:
             raise ValueError("pin_adc needs to be informed.")
-        elif pin_adc == 0:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P0)
-        elif pin_adc == 1:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P1)
-        elif pin_adc == 2:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P2)
-        elif pin_adc == 3:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P3)
-        elif pin_adc == 4:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P4)
-        elif pin_adc == 5:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P5)
-        elif pin_adc == 6:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P6)
-        elif pin_adc == 7:
-            self._channel = AnalogIn(type(self)._mcp, MCP.P7)
-        else:
+        if pin_adc not in range(self.CHANNELS):
             raise ValueError(
                 "Invalid pin value. Pin value must be an integer value between 0 and 7"
             )
 
+        self._pin_adc = pin_adc
+
+    @classmethod
+    def _get_bus(cls):
+        """
+        Returns the (SPI bus, chip select) tuple of the configured backend
+        (see backends), created on the first call.
+        """
+        with cls._hardware_lock:
+            if cls._spi is None:
+                cls._spi, cls._cs = create_backend("mcp3008")
+
+        return cls._spi, cls._cs
+
     def read_raw_value(self):
         """Returns the adc raw value for the pin informed as an integer."""
+        codes, _voltages = self.scan([self._pin_adc])
 
-        # the raw ADC value is encoded on 16 bits to match other ADCs
-        # It is necessary to shift the adc output 6 bits down to convert to 10 bits
-        # as the MCP3008 only has 10 bits
-        return self._channel.value >> 6
+        return int(codes[0])
 
     def read_voltage(self):
         """Returns the voltage from the ADC pin as a floating point value."""
         # The voltage value is scaled 16 bits to remain consistent with other ADCs.
-        return self._channel.voltage
+        return float(self.code_voltages(self.read_raw_value()))
 
     def read_adc_max_resolution(self):
         """Returns the adc max resolution value"""
         return self.ADC_MAX_RESOLUTION
+
+    @classmethod
+    def scan(cls, channels=None):
+        """
+        Reads the channels in a single SPI bus transaction (see scan_batch).
+
+        Returns a tuple of NumPy arrays (raw 10 bits values, voltages), in
+        the channels order.
+        """
+        codes, voltages = cls.scan_batch(channels=channels, count=1)
+
+        return codes[0], voltages[0]
+
+    @classmethod
+    def scan_batch(cls, channels=None, count=1):
+        """
+        Reads count scans of the channels (single-ended) back-to-back, while
+        holding the SPI bus once, instead of a bus lock and configuration per
+        value.
+
+        Returns a tuple of 2-D NumPy arrays (raw 10 bits values, voltages),
+        with one row per scan and one column per channel. Voltages are
+        computed like AnalogIn.voltage.
+
+        Parameters
+        ----------
+        channels : list
+            MCP3008 channels (0 to 7).
+
+        count : int
+            Amount of scans.
+        """
+        if not channels:
+            raise ValueError("channels needs to be informed.")
+        if any(channel not in range(cls.CHANNELS) for channel in channels):
+            raise ValueError(
+                "Invalid pin value. Pin value must be an integer value between 0 and 7"
+            )
+        if count < 1:
+            raise ValueError("count must be a positive integer.")
+
+        # Per conversion: start bit, single-ended mode and channel, then the
+        # 10 bits result is clocked in the last 2 bytes
+        requests = [
+            bytes((0x01, (0x08 | channel) << 4, 0x00)) for channel in channels
+        ]
+        response = bytearray(3 * len(channels) * count)
+        view = memoryview(response)
+
+        spi, cs = cls._get_bus()
+        while not spi.try_lock():
+            pass
+        try:
+            spi.configure(baudrate=cls.SPI_BAUDRATE, polarity=0, phase=0)
+            offset = 0
+            for _scan in range(count):
+                for request in requests:
+                    # The MCP3008 starts a conversion on each chip select
+                    cs.value = False
+                    spi.write_readinto(request, view[offset : offset + 3])
+                    cs.value = True
+                    offset += 3
+        finally:
+            spi.unlock()
+
+        data = np.frombuffer(response, dtype=np.uint8).reshape(
+            count, len(channels), 3
+        )
+        codes = ((data[..., 1].astype(np.uint16) & 0x03) << 8) | data[..., 2]
+
+        return codes, cls.code_voltages(codes)
+
+    @classmethod
+    def code_voltages(cls, codes=None):
+        """
+        Returns the voltages of raw 10 bits values (a NumPy array, or a
+        single value), computed like AnalogIn.voltage (16 bits value).
+        """
+        return (np.asarray(codes, dtype=np.float64) * 64) * (
+            cls.REFERENCE_VOLTAGE / 65535
+        )
+
+
+def _create_spi_bus():
+    """
+    Returns the (SPI bus, chip select) tuple of the MCP3008.
+    """
+    import board
+    import busio
+    import digitalio
+
+    spi = busio.SPI(clock=board.SCK, MISO=board.MISO, MOSI=board.MOSI)
+    cs = digitalio.DigitalInOut(board.D5)
+    cs.switch_to_output(value=True)
+
+    return spi, cs
+
+
+register_backend("mcp3008", HARDWARE, _create_spi_bus)
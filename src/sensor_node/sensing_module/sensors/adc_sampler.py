@@ -0,0 +1,155 @@
+import time
+import threading
+
+from collections import deque
+
+from ..sampler import PeriodicSampler
+
+
+class AdcSampler:
+    """
+    Background thread reading ADC channels at a fixed rate into per-channel
+    ring buffers, so a sensor reading is computed from the samples already
+    collected instead of sampling (and sleeping) on demand.
+
+    Attributes
+    ----------
+    interval : float
+        Seconds between samples of every channel.
+
+    window : float
+        Seconds of samples kept per channel. Older samples are not returned,
+        so a stalled sampler does not return stale values.
+
+    ema_alpha : float
+        Smoothing factor (0 < ema_alpha <= 1) of an exponential moving
+        average kept per channel. None (or 0) disables it.
+
+    scan : function
+        Reads a list of channels at once, returning their values in the same
+        order (e.g. the raw values of ADC.scan). When informed, it is used
+        instead of the channels read functions.
+    """
+
+    # Exceptions of a failed channel read, the sampler keeps running
+    _READ_EXCEPTIONS = (OSError, RuntimeError, ValueError)
+
+    def __init__(self, interval=0.1, window=2.5, ema_alpha=None, scan=None):
+        if interval is None or interval <= 0:
+            raise ValueError("ADC sampling interval must be positive.")
+        if window is None or window < interval:
+            raise ValueError(
+                "ADC sampling window must be at least one sampling interval."
+            )
+        if ema_alpha and not 0 < ema_alpha <= 1:
+            raise ValueError("ADC EMA alpha must be in the (0, 1] range.")
+
+        self._interval = interval
+        self._window = window
+        self._ema_alpha = ema_alpha or None
+        self._scan = scan
+        self._buffer_size = int(round(window / interval))
+
+        # {channel: read function}, {channel: deque of (time, value)} and
+        # {channel: (time, moving average)}
+        self._channels = {}
+        self._buffers = {}
+        self._averages = {}
+        self._lock = threading.Lock()
+        self._sampler = PeriodicSampler(
+            name="adc", interval=interval, sample=self._sample
+        )
+        # Amount of failed channel reads
+        self.errors = 0
+
+    @property
+    def ema_enabled(self):
+        return self._ema_alpha is not None
+
+    def add_channel(self, channel=None, read_function=None):
+        """
+        Samples the channel with read_function (e.g. ADC.read_raw_value), or
+        with the scan function when informed.
+        """
+        if read_function is None and self._scan is None:
+            raise ValueError("ADC channel read function must be informed.")
+
+        with self._lock:
+            self._channels[channel] = read_function
+            self._buffers[channel] = deque(maxlen=self._buffer_size)
+            self._averages.pop(channel, None)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._sampler.stop()
+
+    def samples(self, channel=None):
+        """
+        Returns the channel values of the last window seconds, oldest first.
+        """
+        oldest = time.monotonic() - self._window
+        with self._lock:
+            return [
+                value
+                for sampled_at, value in self._buffers[channel]
+                if sampled_at >= oldest
+            ]
+
+    def ema(self, channel=None):
+        """
+        Returns the channel exponential moving average, None if disabled or
+        not updated in the last window seconds.
+        """
+        with self._lock:
+            average = self._averages.get(channel)
+
+        if average is None or time.monotonic() - average[0] > self._window:
+            return None
+
+        return average[1]
+
+    def _sample(self):
+        with self._lock:
+            channels = list(self._channels.items())
+
+        if not channels:
+            return
+
+        if self._scan is not None:
+            try:
+                values = self._scan([channel for channel, _read in channels])
+            except self._READ_EXCEPTIONS:
+                self.errors += 1
+                return
+
+            self._store(
+                [
+                    (channel, float(value))
+                    for (channel, _read), value in zip(channels, values)
+                ]
+            )
+            return
+
+        for channel, read_function in channels:
+            try:
+                self._store([(channel, read_function())])
+            except self._READ_EXCEPTIONS:
+                self.errors += 1
+
+    def _store(self, values=None):
+        """
+        Appends the (channel, value) samples to the channels buffers.
+        """
+        sampled_at = time.monotonic()
+        with self._lock:
+            for channel, value in values:
+                self._buffers[channel].append((sampled_at, value))
+                if self._ema_alpha is not None:
+                    average = self._averages.get(channel)
+                    if average is not None:
+                        value = self._ema_alpha * value + (
+                            1 - self._ema_alpha
+                        ) * average[1]
+                    self._averages[channel] = (sampled_at, value)
@@ -0,0 +1,70 @@
+import importlib
+
+from environs import Env
+
+
+# Load enviroment variables
+env = Env()
+env.read_env()
+
+
+# Backends of the sensor drivers: the real hardware, or deterministic
+# simulators (see the simulation module) to run the sensing module off a
+# Raspberry Pi
+HARDWARE = "hardware"
+SIMULATED = "simulated"
+
+# Drivers with swappable backends, and what their backends create:
+#   - "bme280": the BME280 I2C registers (address), see bme280.I2CRegisters;
+#   - "pms7003": an opened serial.Serial like object (port, timeout);
+#   - "mcp3008": the (SPI bus, chip select pin) tuple of the MCP3008;
+#   - "dht11": an Adafruit_DHT module like object.
+DRIVERS = ("bme280", "pms7003", "mcp3008", "dht11")
+
+# Modules registering a backend, imported when the backend is first used
+_BACKEND_MODULES = {SIMULATED: ".simulation"}
+
+# {(driver, backend): factory}
+_FACTORIES = {}
+
+
+def register_backend(driver=None, backend=None, factory=None):
+    """
+    Registers the factory function creating the driver backend handle.
+    """
+    if driver not in DRIVERS:
+        raise ValueError("Unknown sensor driver: {0}".format(driver))
+
+    _FACTORIES[(driver, backend)] = factory
+
+
+def backend_name(driver=None):
+    """
+    Returns the backend configured for the driver: <DRIVER>_BACKEND (e.g.
+    BME280_BACKEND), or SENSOR_BACKEND for every driver, "hardware" by
+    default.
+    """
+    return env.str(
+        "{0}_BACKEND".format(driver.upper()),
+        default=env.str("SENSOR_BACKEND", default=HARDWARE),
+    )
+
+
+def create_backend(driver=None, **kwargs):
+    """
+    Returns a new handle of the backend configured for the driver, created
+    with kwargs.
+    """
+    backend = backend_name(driver)
+
+    if (driver, backend) not in _FACTORIES and backend in _BACKEND_MODULES:
+        importlib.import_module(_BACKEND_MODULES[backend], __package__)
+
+    try:
+        factory = _FACTORIES[(driver, backend)]
+    except KeyError:
+        raise ValueError(
+            "No {0} backend for the {1} driver.".format(backend, driver)
+        )
+
+    return factory(**kwargs)
@@ -1,9 +1,13 @@
-import board
-from adafruit_bme280 import basic as adafruit_bme280
+import time
+import struct
+import threading
+
+from collections import namedtuple
 
 from environs import Env
 
 from .sensor import Sensor
+from .backends import HARDWARE, create_backend, register_backend
 
 
 # Load enviroment variables
@@ -20,11 +24,111 @@ class BME280Exception(Exception):
     pass
 
 
+# Temperature (degrees Celsius), humidity (%) and pressure (hPa) measured at
+# the same instant, taken_at is the time.monotonic() value of the measurement
+EnvironmentSnapshot = namedtuple(
+    "EnvironmentSnapshot", ["temperature", "humidity", "pressure", "taken_at"]
+)
+
+
+def compensate(
+    data=None, temp_calib=None, pressure_calib=None, humidity_calib=None
+):
+    """
+    Returns an EnvironmentSnapshot from the raw BME280 data registers, using
+    the sensor calibration coefficients (see read_calibration), with the
+    floating point compensation formulas of the Bosch BME280 datasheet.
+    """
+    # 20 bits pressure and temperature values, 16 bits humidity value
+    raw_pressure = ((data[0] << 16) | (data[1] << 8) | data[2]) / 16.0
+    raw_temperature = ((data[3] << 16) | (data[4] << 8) | data[5]) / 16.0
+    raw_humidity = float((data[6] << 8) | data[7])
+
+    # Temperature
+    var1 = (
+        raw_temperature / 16384.0 - temp_calib[0] / 1024.0
+    ) * temp_calib[1]
+    var2 = (
+        (raw_temperature / 131072.0 - temp_calib[0] / 8192.0)
+        * (raw_temperature / 131072.0 - temp_calib[0] / 8192.0)
+    ) * temp_calib[2]
+    t_fine = int(var1 + var2)
+    temperature = t_fine / 5120.0
+
+    # Pressure
+    var1 = float(t_fine) / 2.0 - 64000.0
+    var2 = var1 * var1 * pressure_calib[5] / 32768.0
+    var2 += var1 * pressure_calib[4] * 2.0
+    var2 = var2 / 4.0 + pressure_calib[3] * 65536.0
+    var3 = pressure_calib[2] * var1 * var1 / 524288.0
+    var1 = (var3 + pressure_calib[1] * var1) / 524288.0
+    var1 = (1.0 + var1 / 32768.0) * pressure_calib[0]
+    if not var1:
+        raise ArithmeticError(
+            "Invalid pressure, check the calibration registers."
+        )
+    pressure = 1048576.0 - raw_pressure
+    pressure = ((pressure - var2 / 4096.0) * 6250.0) / var1
+    var1 = pressure_calib[8] * pressure * pressure / 2147483648.0
+    var2 = pressure * pressure_calib[7] / 32768.0
+    pressure += (var1 + var2 + pressure_calib[6]) / 16.0
+    pressure /= 100
+
+    # Humidity
+    var1 = float(t_fine) - 76800.0
+    var2 = humidity_calib[3] * 64.0 + (humidity_calib[4] / 16384.0) * var1
+    var3 = raw_humidity - var2
+    var4 = humidity_calib[1] / 65536.0
+    var5 = 1.0 + (humidity_calib[2] / 67108864.0) * var1
+    var6 = 1.0 + (humidity_calib[5] / 67108864.0) * var1 * var5
+    var6 = var3 * var4 * (var5 * var6)
+    humidity = var6 * (1.0 - humidity_calib[0] * var6 / 524288.0)
+    humidity = min(100.0, max(0.0, humidity))
+
+    return EnvironmentSnapshot(
+        temperature=round(temperature, 3),
+        humidity=round(humidity, 3),
+        pressure=round(pressure, 3),
+        taken_at=time.monotonic(),
+    )
+
+
 class BME280(Sensor):
     """
     Class that represents the BME280 Sensor.
+
+    Temperature, humidity and pressure are read together by snapshot(), in a
+    single measurement and I2C burst read. The snapshot is cached for
+    BME280_SNAPSHOT_TTL seconds, so every consumer of a reading cycle (the
+    BME280 getters, the PMS7003 and MQ working conditions checks) shares
+    the same values without hitting the bus again.
+
+    The sensor registers are accessed directly (see the Bosch BME280
+    datasheet, section 5): each snapshot is a forced mode measurement (the
+    sensor sleeps between them), with x1 oversampling and no IIR filter.
     """
 
+    _CHIP_ID_REGISTER = 0xD0
+    _CHIP_ID = 0x60
+    _RESET_REGISTER = 0xE0
+    _RESET = 0xB6
+    # Seconds to wait after a reset, copying the calibration to registers
+    _RESET_TIME = 0.004
+    _CTRL_HUM_REGISTER = 0xF2
+    _STATUS_REGISTER = 0xF3
+    _CTRL_MEAS_REGISTER = 0xF4
+    _CONFIG_REGISTER = 0xF5
+    # Data registers burst: pressure (0xF7-0xF9), temperature (0xFA-0xFC)
+    # and humidity (0xFD-0xFE)
+    _DATA_REGISTER = 0xF7
+    _DATA_LENGTH = 8
+    # Status register "measuring" bit
+    _STATUS_MEASURING = 0x08
+    # Humidity oversampling (ctrl_hum), then temperature and pressure
+    # oversampling and forced mode (ctrl_meas)
+    _OVERSAMPLING_X1 = 0x01
+    _CTRL_MEAS_FORCE = (_OVERSAMPLING_X1 << 5) | (_OVERSAMPLING_X1 << 2) | 0x01
+
     def __init__(self):
         self._str_i2c_address = env.str("BME280_I2C_ADDRESS", default=None)
         self._i2c_address = None
@@ -40,24 +144,41 @@ class BME280(Sensor):
                 )
             )
 
-        self._local_sea_level = env.float(
-            "BME280_LOCAL_SEA_LEVEL", default=None
-        )
-        if self._local_sea_level is None:
-            raise ValueError(
-                "BME280: Necessary to inform location sea level pressure!"
-            )
+        self._snapshot_ttl = env.float("BME280_SNAPSHOT_TTL", default=1.0)
+        self._snapshot = None
+        # Readings may come from the sensing module worker threads
+        self._lock = threading.Lock()
 
-        self._i2c = board.I2C()
-        self._bme280 = adafruit_bme280.Adafruit_BME280_I2C(
-            i2c=self._i2c, address=self._i2c_address
-        )
-        self._bme280.sea_level_pressure = self._local_sea_level
-        print(
-            "BME280: Setting sea-level pressure as {0} hPa.".format(
-                self._local_sea_level
+        # I2C registers device and calibration coefficients, set up on first
+        # use (see _get_device)
+        self._device = None
+        self._calibration = None
+
+    def _get_device(self):
+        """
+        Returns the BME280 I2C registers device of the configured backend
+        (see backends), set up on the first call (called with the lock
+        held).
+        """
+        if self._device is None:
+            device = create_backend("bme280", address=self._i2c_address)
+            chip_id = device.read_register(self._CHIP_ID_REGISTER, 1)[0]
+            if chip_id != self._CHIP_ID:
+                raise ValueError(
+                    "BME280: Unexpected chip id 0x{:02x} at the i2c "
+                    "address.".format(chip_id)
+                )
+
+            device.write_register(self._RESET_REGISTER, self._RESET)
+            time.sleep(self._RESET_TIME)
+            self._calibration = read_calibration(device)
+            device.write_register(
+                self._CTRL_HUM_REGISTER, self._OVERSAMPLING_X1
             )
-        )
+            device.write_register(self._CONFIG_REGISTER, 0x00)
+            self._device = device
+
+        return self._device
 
     def calibrate(self):
         """
@@ -65,45 +186,144 @@ class BME280(Sensor):
         """
         print("BME280 not necessary to calibrate.")
 
-    def get_pressure(self):
+    def snapshot(self):
         """
-        Returns pressure in hectoPascals (hPa).
-        """
-        try:
+        Returns an EnvironmentSnapshot with the temperature, humidity and
+        pressure measured at the same instant.
 
-            return round(self._bme280.pressure, 3)
+        The last snapshot is returned while it is younger than
+        BME280_SNAPSHOT_TTL seconds.
+        """
+        with self._lock:
+            if (
+                self._snapshot is not None
+                and time.monotonic() - self._snapshot.taken_at
+                < self._snapshot_ttl
+            ):
+                return self._snapshot
 
-        except (OSError):
-            raise BME280Exception(
-                "I/O error: Problem reading BME280 sensor, communication \
+            try:
+                data = self._read_data_registers()
+                self._snapshot = self._compensate(data)
+            except (OSError, ValueError, ArithmeticError):
+                # ValueError: no sensor at the I2C address (device creation)
+                raise BME280Exception(
+                    "I/O error: Problem reading BME280 sensor, communication \
                                   error that is unlikely to re-occur \
-                                  (e.g. I2C (or SPI) connection glitch or wiring problem."
-            )
+                                  (e.g. I2C (or SPI) connection glitch \
+                                  or wiring problem."
+                )
 
-    def get_temperature(self):
-        """Returns temperature in degrees Celsius."""
-        try:
+            return self._snapshot
 
-            return round(self._bme280.temperature, 3)
+    def _read_data_registers(self):
+        """
+        Performs one measurement and returns the raw data registers, read in
+        a single burst.
+        """
+        device = self._get_device()
+        device.write_register(self._CTRL_MEAS_REGISTER, self._CTRL_MEAS_FORCE)
+        # Wait for conversion to complete
+        while (
+            device.read_register(self._STATUS_REGISTER, 1)[0]
+            & self._STATUS_MEASURING
+        ):
+            time.sleep(0.002)
 
-        except (OSError):
-            raise BME280Exception(
-                "I/O error: Problem reading BME280 sensor, communication \
-                                  error that is unlikely to re-occur \
-                                  (e.g. I2C (or SPI) connection glitch \
-                                  or wiring problem."
-            )
+        return device.read_register(self._DATA_REGISTER, self._DATA_LENGTH)
+
+    def _compensate(self, data=None):
+        """
+        Returns an EnvironmentSnapshot from the raw data registers, using the
+        sensor calibration coefficients.
+        """
+        return compensate(data, *self._calibration)
+
+    def get_pressure(self):
+        """
+        Returns pressure in hectoPascals (hPa).
+        """
+        return self.snapshot().pressure
+
+    def get_temperature(self):
+        """Returns temperature in degrees Celsius."""
+        return self.snapshot().temperature
 
     def get_humidity(self):
         """Returns humidity as a value between 0 and 100%."""
-        try:
+        return self.snapshot().humidity
 
-            return round(self._bme280.humidity, 3)
 
-        except (OSError):
-            raise BME280Exception(
-                "I/O error: Problem reading BME280 sensor, communication \
-                                  error that is unlikely to re-occur \
-                                  (e.g. I2C (or SPI) connection glitch \
-                                  or wiring problem."
-            )
+# Calibration registers: temperature (T1-T3) and pressure (P1-P9) words,
+# humidity H1 byte, then the H2-H6 words (H4 and H5 are 12 bits, sharing a
+# byte)
+_TEMPERATURE_PRESSURE_CALIBRATION = (0x88, struct.Struct("<HhhHhhhhhhhh"))
+_HUMIDITY_H1_CALIBRATION = 0xA1
+_HUMIDITY_CALIBRATION = (0xE1, struct.Struct("<hBbBbb"))
+
+
+def read_calibration(device=None):
+    """
+    Returns the (temperature, pressure, humidity) calibration coefficients
+    lists read from the device registers, as taken by compensate.
+    """
+    register, layout = _TEMPERATURE_PRESSURE_CALIBRATION
+    words = layout.unpack(bytes(device.read_register(register, layout.size)))
+    temp_calib = [float(word) for word in words[:3]]
+    pressure_calib = [float(word) for word in words[3:]]
+
+    register, layout = _HUMIDITY_CALIBRATION
+    h2, h3, e4, e5, e6, h6 = layout.unpack(
+        bytes(device.read_register(register, layout.size))
+    )
+    humidity_calib = [
+        float(device.read_register(_HUMIDITY_H1_CALIBRATION, 1)[0]),
+        float(h2),
+        float(h3),
+        float((e4 << 4) | (e5 & 0x0F)),
+        float((e6 << 4) | (e5 >> 4)),
+        float(h6),
+    ]
+
+    return temp_calib, pressure_calib, humidity_calib
+
+
+class I2CRegisters:
+    """
+    Registers of an I2C device (adafruit_bus_device I2CDevice): the BME280
+    hardware backend.
+    """
+
+    def __init__(self, i2c_device=None):
+        self._i2c_device = i2c_device
+
+    def read_register(self, register=None, length=None):
+        """
+        Returns length bytes (bytearray) read from register on.
+        """
+        buffer = bytearray(length)
+        with self._i2c_device as i2c:
+            i2c.write_then_readinto(bytes((register,)), buffer)
+
+        return buffer
+
+    def write_register(self, register=None, value=None):
+        """
+        Writes a byte value to register.
+        """
+        with self._i2c_device as i2c:
+            i2c.write(bytes((register, value)))
+
+
+def _create_i2c_registers(address=None):
+    """
+    Returns the BME280 I2CRegisters, importing the bus libraries and opening
+    the I2C bus. Raises a ValueError when no device answers at address.
+    """
+    import board
+    from adafruit_bus_device.i2c_device import I2CDevice
+
+    return I2CRegisters(I2CDevice(board.I2C(), address))
+
+
+register_backend("bme280", HARDWARE, _create_i2c_registers)
@@ -1,7 +1,3 @@
-import board
-import busio
-import adafruit_bmp280
-
 from environs import Env
 
 from .sensor import Sensor
@@ -27,6 +23,10 @@ class BMP280(Sensor):
     """
 
     def __init__(self):
+        # Imported only when a BMP280 is fitted
+        import board
+        import busio
+        import adafruit_bmp280
 
         self._i2c = busio.I2C(board.SCL, board.SDA)
         self._bmp_sensor = adafruit_bmp280.Adafruit_BMP280_I2C(i2c=self._i2c)
@@ -1,10 +1,9 @@
 import time
 
-import Adafruit_DHT
-
 from environs import Env
 
 from .sensor import Sensor
+from .backends import HARDWARE, create_backend, register_backend
 
 # Load enviroment variables
 env = Env()
@@ -25,7 +24,9 @@ class DHT11(Sensor):
     """
 
     def __init__(self):
-        self._sensor = Adafruit_DHT.DHT11
+        # Adafruit_DHT module of the configured backend (see backends)
+        self._driver = create_backend("dht11")
+        self._sensor = self._driver.DHT11
 
         self._pin = env.int("DHT11_PIN", default=None)
 
@@ -60,9 +61,21 @@ class DHT11(Sensor):
         """
 
         # (Can take up to 30 seconds)
-        humidity, _temperature = Adafruit_DHT.read_retry(self._sensor, self._pin)
+        humidity, _temperature = self._driver.read_retry(self._sensor, self._pin)
 
         if humidity is not None:
             return round(humidity, 3)
         else:
             raise DHT11Exception("Reading from DHT failed. Try again!")
+
+
+def _import_adafruit_dht():
+    """
+    Returns the Adafruit_DHT module, imported only when a DHT11 is fitted.
+    """
+    import Adafruit_DHT
+
+    return Adafruit_DHT
+
+
+register_backend("dht11", HARDWARE, _import_adafruit_dht)
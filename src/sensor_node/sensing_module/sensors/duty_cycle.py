@@ -0,0 +1,128 @@
+import time
+import threading
+
+
+class DutyCycle:
+    """
+    Puts a sensor to sleep between readings and wakes it up early enough to
+    finish its warm-up before the next scheduled reading.
+
+    Attributes
+    ----------
+    sleep : function
+        Puts the sensor to sleep.
+
+    wakeup : function
+        Wakes the sensor up.
+
+    warmup_time : float
+        Seconds the sensor needs after waking up to return stable data.
+
+    min_sleep_time : float
+        The sensor is kept awake when it would sleep less than these seconds.
+
+    clock : function
+        Monotonic clock, in seconds (time.monotonic).
+
+    timer_factory : function
+        Creates a timer calling a function after an interval, like
+        threading.Timer (default).
+    """
+
+    def __init__(
+        self,
+        sleep=None,
+        wakeup=None,
+        warmup_time=None,
+        min_sleep_time=10,
+        clock=time.monotonic,
+        timer_factory=threading.Timer,
+    ):
+        if sleep is None or wakeup is None:
+            raise ValueError("Sleep and wake up functions must be informed.")
+        if warmup_time is None or warmup_time < 0:
+            raise ValueError("Warm-up time must not be negative.")
+
+        self._sleep = sleep
+        self._wakeup = wakeup
+        self._warmup_time = warmup_time
+        self._min_sleep_time = min_sleep_time
+        self._clock = clock
+        self._timer_factory = timer_factory
+
+        self._lock = threading.RLock()
+        self._timer = None
+        # clock() of the last wake up, None while sleeping
+        self._awake_since = clock()
+        # Amount of sleep periods
+        self.cycles = 0
+
+    def is_sleeping(self):
+        return self._awake_since is None
+
+    def schedule(self, next_reading_at=None):
+        """
+        Puts the sensor to sleep until warmup_time seconds before
+        next_reading_at (clock time), unless the sleep would be too short.
+        """
+        with self._lock:
+            self._cancel_timer()
+
+            now = self._clock()
+            wakeup_in = next_reading_at - self._warmup_time - now
+            if wakeup_in < self._min_sleep_time:
+                self._wake()
+                return
+
+            if not self.is_sleeping():
+                self._sleep()
+                self._awake_since = None
+                self.cycles += 1
+
+            self._timer = self._timer_factory(wakeup_in, self._scheduled_wake)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def wait_until_ready(self):
+        """
+        Wakes the sensor up if sleeping (e.g. a reading before the schedule)
+        and waits for the rest of its warm-up.
+        """
+        with self._lock:
+            self._cancel_timer()
+            self._wake()
+            remaining = self._warmup_time - (self._clock() - self._awake_since)
+
+        if remaining > 0:
+            print(
+                "Sensor not warmed up yet, waiting {0:.1f} seconds...".format(
+                    remaining
+                )
+            )
+            time.sleep(remaining)
+
+    def cancel(self):
+        """
+        Cancels the scheduled wake up, the sensor stays as it is.
+        """
+        with self._lock:
+            self._cancel_timer()
+
+    def _scheduled_wake(self):
+        with self._lock:
+            self._timer = None
+            try:
+                self._wake()
+            except Exception as error:
+                # Retried by wait_until_ready before the reading
+                print("Failed to wake up the sensor: ", error)
+
+    def _wake(self):
+        if self.is_sleeping():
+            self._wakeup()
+            self._awake_since = self._clock()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
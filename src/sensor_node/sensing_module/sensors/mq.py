@@ -5,10 +5,13 @@
 #   http://davidegironi.blogspot.com/2017/05/mq-gas-sensor-correlation-function.html#.XdyM5R-YXKa
 import time
 
+import numpy as np
+
 from environs import Env
 
 from .sensor import Sensor
 from .adc import ADC
+from .ro_store import record_age
 
 # Load enviroment variables
 env = Env()
@@ -35,10 +38,6 @@ class MQSensor(Sensor):
     VCC = 5.0
     # Raspberry maximum input volta (in Volts)
     VCC_PI_INPUT_MAX = 3.3
-    # Preheat time in seconds, usually 30 minutes
-    PREHEAT_TIME = env.int("MQ_PREHEAT_TIME", default=None)
-    if PREHEAT_TIME is None:
-        raise ValueError("MQ_PREHEAT_TIME must be declared.")
 
     ######################### Software Related Macros #########################
     # Defines the amount of samples to be used during the calibration phase.
@@ -72,6 +71,12 @@ class MQSensor(Sensor):
         Creates a MQ sensor instance.
         """
 
+        # Preheat time in seconds, usually 30 minutes (read when a MQ sensor
+        # is created, so the module imports without MQ configs)
+        self.PREHEAT_TIME = env.int("MQ_PREHEAT_TIME", default=None)
+        if self.PREHEAT_TIME is None:
+            raise ValueError("MQ_PREHEAT_TIME must be declared.")
+
         if NAME is None:
             raise ValueError("NAME value must be declared")
         if R1 is None:
@@ -123,6 +128,13 @@ class MQSensor(Sensor):
 
         #### ADC ####
         self._adc = ADC(pin_adc=MQ_ADC_PIN)  # ADC channel (MCP3008)
+        self.MQ_ADC_PIN = MQ_ADC_PIN
+        # Background ADC sampler (see attach_sampler), when used
+        self._adc_sampler = None
+        # Calibrations store (see attach_ro_store), when used, and
+        # time.monotonic() of the last refresh_ro without a store
+        self._ro_store = None
+        self._ro_refreshed_at = None
 
         #### RASPBERRY VOLTAGE DIVIDER (from circuit values) ####
         self.R1 = R1  # 10kOhms
@@ -151,9 +163,55 @@ class MQSensor(Sensor):
         # maximum concentration sensibility of gas sensor
         self.MAX_CONCENTRATION = MAX_CONCENTRATION
 
+        # Sensor resistance (RS) by ADC raw value (see _build_rs_table)
+        self._rs_table = None
+        self._build_rs_table()
+
         # RO_CLEAN_AIR = Gas sensor resistance in clean air
         self.RO_CLEAN_AIR = RO_CLEAN_AIR
 
+    def _build_rs_table(self):
+        """
+        Builds the table mapping each ADC raw value (1024 values of the
+        MCP3008) to the sensor resistance (RS), so a sample (or a NumPy
+        array of samples) is converted with an indexed lookup. The RS of the
+        0 value (0V, invalid) is NaN.
+
+        Only RS is tabulated: the gas concentration is calculated from the
+        RS average of the samples (see _measure_current_gas_concentration).
+        """
+        self._rs_table = self._rs_from_voltages(
+            ADC.code_voltages(np.arange(ADC.CODES))
+        )
+
+    def _rs_from_voltages(self, VPIN=None):
+        """
+        Returns the sensor resistance (RS) of VPIN voltages (a NumPy array,
+        or a single value), NaN for 0V (see _read_RS).
+        """
+        VPIN = np.asarray(VPIN, dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            VOUT = ((self.R1 + self.R2) / self.R2) * VPIN
+            RS = (self.VCC / VOUT - 1.0) * self.RL_VALUE
+
+        return np.where(np.isfinite(RS), RS, np.nan)
+
+    def rs_from_codes(self, codes=None):
+        """
+        Returns the sensor resistance (RS) of ADC raw values (a NumPy array,
+        or a single value).
+
+        Raises a MQSensorException when a value is 0 (VPIN of 0V).
+        """
+        rs = self._rs_table[codes]
+        if np.isnan(rs).any():
+            raise MQSensorException(
+                "ZeroDivisionError: Failed to read MQ sensor, VPIN returned 0V, check wiring!"
+            )
+
+        return rs
+
     def _read_RS(self):
         """Calculates the MQ sensor resistance (RS).
 
@@ -203,22 +261,77 @@ class MQSensor(Sensor):
         # In practice, VPIN should not be 0V).
         try:
 
-            # The voltage will be in the 0 - 3.3V range
-            VPIN = self._adc.read_voltage()
-            VOUT = ((self.R1 + self.R2) / self.R2) * VPIN
-            RS = (self.VCC / VOUT - 1.0) * self.RL_VALUE
-
-            return RS
+            # The raw value maps to the VPIN voltage in the 0 - 3.3V range
+            code = self._adc.read_raw_value()
 
-        except ZeroDivisionError:
+        except Exception:
             raise MQSensorException(
-                "ZeroDivisionError: Failed to read MQ sensor, VPIN returned 0V, check wiring!"
+                "Failed to read MQ sensor. Check wiring and parameter values!"
             )
+
+        return float(self.rs_from_codes(code))
+
+    def _calculate_RS(self, VPIN=None):
+        """
+        Returns the MQ sensor resistance (RS) for the VPIN voltage (see
+        _read_RS), with the formula of the RS table.
+        """
+        try:
+
+            RS = float(self._rs_from_voltages(VPIN))
+
         except Exception:
             raise MQSensorException(
                 "Failed to read MQ sensor. Check wiring and parameter values!"
             )
 
+        if RS != RS:
+            raise MQSensorException(
+                "ZeroDivisionError: Failed to read MQ sensor, VPIN returned 0V, check wiring!"
+            )
+
+        return RS
+
+    def attach_ro_store(self, store=None):
+        """
+        Saves the Ro calibrations in store (a RoStore) and uses the stored
+        Ro, if any, instead of the RO_CLEAN_AIR value declared.
+        """
+        self._ro_store = store
+
+        record = store.get(self._ro_store_key())
+        if record is not None:
+            self.RO_CLEAN_AIR = record["ro"]
+            print(
+                "Sensor {0} RO_CLEAN_AIR = {1} loaded from the store "
+                "(calibrated at {2}).".format(
+                    self.NAME, record["ro"], record["calibrated_at"]
+                )
+            )
+
+    def _ro_store_key(self):
+        return "{0}:{1}".format(self.NAME, self.MQ_ADC_PIN)
+
+    def _save_ro(self, current_humidity=None, current_temperature=None):
+        if self._ro_store is not None:
+            self._ro_store.save(
+                key=self._ro_store_key(),
+                ro=self.RO_CLEAN_AIR,
+                temperature=current_temperature,
+                relative_humidity=current_humidity,
+            )
+
+    def attach_sampler(self, sampler=None):
+        """
+        Samples the sensor ADC channel in the background with sampler (an
+        AdcSampler). The readings then use the samples already collected
+        instead of sampling and sleeping on demand.
+        """
+        sampler.add_channel(
+            channel=self.MQ_ADC_PIN, read_function=self._adc.read_raw_value
+        )
+        self._adc_sampler = sampler
+
     def calibrate_ro(self, current_humidity=None, current_temperature=None):
         """
         Returns to stdout the Ro value in clean air if the sensor is in working temperature and humidty range.
@@ -243,19 +356,23 @@ class MQSensor(Sensor):
             current_temperature=current_temperature,
         ):
 
-            rs = 0.0
-
-            for i in range(self.CALIBRATION_SAMPLES):
-                rs += self._read_RS()
-                time.sleep(self.CALIBRATION_SAMPLES_INTERVAL)
-
-            rs = rs / self.CALIBRATION_SAMPLES  # Calculate the readings average
+            rs = self._get_average_rs(
+                samples=self.CALIBRATION_SAMPLES,
+                samples_interval=self.CALIBRATION_SAMPLES_INTERVAL,
+            )
 
             ro = rs / self.RSRO_CLEAN_AIR  # Calculate RO value in clean air
             # RS/RO = RSRO_CLEAN_AIR => RO = RS/RSRO_CLEAN_AIR
             # RSRO_CLEAN_AIR is obtained from the datasheet
 
             ro = round(ro, 3)
+            # Used by the next readings and by the next runs, when there is a
+            # store
+            self.RO_CLEAN_AIR = ro
+            self._save_ro(
+                current_humidity=current_humidity,
+                current_temperature=current_temperature,
+            )
 
             print("Calibrating Ro in clean air...done!")
             print("{0} RO_CLEAN_AIR = {1}".format(self.NAME, ro))
@@ -268,22 +385,102 @@ class MQSensor(Sensor):
                 )
             )
 
-    def _get_average_rs(self):
+    def refresh_ro(
+        self,
+        current_humidity=None,
+        current_temperature=None,
+        alpha=0.1,
+        min_interval=86400,
+    ):
+        """
+        Incremental Ro calibration, to be called when the air is detected
+        as clean: moves the Ro towards the one measured now by the alpha
+        factor (exponential moving average), at most once every
+        min_interval seconds (since the stored calibration), and saves it.
+
+        Returns the new Ro, or None when not refreshed.
+        """
+        if not self._check_working_conditions(
+            current_humidity=current_humidity,
+            current_temperature=current_temperature,
+        ):
+            return None
+
+        age = None
+        if self._ro_store is not None:
+            age = record_age(self._ro_store.get(self._ro_store_key()))
+        elif self._ro_refreshed_at is not None:
+            age = time.monotonic() - self._ro_refreshed_at
+        if age is not None and age < min_interval:
+            return None
+
+        measured_ro = self._get_average_rs() / self.RSRO_CLEAN_AIR
+        if self.RO_CLEAN_AIR is None:
+            ro = measured_ro
+        else:
+            ro = (1 - alpha) * self.RO_CLEAN_AIR + alpha * measured_ro
+
+        self.RO_CLEAN_AIR = round(ro, 3)
+        self._ro_refreshed_at = time.monotonic()
+        self._save_ro(
+            current_humidity=current_humidity,
+            current_temperature=current_temperature,
+        )
+        print(
+            "{0} RO_CLEAN_AIR = {1} (refreshed in clean air)".format(
+                self.NAME, self.RO_CLEAN_AIR
+            )
+        )
+
+        return self.RO_CLEAN_AIR
+
+    def _get_average_rs(self, samples=None, samples_interval=None):
         """
         Returns the average gas sensor resistence (RS). The amount of samples to be used during the reading phase.
         is defined by the constant READING_MODE_SAMPLES.
+
+        With a background ADC sampler, returns immediately the RS of the
+        samples already collected (window average, or moving average). Only
+        samples on demand when the sampler has no recent sample.
         """
+        if self._adc_sampler is not None:
+            rs = self._get_sampled_rs()
+            if rs is not None:
+                return rs
+
+        if samples is None:
+            samples = self.READING_MODE_SAMPLES
+        if samples_interval is None:
+            samples_interval = self.READING_MODE_SAMPLES_INTERVAL
 
         rs = 0.0
 
-        for i in range(self.READING_MODE_SAMPLES):
+        for i in range(samples):
             rs += self._read_RS()
-            time.sleep(self.READING_MODE_SAMPLES_INTERVAL)
+            time.sleep(samples_interval)
 
-        rs = rs / self.READING_MODE_SAMPLES  # Calculate the readings average
+        rs = rs / samples  # Calculate the readings average
 
         return rs
 
+    def _get_sampled_rs(self):
+        """
+        Returns the RS from the background ADC sampler values, None when
+        there is no recent sample.
+        """
+        if self._adc_sampler.ema_enabled:
+            code = self._adc_sampler.ema(self.MQ_ADC_PIN)
+            if code is None:
+                return None
+            # Moving average of the raw values, not an integer
+            return self._calculate_RS(float(ADC.code_voltages(code)))
+
+        codes = self._adc_sampler.samples(self.MQ_ADC_PIN)
+        if not codes:
+            return None
+
+        return float(np.mean(self.rs_from_codes(np.array(codes, dtype=int))))
+
     def calibrate(self):
         """
         The MQ sensors needs an warmup time before taking a reading, usually 30 minutes
@@ -353,6 +550,14 @@ class MQSensor(Sensor):
             return True
         return False
 
+    def measure_gas_concentration(self):
+        """
+        Returns the actual gas concentration measured by the sensor, without
+        checking the environment working conditions nor the sensor
+        sensibility range.
+        """
+        return self._measure_current_gas_concentration()
+
     def _measure_current_gas_concentration(self):
         """
         Returns the actual gas concentration calculated/measured by the sensor.
@@ -375,7 +580,12 @@ class MQSensor(Sensor):
 
         return round(gas_concentration, 3)
 
-    def get_reading(self, current_humidity=None, current_temperature=None):
+    def get_reading(
+        self,
+        current_humidity=None,
+        current_temperature=None,
+        gas_concentration=None,
+    ):
         """
         Returns the gas concentration measured. 
 
@@ -393,6 +603,10 @@ class MQSensor(Sensor):
 
         current_temperature: float
           Temperature in degrees Celsius.
+
+        gas_concentration: float
+          Gas concentration already measured with measure_gas_concentration.
+          When None, the gas concentration is measured now.
         """
         # Check if parameters were informed
         if current_humidity is None:
@@ -400,7 +614,8 @@ class MQSensor(Sensor):
         if current_temperature is None:
             raise ValueError("Temperature value must be informed")
 
-        gas_concentration = self._measure_current_gas_concentration()
+        if gas_concentration is None:
+            gas_concentration = self._measure_current_gas_concentration()
 
         if self._check_working_conditions(
             current_humidity=current_humidity,
@@ -85,7 +85,12 @@ class MQ131(MQSensor):
             current_temperature=current_temperature,
         )
 
-    def get_ozone(self, current_humidity=None, current_temperature=None):
+    def get_ozone(
+        self,
+        current_humidity=None,
+        current_temperature=None,
+        gas_concentration=None,
+    ):
         """
         Returns the ozone value in µg/m³ units. 
 
@@ -103,6 +108,10 @@ class MQ131(MQSensor):
 
         current_temperature: float
           Temperature in degrees Celsius.
+
+        gas_concentration: float
+          Gas concentration already measured with measure_gas_concentration.
+          When None, the gas concentration is measured now.
         """
 
         #  To convert ppm or ppb to µg/m³ in 1 atm (= 1013.2051 hectPa = 760 mmHg) and 25°C
@@ -128,6 +137,7 @@ class MQ131(MQSensor):
         ozone_ppb = super().get_reading(
             current_humidity=current_humidity,
             current_temperature=current_temperature,
+            gas_concentration=gas_concentration,
         )
 
         if ozone_ppb is not None:
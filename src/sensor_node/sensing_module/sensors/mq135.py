@@ -80,7 +80,10 @@ class MQ135(MQSensor):
         )
 
     def get_carbon_monoxide(
-        self, current_humidity=None, current_temperature=None
+        self,
+        current_humidity=None,
+        current_temperature=None,
+        gas_concentration=None,
     ):
         """
         Returns the carbon monoxide value in ppm units. 
@@ -99,8 +102,13 @@ class MQ135(MQSensor):
 
         current_temperature: float
           Temperature in degrees Celsius.
+
+        gas_concentration: float
+          Gas concentration already measured with measure_gas_concentration.
+          When None, the gas concentration is measured now.
         """
         return super().get_reading(
             current_humidity=current_humidity,
             current_temperature=current_temperature,
+            gas_concentration=gas_concentration,
         )
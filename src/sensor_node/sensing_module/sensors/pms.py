@@ -1,9 +1,9 @@
 import time
 
 from environs import Env
-from pms7003 import Pms7003Sensor, PmsSensorException
-
 from .sensor import Sensor
+from .pms_uart import PmsUart, PmsFrameReader, PmsSensorException
+from .duty_cycle import DutyCycle
 
 
 # Load enviroment variables
@@ -14,6 +14,16 @@ env.read_env()
 class PMS7003(Sensor):
     """
     Class representing a PMS7003 sensor.
+
+    A background thread continuously reads the frames the sensor streams
+    (about one per second) into a ring buffer of PMS7003_BUFFER_SIZE frames,
+    so a reading returns immediately: the latest frame values, or their
+    average over the last PMS7003_AVERAGE_WINDOW seconds.
+
+    In duty-cycle mode (PMS7003_DUTY_CYCLE_ENABLED) the sensor is in passive
+    mode instead: a reading requests a single frame, then the sensor sleeps
+    (fan and laser off) and is woken up PMS7003_CALIBRATION_TIME seconds
+    before the next scheduled reading (see schedule_next_reading).
     """
 
     def __init__(self):
@@ -48,19 +58,58 @@ class PMS7003(Sensor):
         if self._MAX_TEMPERATURE is None:
             raise ValueError("PMS7003_MAX_TEMPERATURE value must be declared")
 
+        # Frames buffering: amount of frames kept, window (in seconds) of
+        # the frames averaged in a reading (0 uses only the latest frame) and
+        # max age (in seconds) of the latest frame for a valid reading
+        self._BUFFER_SIZE = env.int("PMS7003_BUFFER_SIZE", default=60)
+        self._AVERAGE_WINDOW = env.float("PMS7003_AVERAGE_WINDOW", default=0)
+        self._MAX_FRAME_AGE = env.float("PMS7003_MAX_FRAME_AGE", default=5)
+
+        if self._AVERAGE_WINDOW < 0:
+            raise ValueError("PMS7003_AVERAGE_WINDOW must not be negative")
+        if self._MAX_FRAME_AGE <= 0:
+            raise ValueError("PMS7003_MAX_FRAME_AGE must be positive")
+
+        # Duty cycle: the sensor is kept awake when it would sleep less than
+        # PMS7003_MIN_SLEEP_TIME seconds between readings
+        self._DUTY_CYCLE_ENABLED = env.bool(
+            "PMS7003_DUTY_CYCLE_ENABLED", default=False
+        )
+        self._MIN_SLEEP_TIME = env.float("PMS7003_MIN_SLEEP_TIME", default=10)
+
         # Creates a sensor instance
-        self._pms_sensor = Pms7003Sensor(self._UART_SERIAL_ADDRESS)
+        self._uart = PmsUart(port=self._UART_SERIAL_ADDRESS)
+        self._reader = PmsFrameReader(
+            uart=self._uart, buffer_size=self._BUFFER_SIZE
+        )
+        self._duty_cycle = None
+        if self._DUTY_CYCLE_ENABLED:
+            self._duty_cycle = DutyCycle(
+                sleep=self._uart.sleep,
+                wakeup=self._uart.wakeup,
+                warmup_time=self._CALIBRATION_TIME,
+                min_sleep_time=self._MIN_SLEEP_TIME,
+            )
 
     def calibrate(self):
         """
         The PMS7003 sensor needs 30 seconds initialization before returning stable data.
         """
+        if self._duty_cycle is not None:
+            # The sensor may have been left sleeping by a previous run
+            self._uart.wakeup()
+            self._uart.set_passive_mode()
+        else:
+            self._reader.start()
+
         print(
             "Calibrating Sensor PMS7003 ({0} seconds)...".format(
                 self._CALIBRATION_TIME
             )
         )
         time.sleep(self._CALIBRATION_TIME)
+        # Discards the frames received during the initialization
+        self._reader.clear()
         print(
             "Calibrating Sensor PMS7003 ({0} seconds)... done!".format(
                 self._CALIBRATION_TIME
@@ -103,8 +152,75 @@ class PMS7003(Sensor):
             return True
         return False
 
+    def read_particulate_matter(self):
+        """
+        Returns a dict containing all the values measured by the PMS7003,
+        without checking the environment working conditions. Values are
+        averaged over the frames of the last PMS7003_AVERAGE_WINDOW seconds,
+        or taken from the latest frame.
+
+        The dict also has the amount of frames used ('samples') and the age
+        in seconds of the latest one ('age').
+
+        In duty-cycle mode, waits for the sensor warm-up if it was not woken
+        up early enough, then requests a frame.
+
+        Raises an exception when there is a problem in the communication with sensor to get a reading.
+        """
+        if self._duty_cycle is not None:
+            self._duty_cycle.wait_until_ready()
+            reading = self._uart.request_frame()
+            reading["samples"] = 1
+            reading["age"] = 0
+
+            return reading
+
+        self._reader.start()
+
+        frames = self._reader.frames(
+            max_age=max(self._AVERAGE_WINDOW, self._MAX_FRAME_AGE)
+        )
+        if not frames or frames[-1][0] > self._MAX_FRAME_AGE:
+            raise PmsSensorException(
+                "Problem reading PMS7003 sensor, no valid frame received in \
+                the last {0} seconds (e.g. serial connection glitch). \
+                Prevents from returning corrupt measurements.".format(
+                    self._MAX_FRAME_AGE
+                )
+            )
+
+        if self._AVERAGE_WINDOW > 0:
+            frames = [
+                frame for frame in frames if frame[0] <= self._AVERAGE_WINDOW
+            ] or frames[-1:]
+        else:
+            frames = frames[-1:]
+
+        reading = {
+            field: round(
+                sum(values[field] for _age, values in frames) / len(frames), 3
+            )
+            for field in frames[-1][1]
+        }
+        reading["samples"] = len(frames)
+        reading["age"] = round(frames[-1][0], 3)
+
+        return reading
+
+    def schedule_next_reading(self, next_reading_at=None):
+        """
+        In duty-cycle mode, puts the sensor to sleep until its warm-up for
+        the reading at next_reading_at (time.monotonic() value) must start.
+        Otherwise, does nothing.
+        """
+        if self._duty_cycle is not None:
+            self._duty_cycle.schedule(next_reading_at=next_reading_at)
+
     def get_particulate_matter(
-        self, current_humidity=None, current_temperature=None
+        self,
+        current_humidity=None,
+        current_temperature=None,
+        particulate_matter=None,
     ):
         """
         Returns a dict containing the particulate matter values measured by the PMS7003.
@@ -113,6 +229,12 @@ class PMS7003(Sensor):
         Return None for both parameters when the sensor is out of environment working range.
 
         Raises an exception when there is a problem in the communication with sensor to get a reading.
+
+        Parameters
+        ----------
+        particulate_matter: Future
+          Optional pending read_particulate_matter call (concurrent.futures),
+          used instead of reading the sensor now.
         """
 
         if current_humidity is None:
@@ -120,24 +242,18 @@ class PMS7003(Sensor):
         if current_temperature is None:
             raise ValueError("PMS7003: Temperature value must be informed")
 
-        try:
-            reading = dict()
+        reading = dict()
 
-            # Initialize the parameters measured as None (invalid)
-            reading["pm2_5"] = None
-            reading["pm10"] = None
+        # Initialize the parameters measured as None (invalid)
+        reading["pm2_5"] = None
+        reading["pm10"] = None
 
-            if self._check_working_conditions(
-                current_humidity=current_humidity,
-                current_temperature=current_temperature,
-            ):
-                return self._pms_sensor.read()
-            else:
-                return reading
-
-        except PmsSensorException:
-            raise PmsSensorException(
-                "Problem reading PMS7003 sensor, communication error that is \
-                unlikely to re-occur(e.g. serial connection glitch). \
-                Prevents from returning corrupt measurements."
-            )
+        if self._check_working_conditions(
+            current_humidity=current_humidity,
+            current_temperature=current_temperature,
+        ):
+            if particulate_matter is not None:
+                return particulate_matter.result()
+            return self.read_particulate_matter()
+        else:
+            return reading
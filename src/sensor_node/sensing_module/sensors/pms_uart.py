@@ -0,0 +1,299 @@
+import time
+import struct
+import threading
+
+from collections import deque
+
+import serial
+
+from .backends import HARDWARE, create_backend, register_backend
+
+
+# Every PMS7003 frame starts with this sequence
+START_SEQUENCE = b"\x42\x4d"
+# Start sequence + frame length (2 bytes) + 13 data words + checksum
+FRAME_BYTES = 32
+FRAME_LENGTH = 28
+
+# Frame data words ('.' replaced by '_', same names of the pms7003 library):
+# PM concentrations (CF=1 and atmospheric environment, in µg/m³) and amount
+# of particles beyond a diameter (in 0.1 L of air).
+FRAME_FIELDS = (
+    "pm1_0cf1",
+    "pm2_5cf1",
+    "pm10cf1",
+    "pm1_0",
+    "pm2_5",
+    "pm10",
+    "n0_3",
+    "n0_5",
+    "n1_0",
+    "n2_5",
+    "n5_0",
+    "n10",
+)
+
+# Frame length + data words (12 fields and a reserved word) + checksum
+_FRAME_STRUCT = struct.Struct("!H12HHH")
+
+# Host commands: start sequence + command + data (2 bytes) + checksum
+# (2 bytes, sum of the previous bytes)
+_COMMAND_STRUCT = struct.Struct("!2sBHH")
+COMMAND_READ_PASSIVE = 0xE2
+COMMAND_CHANGE_MODE = 0xE1
+COMMAND_SLEEP = 0xE4
+MODE_PASSIVE = 0x0000
+MODE_ACTIVE = 0x0001
+SLEEP = 0x0000
+WAKEUP = 0x0001
+
+
+class PmsSensorException(Exception):
+    """
+    Implies a problem with sensor communication that is unlikely to re-occur
+    (e.g. serial connection glitch). Prevents from returning corrupt
+    measurements.
+    """
+
+
+class PmsSerialError(PmsSensorException):
+    """
+    The serial port failed (e.g. disconnected), not only a corrupt frame.
+    """
+
+
+class PmsUart:
+    """
+    Serial (UART) interface of the PMS7003 sensor.
+
+    Attributes
+    ----------
+    port : String
+        Serial port address (e.g. /dev/serial0).
+
+    serial_device : serial.Serial like object
+        Already opened serial device, used instead of opening port.
+    """
+
+    def __init__(self, port=None, serial_device=None, timeout=2):
+        if serial_device is None and port is None:
+            raise ValueError("PMS7003 serial port must be informed.")
+
+        self._port = port
+        self._timeout = timeout
+        # Opened on first use (see _get_serial)
+        self._serial = serial_device
+        self._lock = threading.Lock()
+
+    def _get_serial(self):
+        """
+        Returns the serial device of the configured backend (see backends),
+        opening the port on the first call.
+        """
+        with self._lock:
+            if self._serial is None:
+                self._serial = create_backend(
+                    "pms7003", port=self._port, timeout=self._timeout
+                )
+
+        return self._serial
+
+    def read_frame(self):
+        """
+        Returns a dict with the values of the next valid frame.
+
+        Resynchronizes on the start sequence, then raises a
+        PmsSensorException when the frame is truncated or its checksum does
+        not match.
+        """
+        try:
+            device = self._get_serial()
+            header = device.read_until(START_SEQUENCE)
+            if not header.endswith(START_SEQUENCE):
+                raise PmsSensorException("PMS7003: no frame received.")
+
+            body = device.read(FRAME_BYTES - len(START_SEQUENCE))
+        except serial.SerialException as error:
+            raise PmsSerialError("PMS7003: serial port error.", error)
+
+        if len(body) != FRAME_BYTES - len(START_SEQUENCE):
+            raise PmsSensorException("PMS7003: truncated frame.")
+
+        values = _FRAME_STRUCT.unpack(body)
+        if values[0] != FRAME_LENGTH:
+            raise PmsSensorException("PMS7003: invalid frame length.")
+        if values[-1] != sum(START_SEQUENCE) + sum(body[:-2]):
+            raise PmsSensorException("PMS7003: invalid frame checksum.")
+
+        return dict(zip(FRAME_FIELDS, values[1:13]))
+
+    def write_command(self, command=None, data=0):
+        """
+        Sends a host command to the sensor. Discards the bytes received
+        before the command, including the answers of previous commands.
+        """
+        checksum = sum(START_SEQUENCE) + command + (data >> 8) + (data & 0xFF)
+
+        try:
+            device = self._get_serial()
+            device.reset_input_buffer()
+            device.write(
+                _COMMAND_STRUCT.pack(START_SEQUENCE, command, data, checksum)
+            )
+            device.flush()
+        except serial.SerialException as error:
+            raise PmsSerialError("PMS7003: serial port error.", error)
+
+    def set_passive_mode(self):
+        """
+        The sensor only sends a frame when requested (see request_frame).
+        """
+        self.write_command(COMMAND_CHANGE_MODE, MODE_PASSIVE)
+
+    def set_active_mode(self):
+        """
+        The sensor streams a frame about every second (default mode).
+        """
+        self.write_command(COMMAND_CHANGE_MODE, MODE_ACTIVE)
+
+    def sleep(self):
+        """
+        Stops the sensor fan and laser.
+        """
+        self.write_command(COMMAND_SLEEP, SLEEP)
+
+    def wakeup(self):
+        """
+        Starts the sensor fan and laser, it needs a warm-up time before
+        returning stable data.
+        """
+        self.write_command(COMMAND_SLEEP, WAKEUP)
+
+    def request_frame(self):
+        """
+        Requests a frame in passive mode and returns its values.
+        """
+        self.write_command(COMMAND_READ_PASSIVE)
+
+        return self.read_frame()
+
+    def close(self):
+        if self._serial is not None:
+            self._serial.close()
+
+
+def _open_serial_port(port=None, timeout=None):
+    """
+    Returns the opened serial port of the sensor.
+    """
+    # Values according to product data manual
+    return serial.Serial(
+        port=port,
+        baudrate=9600,
+        bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=timeout,
+    )
+
+
+register_backend("pms7003", HARDWARE, _open_serial_port)
+
+
+class PmsFrameReader:
+    """
+    Background thread continuously reading the PMS7003 frames into a
+    fixed-size ring buffer.
+
+    In active mode the sensor streams a frame about every second, so the
+    latest values are always available without waiting on the serial port.
+
+    Attributes
+    ----------
+    uart : PmsUart
+        The sensor serial interface.
+
+    buffer_size : int
+        Amount of frames kept, the oldest ones are discarded.
+    """
+
+    # Seconds to wait before reading again after a serial port failure
+    _ERROR_BACKOFF = 1.0
+
+    def __init__(self, uart=None, buffer_size=60):
+        if uart is None:
+            raise ValueError("PMS7003 serial interface must be informed.")
+        if buffer_size < 1:
+            raise ValueError("Frame buffer size must be a positive integer.")
+
+        self._uart = uart
+        # (time.monotonic() of reception, frame values) tuples
+        self._frames = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # Amount of invalid frames or serial errors
+        self.errors = 0
+
+    def start(self):
+        """
+        Starts the reader thread, if not running yet.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pms7003-reader", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the reader thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def clear(self):
+        """
+        Discards the buffered frames.
+        """
+        with self._lock:
+            self._frames.clear()
+
+    def frames(self, max_age=None):
+        """
+        Returns a list of (age in seconds, frame values) tuples, oldest first.
+        Only frames younger than max_age seconds are returned, when informed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            frames = list(self._frames)
+
+        return [
+            (now - received_at, values)
+            for received_at, values in frames
+            if max_age is None or now - received_at <= max_age
+        ]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                values = self._uart.read_frame()
+            except PmsSerialError:
+                self.errors += 1
+                self._stop.wait(self._ERROR_BACKOFF)
+                continue
+            except PmsSensorException:
+                # Garbage or corrupt frame: resynchronizes on the next one
+                self.errors += 1
+                continue
+
+            with self._lock:
+                self._frames.append((time.monotonic(), values))
@@ -0,0 +1,123 @@
+import os
+import json
+import datetime
+import tempfile
+import threading
+
+
+class RoStore:
+    """
+    On-disk store (JSON file) of the MQ sensors clean-air resistance (Ro)
+    calibrations, so they are reused across restarts.
+
+    Records are keyed by sensor name and ADC pin (e.g. "MQ-135:0"):
+
+        {"MQ-135:0": {"ro": 1890.88, "calibrated_at": "2020-...-03:00",
+                      "temperature": 25.1, "relative_humidity": 61.2}}
+
+    The file is replaced atomically on every save, so a power loss leaves
+    either the previous or the new calibrations.
+
+    Attributes
+    ----------
+    path : String
+        JSON file path, created on the first save.
+    """
+
+    def __init__(self, path=None):
+        if not path:
+            raise ValueError("Ro store path must be informed.")
+
+        self._path = path
+        self._lock = threading.Lock()
+        self._records = self._load()
+
+    def get(self, key=None):
+        """
+        Returns the record (a dict) of the key, None if not calibrated.
+        """
+        with self._lock:
+            record = self._records.get(key)
+
+        return dict(record) if record is not None else None
+
+    def save(
+        self, key=None, ro=None, temperature=None, relative_humidity=None
+    ):
+        """
+        Saves the Ro of the key, measured now at the temperature and
+        relative humidity informed. Returns the saved record.
+        """
+        record = {
+            "ro": ro,
+            "calibrated_at": (
+                datetime.datetime.now()
+                .astimezone()
+                .replace(microsecond=0)
+                .isoformat()
+            ),
+            "temperature": temperature,
+            "relative_humidity": relative_humidity,
+        }
+
+        with self._lock:
+            self._records[key] = record
+            self._write(self._records)
+
+        return dict(record)
+
+    def _load(self):
+        """
+        Returns the stored records. A missing or corrupt file is reported
+        and starts an empty store.
+        """
+        try:
+            with open(self._path) as store_file:
+                records = json.load(store_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as error:
+            print(
+                "Failed to load the Ro store {0}: ".format(self._path), error
+            )
+            return {}
+
+        if not isinstance(records, dict):
+            print("Invalid Ro store {0}, ignored.".format(self._path))
+            return {}
+
+        return records
+
+    def _write(self, records=None):
+        """
+        Writes the records to a temporary file, then replaces the store.
+        """
+        directory = os.path.dirname(os.path.abspath(self._path))
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=directory, prefix=".ro_store.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(file_descriptor, "w") as store_file:
+                json.dump(records, store_file, indent=2, sort_keys=True)
+                store_file.flush()
+                os.fsync(store_file.fileno())
+            os.replace(temporary_path, self._path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+
+def record_age(record=None):
+    """
+    Returns the seconds since the record calibration, None when unknown.
+    """
+    try:
+        calibrated_at = datetime.datetime.fromisoformat(
+            record["calibrated_at"]
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return (
+        datetime.datetime.now().astimezone() - calibrated_at
+    ).total_seconds()
@@ -0,0 +1,532 @@
+"""
+Deterministic simulators of the sensors hardware, registered as the
+"simulated" backend (see backends): SENSOR_BACKEND=simulated runs the
+sensing module off a Raspberry Pi, e.g. to benchmark it or to replay
+recorded conditions.
+
+Each simulator stands in for the lowest layer of its driver (the BME280 I2C
+registers, the PMS7003 serial port, the MCP3008 SPI bus and the Adafruit_DHT
+module), so the drivers code runs unchanged. Measured values come from:
+    - a trace file (SIMULATION_TRACE_PATH), JSON lines with the reading
+      fields (e.g. {"temperature": 25.1, "relative_humidity": 61.2,
+      "pressure": 1009.2, "pm25": 12, "pm10": 20, "adc0": 511}, "pm1_0"
+      and "adc<channel>" raw values included), replayed in a loop; readings
+      stored by the node can be replayed as they are;
+    - seeded random walks (SIMULATION_SEED), for the fields missing in the
+      trace or without a trace.
+
+Every bus transaction takes SIMULATION_LATENCY seconds and fails with a
+SIMULATION_ERROR_RATE probability: OSError for the BME280 and MCP3008, a
+corrupt frame (PmsSensorException) for the PMS7003 and no reading for the
+DHT11.
+"""
+import json
+import time
+import errno
+import random
+import threading
+
+from environs import Env
+
+from .backends import SIMULATED, register_backend
+from .bme280 import (
+    BME280,
+    compensate,
+    _TEMPERATURE_PRESSURE_CALIBRATION,
+    _HUMIDITY_H1_CALIBRATION,
+    _HUMIDITY_CALIBRATION,
+)
+from .pms_uart import (
+    START_SEQUENCE,
+    FRAME_LENGTH,
+    _FRAME_STRUCT,
+    _COMMAND_STRUCT,
+    COMMAND_READ_PASSIVE,
+    COMMAND_CHANGE_MODE,
+    COMMAND_SLEEP,
+    MODE_PASSIVE,
+    SLEEP,
+)
+
+
+# Load enviroment variables
+env = Env()
+env.read_env()
+
+SEED = env.int("SIMULATION_SEED", default=0)
+LATENCY = env.float("SIMULATION_LATENCY", default=0.0)
+ERROR_RATE = env.float("SIMULATION_ERROR_RATE", default=0.0)
+TRACE_PATH = env.str("SIMULATION_TRACE_PATH", default="")
+PMS7003_FRAME_INTERVAL = env.float(
+    "SIMULATION_PMS7003_FRAME_INTERVAL", default=1.0
+)
+
+# Random walks of the fields without trace values:
+# {field: (initial value, step standard deviation, min, max)}
+NOISE_MODELS = {
+    "temperature": (25.0, 0.05, -10.0, 45.0),
+    "relative_humidity": (60.0, 0.2, 10.0, 95.0),
+    "pressure": (1008.0, 0.05, 950.0, 1050.0),
+    "pm1_0": (8.0, 0.3, 0.0, 300.0),
+    "pm25": (12.0, 0.5, 0.0, 500.0),
+    "pm10": (20.0, 0.8, 0.0, 600.0),
+    "adc": (512.0, 2.0, 0.0, 1023.0),
+}
+
+
+class RandomWalk:
+    """
+    Value moving by a normally distributed step on each call, kept in the
+    [minimum, maximum] range.
+    """
+
+    def __init__(
+        self, rng=None, value=None, step=None, minimum=None, maximum=None
+    ):
+        self._random = rng
+        self.value = value
+        self._step = step
+        self._minimum = minimum
+        self._maximum = maximum
+
+    def next(self):
+        self.value = min(
+            self._maximum,
+            max(self._minimum, self.value + self._random.gauss(0, self._step)),
+        )
+
+        return self.value
+
+
+def load_trace(path=None):
+    """
+    Returns the rows (dicts) of a JSON lines trace file.
+    """
+    with open(path) as trace_file:
+        return [json.loads(line) for line in trace_file if line.strip()]
+
+
+class Simulator:
+    """
+    Base of the simulators: the noise, latency, errors and trace of one
+    simulated device.
+
+    Attributes
+    ----------
+    name : String
+        Device name, seeds its random generators, so each device draws the
+        same values on every run whatever the other devices do.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self._random = random.Random("{0}:{1}".format(SEED, name))
+        # Errors are drawn apart, so the values do not depend on the rate
+        self._errors_random = random.Random(
+            "{0}:{1}:errors".format(SEED, name)
+        )
+        self._trace = load_trace(TRACE_PATH) if TRACE_PATH else []
+        # {fields: next trace row index} and {field: RandomWalk}
+        self._cursors = {}
+        self._walks = {}
+        # Amount of injected errors
+        self.errors = 0
+
+    def transaction(self):
+        """
+        Simulates a bus transaction: waits the latency, then returns True
+        when it must fail.
+        """
+        if LATENCY > 0:
+            time.sleep(LATENCY)
+
+        if ERROR_RATE > 0 and self._errors_random.random() < ERROR_RATE:
+            self.errors += 1
+            return True
+
+        return False
+
+    def next_values(self, fields=()):
+        """
+        Returns a dict with the next values of the fields, measured
+        together: from the next trace row, or their random walks.
+        """
+        row = {}
+        if self._trace:
+            index = self._cursors.get(fields, 0)
+            row = self._trace[index]
+            self._cursors[fields] = (index + 1) % len(self._trace)
+
+        values = {}
+        for field in fields:
+            if row.get(field) is not None:
+                values[field] = float(row[field])
+            else:
+                values[field] = self._walk(field).next()
+
+        return values
+
+    def _walk(self, field=None):
+        if field not in self._walks:
+            model = NOISE_MODELS["adc" if field.startswith("adc") else field]
+            self._walks[field] = RandomWalk(self._random, *model)
+
+        return self._walks[field]
+
+
+class SimulatedBME280(Simulator):
+    """
+    Stands in for the BME280 I2C registers: the chip id, the calibration
+    registers of the coefficients below, the status register and the data
+    registers burst, encoded with those coefficients.
+    """
+
+    # Calibration coefficients of the Bosch datasheet example (temperature
+    # and pressure), with typical humidity ones (H1 to H6)
+    _temp_calib = [27504, 26435, -1000]
+    _pressure_calib = [36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000]
+    _humidity_calib = [75, 362, 0, 315, 50, 30]
+
+    _FIELDS = ("temperature", "relative_humidity", "pressure")
+
+    def __init__(self, address=None):
+        super().__init__("bme280")
+        self.address = address
+        # {register: value} written by the driver (e.g. the ctrl_meas mode)
+        self.written = {}
+        # The registers read by the BME280 class but the data ones, which
+        # are measured when read (the status is never measuring)
+        h1, h2, h3, h4, h5, h6 = self._humidity_calib
+        self._registers_map = {BME280._CHIP_ID_REGISTER: BME280._CHIP_ID}
+        self._registers_map.update(
+            enumerate(
+                _TEMPERATURE_PRESSURE_CALIBRATION[1].pack(
+                    *(self._temp_calib + self._pressure_calib)
+                ),
+                _TEMPERATURE_PRESSURE_CALIBRATION[0],
+            )
+        )
+        self._registers_map[_HUMIDITY_H1_CALIBRATION] = h1
+        # H4 and H5 are 12 bits, sharing the nibbles of a byte
+        shared = (h4 & 0x0F) | (h5 & 0x0F) << 4
+        self._registers_map.update(
+            enumerate(
+                _HUMIDITY_CALIBRATION[1].pack(
+                    h2, h3, h4 >> 4, shared, h5 >> 4, h6
+                ),
+                _HUMIDITY_CALIBRATION[0],
+            )
+        )
+
+    def read_register(self, register=None, length=None):
+        """
+        Returns length bytes read from register on, the data registers
+        (pressure, temperature and humidity) measured in a bus transaction.
+        """
+        if register != BME280._DATA_REGISTER:
+            return bytearray(
+                self._registers_map.get(register + offset, 0x00)
+                for offset in range(length)
+            )
+
+        if self.transaction():
+            raise OSError(errno.EIO, "Simulated BME280 I2C error")
+
+        values = self.next_values(self._FIELDS)
+
+        return bytearray(
+            self.encode(
+                values["temperature"],
+                values["relative_humidity"],
+                values["pressure"],
+            )[:length]
+        )
+
+    def write_register(self, register=None, value=None):
+        self.written[register] = value
+
+    def encode(self, temperature=None, humidity=None, pressure=None):
+        """
+        Returns the raw data registers measuring the values, found by
+        bisection of the compensation formulas.
+        """
+        raw_temperature = self._search(
+            lambda raw: self._compensate(0, raw, 0).temperature, temperature
+        )
+        raw_pressure = self._search(
+            lambda raw: -self._compensate(raw, raw_temperature, 0).pressure,
+            -pressure,
+        )
+        raw_humidity = self._search(
+            lambda raw: self._compensate(0, raw_temperature, raw).humidity,
+            humidity,
+            bits=16,
+        )
+
+        return self._registers(raw_pressure, raw_temperature, raw_humidity)
+
+    def _compensate(self, raw_pressure=0, raw_temperature=0, raw_humidity=0):
+        return compensate(
+            self._registers(raw_pressure, raw_temperature, raw_humidity),
+            self._temp_calib,
+            self._pressure_calib,
+            self._humidity_calib,
+        )
+
+    @staticmethod
+    def _search(function=None, target=None, bits=20):
+        """
+        Returns the smallest raw value where the increasing function reaches
+        the target.
+        """
+        low, high = 0, (1 << bits) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if function(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    @staticmethod
+    def _registers(raw_pressure=0, raw_temperature=0, raw_humidity=0):
+        """
+        Returns the data registers of 20 bits pressure and temperature and
+        16 bits humidity raw values.
+        """
+        return [
+            raw_pressure >> 12,
+            (raw_pressure >> 4) & 0xFF,
+            (raw_pressure & 0x0F) << 4,
+            raw_temperature >> 12,
+            (raw_temperature >> 4) & 0xFF,
+            (raw_temperature & 0x0F) << 4,
+            raw_humidity >> 8,
+            raw_humidity & 0xFF,
+        ]
+
+
+class SimulatedPmsSerial(Simulator):
+    """
+    Stands in for the PMS7003 serial port: streams a frame every
+    SIMULATION_PMS7003_FRAME_INTERVAL seconds in active mode, answers the
+    passive read, change mode and sleep commands.
+    """
+
+    _FIELDS = ("pm1_0", "pm25", "pm10")
+
+    def __init__(self, port=None, timeout=None):
+        super().__init__("pms7003")
+        self.port = port
+        self.timeout = timeout
+        self.is_open = True
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._active = True
+        self._sleeping = False
+        self._next_frame_at = time.monotonic() + PMS7003_FRAME_INTERVAL
+
+    def read(self, size=1):
+        self._wait(lambda buffer: len(buffer) >= size)
+        with self._lock:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+
+        return data
+
+    def read_until(self, expected=b"\n", size=None):
+        self._wait(lambda buffer: expected in buffer)
+        with self._lock:
+            end = self._buffer.find(expected)
+            end = len(self._buffer) if end < 0 else end + len(expected)
+            data = bytes(self._buffer[:end])
+            del self._buffer[:end]
+
+        return data
+
+    def write(self, data=None):
+        """
+        Runs the host commands in data.
+        """
+        self.transaction()
+        data = bytes(data)
+        with self._lock:
+            for offset in range(0, len(data), _COMMAND_STRUCT.size):
+                command = data[offset : offset + _COMMAND_STRUCT.size]
+                if len(command) == _COMMAND_STRUCT.size:
+                    self._run_command(*_COMMAND_STRUCT.unpack(command))
+
+        return len(data)
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._buffer.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    def _run_command(self, start=None, command=None, data=None, checksum=None):
+        expected = sum(START_SEQUENCE) + command + (data >> 8) + (data & 0xFF)
+        if start != START_SEQUENCE or checksum != expected:
+            return
+
+        if command == COMMAND_CHANGE_MODE:
+            self._active = data != MODE_PASSIVE
+            self._next_frame_at = time.monotonic() + PMS7003_FRAME_INTERVAL
+        elif command == COMMAND_SLEEP:
+            self._sleeping = data == SLEEP
+            self._next_frame_at = time.monotonic() + PMS7003_FRAME_INTERVAL
+        elif (
+            command == COMMAND_READ_PASSIVE
+            and not self._active
+            and not self._sleeping
+        ):
+            self._buffer += self._frame()
+
+    def _wait(self, ready=None):
+        """
+        Streams frames until ready(buffer) or the timeout.
+        """
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                streaming = self._active and not self._sleeping
+                if streaming and now >= self._next_frame_at:
+                    self._buffer += self._frame()
+                    self._next_frame_at = max(
+                        self._next_frame_at + PMS7003_FRAME_INTERVAL, now
+                    )
+                if ready(self._buffer):
+                    return
+                wake_at = self._next_frame_at if streaming else now + 0.1
+
+            if deadline is not None:
+                if now >= deadline:
+                    return
+                wake_at = min(wake_at, deadline)
+            time.sleep(max(0.0, wake_at - now))
+
+    def _frame(self):
+        """
+        Returns the next frame, its checksum is corrupt on injected errors.
+        """
+        values = self.next_values(self._FIELDS)
+        pm1_0 = int(round(values["pm1_0"]))
+        pm2_5 = max(pm1_0, int(round(values["pm25"])))
+        pm10 = max(pm2_5, int(round(values["pm10"])))
+        # Particles in 0.1 L of air, roughly proportional to the masses
+        counts = (
+            pm1_0 * 150,
+            pm1_0 * 45,
+            pm1_0 * 8,
+            pm2_5,
+            max(0, pm10 - pm2_5) // 2,
+            max(0, pm10 - pm2_5) // 8,
+        )
+        words = (FRAME_LENGTH, pm1_0, pm2_5, pm10, pm1_0, pm2_5, pm10)
+        # Data words, then the reserved word and the checksum
+        body = bytearray(_FRAME_STRUCT.pack(*(words + counts + (0, 0))))
+
+        checksum = sum(START_SEQUENCE) + sum(body[:-2])
+        if self.transaction():
+            checksum += 1
+        body[-2:] = (checksum & 0xFFFF).to_bytes(2, "big")
+
+        return START_SEQUENCE + bytes(body)
+
+
+class SimulatedSpiBus(Simulator):
+    """
+    Stands in for the MCP3008 SPI bus (busio.SPI): answers the single-ended
+    conversions of the channels.
+    """
+
+    def __init__(self):
+        super().__init__("mcp3008")
+        self._lock = threading.Lock()
+
+    def try_lock(self):
+        return self._lock.acquire(blocking=False)
+
+    def unlock(self):
+        self._lock.release()
+
+    def configure(self, **kwargs):
+        pass
+
+    def write_readinto(self, buffer_out=None, buffer_in=None):
+        if self.transaction():
+            raise OSError(errno.EIO, "Simulated MCP3008 SPI error")
+
+        if buffer_out[0] != 0x01 or not buffer_out[1] & 0x80:
+            raise ValueError("Only single-ended conversions are simulated.")
+
+        field = "adc{0}".format((buffer_out[1] >> 4) & 0x07)
+        code = int(round(self.next_values((field,))[field]))
+        buffer_in[0] = 0x00
+        buffer_in[1] = (code >> 8) & 0x03
+        buffer_in[2] = code & 0xFF
+
+
+class SimulatedPin:
+    """
+    Stands in for the MCP3008 chip select (digitalio.DigitalInOut).
+    """
+
+    def __init__(self):
+        self.value = True
+
+    def switch_to_output(self, value=False):
+        self.value = value
+
+
+class SimulatedDHT(Simulator):
+    """
+    Stands in for the Adafruit_DHT module. The DHT11 has a 1 unit
+    resolution.
+    """
+
+    DHT11 = 11
+
+    _FIELDS = ("relative_humidity", "temperature")
+
+    def __init__(self):
+        super().__init__("dht11")
+
+    def read(self, sensor=None, pin=None):
+        if self.transaction():
+            return None, None
+
+        values = self.next_values(self._FIELDS)
+
+        return (
+            float(round(values["relative_humidity"])),
+            float(round(values["temperature"])),
+        )
+
+    def read_retry(self, sensor=None, pin=None, retries=15, delay_seconds=2):
+        for _attempt in range(retries):
+            humidity, temperature = self.read(sensor, pin)
+            if humidity is not None and temperature is not None:
+                return humidity, temperature
+            time.sleep(delay_seconds)
+
+        return None, None
+
+
+def _create_spi_bus():
+    return SimulatedSpiBus(), SimulatedPin()
+
+
+register_backend("bme280", SIMULATED, SimulatedBME280)
+register_backend("pms7003", SIMULATED, SimulatedPmsSerial)
+register_backend("mcp3008", SIMULATED, _create_spi_bus)
+register_backend("dht11", SIMULATED, SimulatedDHT)
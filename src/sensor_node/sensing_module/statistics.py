@@ -0,0 +1,59 @@
+import math
+
+
+class RunningStatistics:
+    """
+    Streaming aggregates (count, mean, min, max and standard deviation) of a
+    series of values, updated in constant memory with Welford's algorithm.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.min = None
+        self.max = None
+        # Sum of the squared differences from the mean
+        self._m2 = 0.0
+
+    def add(self, value=None):
+        """
+        Adds a value to the series.
+        """
+        self.count += 1
+        if self.count == 1:
+            self.mean = float(value)
+            self.min = value
+            self.max = value
+            return
+
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def stddev(self):
+        """
+        Population standard deviation, None without values.
+        """
+        if self.count == 0:
+            return None
+
+        return math.sqrt(self._m2 / self.count)
+
+    def to_dict(self, digits=3):
+        """
+        Returns the aggregates in a dict, rounded to digits decimal places.
+        """
+
+        def _round(value):
+            return None if value is None else round(value, digits)
+
+        return {
+            "mean": _round(self.mean),
+            "min": _round(self.min),
+            "max": _round(self.max),
+            "stddev": _round(self.stddev),
+            "count": self.count,
+        }
@@ -1,6 +1,8 @@
-import time
+import asyncio
 import datetime
+import functools
 
+from concurrent.futures import ThreadPoolExecutor
 from environs import Env
 
 
@@ -12,6 +14,8 @@ from .communication_module.communication_module import (
     CommunicationModule,
     CommunicationModuleCreationError,
 )
+from .reading_queue import ReadingQueue, OVERFLOW_POLICIES
+from .scheduler import DeadlineScheduler
 
 
 # Load environment variables
@@ -50,8 +54,34 @@ class SensorNode:
                     "SENSOR_NODE_READING_INTERVAL must be provided."
                 )
 
+            # Readings taken at wall-clock multiples of the interval
+            self._align_readings = env.bool(
+                "SENSOR_NODE_ALIGN_READINGS", default=True
+            )
+
+            # Sensing pipeline configs: sensing and sending running as
+            # separated tasks joined by a bounded queue
+            self.pipeline_enabled = env.bool(
+                "SENSOR_NODE_PIPELINE_ENABLED", default=False
+            )
+            self._queue_size = env.int("SENSOR_NODE_QUEUE_SIZE", default=100)
+            self._queue_overflow_policy = env.str(
+                "SENSOR_NODE_QUEUE_OVERFLOW_POLICY", default="drop_oldest"
+            )
+
+            if self._queue_size < 1:
+                raise ValueError(
+                    "SENSOR_NODE_QUEUE_SIZE must be a positive integer."
+                )
+            if self._queue_overflow_policy not in OVERFLOW_POLICIES:
+                raise ValueError(
+                    "SENSOR_NODE_QUEUE_OVERFLOW_POLICY must be one of: "
+                    "{0}".format(", ".join(OVERFLOW_POLICIES))
+                )
+
             self.sensing_module = SensingModule()
             self.communication_module = CommunicationModule()
+            self.communication_module.check_node_id(node_id=self._uuid)
 
         except (
             ValueError,
@@ -69,7 +99,10 @@ class SensorNode:
         print("Initializing sensor node....")
 
         self.sensing_module.calibrate_sensors()
+        self.sensing_module.start_sampling()
 
+        # The sensors warm up in the background, the sensing mode reports
+        # the fields of the sensors already warm
         print("Initializing sensor node....done!")
 
     def sensing_mode(self):
@@ -79,43 +112,216 @@ class SensorNode:
         """
         print("Sensor node in sensing mode!")
 
-        started_at = (
-            datetime.datetime.now()
-            .astimezone()
-            .replace(microsecond=0)
-            .isoformat()
-        )
-        msg_sent = 0
-        read_total_tries = 0
-        read_success = 0
-        read_failure = 0
+        status = self._create_status()
+        scheduler = self._create_scheduler()
 
         while True:
-            read_total_tries += 1
+            scheduler.wait()
+
+            status["read_total_tries"] += 1
             current_reading = self.sensing_module.read_sensors()
+            # Duty-cycled sensors sleep until the next reading warm-up
+            self.sensing_module.schedule_next_reading(
+                next_reading_at=scheduler.next_deadline
+            )
 
             if current_reading is not None:
-                read_success += 1
-                payload = self._generate_sensor_node_reading_payload(
+                status["read_success"] += 1
+                status["msg_sent"] += self._send_reading(
                     reading=current_reading
                 )
-                message = self.communication_module.generate_message(
-                    payload=payload
+                status["msg_pending"] = (
+                    self.communication_module.pending_messages()
                 )
-                self.communication_module.send_message(message=message)
-                msg_sent += 1
             else:
-                read_failure += 1
+                status["read_failure"] += 1
+                # Sends the current batch if it is too old
+                status["msg_sent"] += self.communication_module.flush_batch()
+
+            self._update_schedule_status(status, scheduler)
+            self._print_status(status)
+
+    async def async_sensing_mode(self):
+        """
+        Asyncio version of the sensing mode.
+
+        Sensors acquisition and DTN delivery run as separated tasks joined by
+        a bounded queue, so a slow (or reconnecting) IBRDTN daemon does not
+        delay the next readings. When the queue is full, the configured
+        overflow policy is applied.
+        """
+        print("Sensor node in sensing mode (pipeline)!")
+
+        status = self._create_status()
+        queue = ReadingQueue(
+            maxsize=self._queue_size,
+            overflow_policy=self._queue_overflow_policy,
+        )
+
+        # Sensors and daemon API calls are blocking, each task gets its own
+        # worker thread so one does not wait for the other.
+        sensing_executor = ThreadPoolExecutor(max_workers=1)
+        sending_executor = ThreadPoolExecutor(max_workers=1)
+
+        try:
+            await asyncio.gather(
+                self._produce_readings(
+                    queue=queue, status=status, executor=sensing_executor
+                ),
+                self._consume_readings(
+                    queue=queue, status=status, executor=sending_executor
+                ),
+            )
+        finally:
+            sensing_executor.shutdown(wait=False)
+            sending_executor.shutdown(wait=False)
+
+    async def _produce_readings(self, queue=None, status=None, executor=None):
+        """
+        Producer task: takes a reading every reading interval and puts it in
+        the queue.
+        """
+        loop = asyncio.get_event_loop()
+        scheduler = self._create_scheduler()
+
+        while True:
+            await scheduler.async_wait()
+
+            status["read_total_tries"] += 1
+            current_reading = await loop.run_in_executor(
+                executor, self.sensing_module.read_sensors
+            )
+            await loop.run_in_executor(
+                executor,
+                functools.partial(
+                    self.sensing_module.schedule_next_reading,
+                    next_reading_at=scheduler.next_deadline,
+                ),
+            )
+
+            if current_reading is not None:
+                status["read_success"] += 1
+                await queue.put(current_reading)
+            else:
+                status["read_failure"] += 1
 
-            print("-------STATUS--------\n")
-            print("Started at: {0}".format(started_at))
-            print("Total readings tries: {0} \n".format(read_total_tries))
-            print("Success reading: {0} \n".format(read_success))
-            print("Failure reading: {0} \n".format(read_failure))
-            print("Total messages sent over dtn: {0}\n".format(msg_sent))
-            print("---------------------\n")
+            status["msg_dropped"] = queue.dropped
+            status["msg_queued"] = queue.qsize()
+            self._update_schedule_status(status, scheduler)
+            self._print_status(status)
 
-            self._wait_time_interval_next_reading()
+    async def _consume_readings(self, queue=None, status=None, executor=None):
+        """
+        Consumer task: sends the queued readings over DTN, in order.
+        """
+        loop = asyncio.get_event_loop()
+
+        while True:
+            try:
+                reading = await asyncio.wait_for(
+                    queue.get(), timeout=self._reading_interval
+                )
+            except asyncio.TimeoutError:
+                # No readings for a while: sends the current batch if it is
+                # too old and retries the messages kept in the outbox
+                status["msg_sent"] += await loop.run_in_executor(
+                    executor, self.communication_module.flush_batch
+                )
+                continue
+
+            try:
+                status["msg_sent"] += await loop.run_in_executor(
+                    executor,
+                    functools.partial(self._send_reading, reading=reading),
+                )
+                status["msg_pending"] = (
+                    self.communication_module.pending_messages()
+                )
+            finally:
+                queue.task_done()
+
+    def _send_reading(self, reading=None):
+        """
+        Submits the reading payload to be sent over DTN. Readings may be
+        grouped in batches by the communication module.
+
+        Returns the amount of messages delivered to the IBRDTN daemon.
+        """
+        payload = self._generate_sensor_node_reading_payload(reading=reading)
+
+        return self.communication_module.submit_payload(payload=payload)
+
+    def _create_status(self):
+        """
+        Returns a dict with the sensing mode counters.
+        """
+        return {
+            "started_at": (
+                datetime.datetime.now()
+                .astimezone()
+                .replace(microsecond=0)
+                .isoformat()
+            ),
+            "read_total_tries": 0,
+            "read_success": 0,
+            "read_failure": 0,
+            "msg_sent": 0,
+            "msg_queued": 0,
+            "msg_pending": 0,
+            "msg_dropped": 0,
+            "slots_late": 0,
+            "slots_missed": 0,
+        }
+
+    def _create_scheduler(self):
+        """
+        Returns the scheduler of the readings, every reading interval.
+        """
+        return DeadlineScheduler(
+            interval=self._reading_interval, align=self._align_readings
+        )
+
+    def _update_schedule_status(self, status=None, scheduler=None):
+        """
+        Copies the scheduler counters to the sensing mode counters.
+        """
+        status["slots_late"] = scheduler.late
+        status["slots_missed"] = scheduler.missed
+
+    def _print_status(self, status=None):
+        """
+        Prints the sensing mode counters.
+        """
+        print("-------STATUS--------\n")
+        print("Started at: {0}".format(status["started_at"]))
+        print(
+            "Total readings tries: {0} \n".format(status["read_total_tries"])
+        )
+        print("Success reading: {0} \n".format(status["read_success"]))
+        print("Failure reading: {0} \n".format(status["read_failure"]))
+        print(
+            "Readings late / missed (overrun): {0} / {1}\n".format(
+                status["slots_late"], status["slots_missed"]
+            )
+        )
+        print(
+            "Total messages sent over dtn: {0}\n".format(status["msg_sent"])
+        )
+        print(
+            "Messages waiting in outbox: {0}\n".format(status["msg_pending"])
+        )
+        if self.pipeline_enabled:
+            print(
+                "Messages waiting in queue: {0}\n".format(
+                    status["msg_queued"]
+                )
+            )
+            print(
+                "Messages dropped (queue full): {0}\n".format(
+                    status["msg_dropped"]
+                )
+            )
+        print("---------------------\n")
 
     def _generate_sensor_node_reading_payload(self, reading=None):
         """
@@ -138,10 +344,3 @@ class SensorNode:
         }
 
         return payload
-
-    def _wait_time_interval_next_reading(self):
-        """
-        Delay execution for a fixed time interval before take a new sensor node
-        reading.
-        """
-        time.sleep(self._reading_interval)
@@ -0,0 +1,89 @@
+"""
+Outbox: messages kept across restarts, replayed in order and bounded by
+max_messages.
+
+Usage (from the src directory):
+
+    python -m pytest tests
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from sensor_node.communication_module.message import Message
+from sensor_node.communication_module.outbox import Outbox
+
+
+def message(number=None, custody=None):
+    """
+    Returns a message whose JSON payload has the number.
+    """
+    return Message(
+        payload=json.dumps({"number": number}), custody=custody, lifetime=60
+    )
+
+
+def numbers(entries=None):
+    """
+    Returns the numbers of the (id, Message) entries, in order.
+    """
+    return [json.loads(entry.payload)["number"] for _id, entry in entries]
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix="outbox-")
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "outbox.sqlite3")
+
+    def open_outbox(self, max_messages=100):
+        outbox = Outbox(path=self.path, max_messages=max_messages)
+        self.addCleanup(outbox.close)
+        return outbox
+
+    def test_append(self):
+        outbox = self.open_outbox()
+
+        self.assertEqual(outbox.append(message=message(1, custody=True)), 0)
+        outbox.append(message=message(2))
+
+        self.assertEqual(len(outbox), 2)
+        (_id, first), (_id, second) = outbox.peek(limit=10)
+        self.assertEqual(first.payload, json.dumps({"number": 1}))
+        self.assertTrue(first.custody)
+        self.assertEqual(first.lifetime, 60)
+        self.assertIsNone(second.custody)
+
+    def test_replay_order_after_reopening(self):
+        outbox = Outbox(path=self.path, max_messages=100)
+        for number in range(5):
+            outbox.append(message=message(number))
+        delivered_id, _message = outbox.peek()[0]
+        outbox.remove(message_id=delivered_id)
+        outbox.close()
+
+        outbox = self.open_outbox()
+        outbox.append(message=message(5))
+
+        self.assertEqual(len(outbox), 5)
+        self.assertEqual(numbers(outbox.peek(limit=2)), [1, 2])
+        self.assertEqual(numbers(outbox.peek(limit=10)), [1, 2, 3, 4, 5])
+
+    @mock.patch("builtins.print")
+    def test_trims_oldest_at_max_messages(self, _print):
+        outbox = self.open_outbox(max_messages=3)
+
+        discarded = [
+            outbox.append(message=message(number)) for number in range(5)
+        ]
+
+        self.assertEqual(discarded, [0, 0, 0, 1, 1])
+        self.assertEqual(len(outbox), 3)
+        self.assertEqual(numbers(outbox.peek(limit=10)), [2, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,253 @@
+"""
+Payload codecs: readings encoded and decoded back by every codec, with and
+without compression.
+
+Usage (from the src directory):
+
+    python -m pytest tests
+"""
+import unittest
+
+import numpy as np
+
+from sensor_node.communication_module.payload_codec import (
+    BinaryPayloadCodec,
+    ColumnarPayloadCodec,
+    PayloadCodecError,
+    ZlibPayloadCodec,
+    create_payload_codec,
+    decode_payload,
+)
+
+
+NODE_ID = "4c4bbd3a-5b27-4b45-bf1b-0f4e2f7b1c2a"
+
+
+def reading_payload(collected_at="2026-10-17T20:45:06-03:00", **values):
+    """
+    Returns a reading payload of the node, with values replacing the
+    default reading fields.
+    """
+    reading = {
+        "pm25": 12.5,
+        "pm10": 20.0,
+        "temperature": 25.12,
+        "relative_humidity": 61.2,
+        "pressure": 1009.25,
+    }
+    reading.update(values)
+    reading["collected_at"] = collected_at
+
+    return {"sensor_node": {"id": NODE_ID}, "reading": reading}
+
+
+def series(count=None):
+    """
+    Returns count reading payloads a minute apart, with negative
+    temperatures and some None fields.
+    """
+    return [
+        reading_payload(
+            collected_at="2026-10-17T20:{:02d}:06-03:00".format(index),
+            pm25=None if index % 3 == 0 else 10.0 + index,
+            temperature=-5.0 + index * 0.75,
+            relative_humidity=None,
+        )
+        for index in range(count)
+    ]
+
+
+class BinaryPayloadCodecTest(unittest.TestCase):
+    def test_round_trip(self):
+        codec = BinaryPayloadCodec()
+        payloads = series(10)
+
+        self.assertEqual(codec.decode(codec.encode(payloads)), payloads)
+
+    def test_out_of_range_values_sent_as_none(self):
+        codec = BinaryPayloadCodec()
+        payloads = [
+            reading_payload(
+                pm25=7000.0, temperature=float("nan"), pressure=-1.0
+            )
+        ]
+
+        reading = codec.decode(codec.encode(payloads))[0]["reading"]
+
+        self.assertIsNone(reading["pm25"])
+        self.assertIsNone(reading["temperature"])
+        self.assertIsNone(reading["pressure"])
+        self.assertEqual(reading["pm10"], 20.0)
+
+    def test_gases_schema(self):
+        codec = BinaryPayloadCodec()
+        payloads = [reading_payload(carbon_monoxide=700.0, ozone=None)]
+
+        data = codec.encode(payloads)
+
+        self.assertEqual(data[1], 2)
+        self.assertEqual(codec.decode(data), payloads)
+
+
+class ColumnarPayloadCodecTest(unittest.TestCase):
+    def setUp(self):
+        self.codec = ColumnarPayloadCodec()
+
+    def test_varints_round_trip(self):
+        values = np.array(
+            [0, 1, 127, 128, 300, 2 ** 35, 2 ** 63, 2 ** 64 - 1],
+            dtype=np.uint64,
+        )
+
+        data = self.codec._encode_varints(values)
+        decoded, position = self.codec._decode_varints(
+            np.frombuffer(data + b"\xff", dtype=np.uint8), 0, len(values)
+        )
+
+        self.assertEqual(data[:6], b"\x00\x01\x7f\x80\x01\xac")
+        self.assertEqual(decoded.tolist(), values.tolist())
+        self.assertEqual(position, len(data))
+
+    def test_truncated_varints(self):
+        buffer = np.frombuffer(b"\x80\x80", dtype=np.uint8)
+
+        with self.assertRaises(PayloadCodecError):
+            self.codec._decode_varints(buffer, 0, 1)
+
+    def test_column_negative_deltas(self):
+        values = np.array([100, 90, 95, -5, -400], dtype=np.int64)
+
+        data = self.codec._encode_column(values)
+        decoded, nulls, position = self.codec._decode_column(
+            np.frombuffer(data, dtype=np.uint8), 0, len(values)
+        )
+
+        # No flags, zigzag deltas 100, -10, 5, -100, -395
+        self.assertEqual(data[:5], b"\x00\xc8\x01\x13\x0a")
+        self.assertEqual(decoded.tolist(), values.tolist())
+        self.assertFalse(nulls.any())
+        self.assertEqual(position, len(data))
+
+    def test_column_nulls_and_constant(self):
+        values = np.array([7, 0, 7, 7, 0, 7, 7, 7, 7], dtype=np.int64)
+        nulls = np.array([False, True, False, False, True] + [False] * 4)
+
+        data = self.codec._encode_column(values, nulls)
+        decoded, decoded_nulls, _position = self.codec._decode_column(
+            np.frombuffer(data, dtype=np.uint8), 0, len(values)
+        )
+
+        # Null bitmap of 2 bytes, a single value stored
+        self.assertEqual(data, b"\x03\x12\x00\x0e")
+        self.assertEqual(decoded_nulls.tolist(), nulls.tolist())
+        self.assertEqual(decoded.tolist(), values.tolist())
+
+    def test_all_none_column(self):
+        values = np.zeros(3, dtype=np.int64)
+        nulls = np.ones(3, dtype=bool)
+
+        data = self.codec._encode_column(values, nulls)
+        decoded, decoded_nulls, position = self.codec._decode_column(
+            np.frombuffer(data, dtype=np.uint8), 0, 3
+        )
+
+        self.assertEqual(data, b"\x01\x07")
+        self.assertTrue(decoded_nulls.all())
+        self.assertEqual(decoded.tolist(), [0, 0, 0])
+        self.assertEqual(position, len(data))
+
+    def test_round_trip(self):
+        payloads = series(60)
+
+        self.assertEqual(
+            self.codec.decode(self.codec.encode(payloads)), payloads
+        )
+
+    def test_single_reading_round_trip(self):
+        payloads = series(1)
+
+        self.assertEqual(
+            self.codec.decode(self.codec.encode(payloads)), payloads
+        )
+
+    def test_out_of_range_values_sent_as_none(self):
+        payloads = [
+            reading_payload(pm25=float("inf"), pressure=1e300),
+            reading_payload(temperature=float("nan")),
+        ]
+
+        readings = [
+            payload["reading"]
+            for payload in self.codec.decode(self.codec.encode(payloads))
+        ]
+
+        self.assertIsNone(readings[0]["pm25"])
+        self.assertIsNone(readings[0]["pressure"])
+        self.assertEqual(readings[0]["temperature"], 25.12)
+        self.assertIsNone(readings[1]["temperature"])
+        self.assertEqual(readings[1]["pressure"], 1009.25)
+
+
+class StatisticsTest(unittest.TestCase):
+    def test_aggregated_readings_round_trip(self):
+        statistics = {
+            "temperature": {
+                "mean": -3.25,
+                "min": -3.5,
+                "max": -3.0,
+                "stddev": 0.25,
+                "count": 2,
+            },
+            "pm25": {
+                "mean": 12.5,
+                "min": 11.0,
+                "max": 14.0,
+                "stddev": 1.5,
+                "count": 2,
+            },
+        }
+        aggregated = reading_payload(
+            temperature=-3.25, statistics=statistics
+        )
+        payloads = [aggregated, reading_payload()]
+
+        for name in ("binary", "columnar"):
+            with self.subTest(codec=name):
+                codec = create_payload_codec(name=name)
+                data = codec.encode(payloads)
+
+                self.assertEqual(data[1], 3)
+                self.assertEqual(decode_payload(data), payloads)
+
+
+class ZlibPayloadCodecTest(unittest.TestCase):
+    def test_uncompressed_fallback_round_trip(self):
+        codec = create_payload_codec(name="binary", compression="zlib")
+        payloads = [reading_payload()]
+
+        data = codec.encode(payloads)
+
+        # Too small to be compressed: sent as the binary payload
+        self.assertEqual(data[0], BinaryPayloadCodec.CODEC_ID)
+        self.assertEqual(codec.decode(data), payloads)
+        self.assertEqual(decode_payload(data), payloads)
+
+    def test_columnar_round_trip(self):
+        codec = create_payload_codec(name="columnar", compression="zlib")
+        payloads = series(60)
+
+        self.assertEqual(decode_payload(codec.encode(payloads)), payloads)
+
+    def test_compressed_round_trip(self):
+        codec = create_payload_codec(name="json", compression="zlib")
+        payloads = [reading_payload() for _index in range(10)]
+
+        data = codec.encode(payloads)
+
+        self.assertEqual(data[0], ZlibPayloadCodec.CODEC_ID)
+        self.assertEqual(codec.decode(data), payloads)
+        self.assertEqual(decode_payload(data), payloads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+"""
+PMS7003 duty cycle: the sleep and wake up commands sent around the
+scheduled readings, with a fake serial device, clock and timers.
+
+Usage (from the src directory):
+
+    python -m pytest tests
+"""
+import os
+import functools
+import unittest
+from unittest import mock
+
+from sensor_node.sensing_module.sensors import pms, duty_cycle
+from sensor_node.sensing_module.sensors.pms_uart import (
+    PmsUart,
+    START_SEQUENCE,
+    FRAME_LENGTH,
+    _FRAME_STRUCT,
+    _COMMAND_STRUCT,
+    COMMAND_READ_PASSIVE,
+    COMMAND_SLEEP,
+    SLEEP,
+    WAKEUP,
+)
+
+
+CALIBRATION_TIME = 30
+MIN_SLEEP_TIME = 10
+
+ENVIRONMENT = {
+    "PMS7003_CALIBRATION_TIME": str(CALIBRATION_TIME),
+    "PMS7003_UART_SERIAL_ADDRESS": "/dev/null",
+    "PMS7003_MIN_HUMIDITY": "0",
+    "PMS7003_MAX_HUMIDITY": "100",
+    "PMS7003_MIN_TEMPERATURE": "-10",
+    "PMS7003_MAX_TEMPERATURE": "60",
+    "PMS7003_DUTY_CYCLE_ENABLED": "true",
+    "PMS7003_MIN_SLEEP_TIME": str(MIN_SLEEP_TIME),
+}
+
+
+class FakeClock:
+    """
+    Monotonic clock moved forward by the tests.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTimer:
+    """
+    threading.Timer like object, fired by the tests.
+    """
+
+    def __init__(self, interval=None, function=None):
+        self.interval = interval
+        self.function = function
+        self.daemon = False
+        self.started = False
+        self.cancelled = False
+
+    def start(self):
+        self.started = True
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeSerial:
+    """
+    serial.Serial like object recording the host commands in events, and
+    answering the passive read command with a frame.
+    """
+
+    def __init__(self, events=None):
+        self._events = events
+        self._frame = b""
+
+    def reset_input_buffer(self):
+        self._frame = b""
+
+    def write(self, data=None):
+        _start, command, value, _checksum = _COMMAND_STRUCT.unpack(data)
+        self._events.append(("command", command, value))
+        if command == COMMAND_READ_PASSIVE:
+            words = (FRAME_LENGTH,) + tuple(range(12)) + (0,)
+            body = _FRAME_STRUCT.pack(*words, 0)[:-2]
+            checksum = sum(START_SEQUENCE) + sum(body)
+            self._frame = body + checksum.to_bytes(2, "big")
+
+    def flush(self):
+        pass
+
+    def read_until(self, expected=None):
+        return START_SEQUENCE if self._frame else b""
+
+    def read(self, size=1):
+        data, self._frame = self._frame[:size], self._frame[size:]
+        return data
+
+    def close(self):
+        pass
+
+
+class PmsDutyCycleTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.clock = FakeClock()
+        self.timers = []
+        serial_device = FakeSerial(events=self.events)
+
+        def timer_factory(interval=None, function=None):
+            timer = FakeTimer(interval=interval, function=function)
+            self.timers.append(timer)
+            return timer
+
+        def sleep(seconds=None):
+            self.events.append(("wait", seconds))
+            self.clock.now += seconds
+
+        patches = [
+            mock.patch.dict(os.environ, ENVIRONMENT),
+            mock.patch.object(
+                pms,
+                "PmsUart",
+                lambda port=None: PmsUart(serial_device=serial_device),
+            ),
+            mock.patch.object(
+                pms,
+                "DutyCycle",
+                functools.partial(
+                    duty_cycle.DutyCycle,
+                    clock=self.clock,
+                    timer_factory=timer_factory,
+                ),
+            ),
+            mock.patch.object(duty_cycle.time, "sleep", sleep),
+            # No "waiting" messages in the tests output
+            mock.patch("builtins.print"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.sensor = pms.PMS7003()
+        # Awake and warmed up since the start
+        self.clock.now = CALIBRATION_TIME
+
+    def _commands(self):
+        return [event[1:] for event in self.events if event[0] == "command"]
+
+    def test_sleeps_after_reading(self):
+        self.sensor.read_particulate_matter()
+        self.sensor.schedule_next_reading(next_reading_at=self.clock.now + 300)
+
+        self.assertEqual(
+            self._commands(),
+            [(COMMAND_READ_PASSIVE, 0), (COMMAND_SLEEP, SLEEP)],
+        )
+
+    def test_wakes_up_warmup_time_before_next_reading(self):
+        next_reading_at = self.clock.now + 300
+        self.sensor.read_particulate_matter()
+        self.sensor.schedule_next_reading(next_reading_at=next_reading_at)
+
+        self.assertEqual(len(self.timers), 1)
+        timer = self.timers[0]
+        self.assertTrue(timer.started)
+        self.assertEqual(
+            self.clock.now + timer.interval, next_reading_at - CALIBRATION_TIME
+        )
+
+        self.clock.now += timer.interval
+        timer.function()
+        self.assertEqual(self._commands()[-1], (COMMAND_SLEEP, WAKEUP))
+
+        # Warmed up at the scheduled reading: no wait
+        self.clock.now = next_reading_at
+        reading = self.sensor.read_particulate_matter()
+        self.assertEqual(reading["pm2_5"], 4)
+        self.assertNotIn("wait", [event[0] for event in self.events])
+
+    def test_no_sleep_below_min_sleep_time(self):
+        self.sensor.read_particulate_matter()
+        self.sensor.schedule_next_reading(
+            next_reading_at=(
+                self.clock.now + CALIBRATION_TIME + MIN_SLEEP_TIME - 1
+            )
+        )
+
+        self.assertEqual(self._commands(), [(COMMAND_READ_PASSIVE, 0)])
+        self.assertEqual(self.timers, [])
+
+    def test_early_reading_waits_until_warm(self):
+        self.sensor.read_particulate_matter()
+        self.sensor.schedule_next_reading(next_reading_at=self.clock.now + 300)
+
+        # Reading before the scheduled wake up
+        self.clock.now += 100
+        self.sensor.read_particulate_matter()
+
+        self.assertTrue(self.timers[0].cancelled)
+        self.assertEqual(
+            self.events[-3:],
+            [
+                ("command", COMMAND_SLEEP, WAKEUP),
+                ("wait", CALIBRATION_TIME),
+                ("command", COMMAND_READ_PASSIVE, 0),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
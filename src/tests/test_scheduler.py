@@ -0,0 +1,66 @@
+"""
+Deadline scheduler: cycles on a fixed grid, with a fake clock.
+
+Usage (from the src directory):
+
+    python -m pytest tests
+"""
+import unittest
+
+from sensor_node.scheduler import DeadlineScheduler
+
+
+class FakeClock:
+    """
+    Monotonic clock moved forward by the tests.
+    """
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class DeadlineSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_unaligned_first_cycle_starts_now(self):
+        scheduler = DeadlineScheduler(
+            interval=60, align=False, clock=self.clock
+        )
+        self.clock.now += 0.001
+
+        self.assertEqual(scheduler.advance(), (0.0, 0))
+        self.assertEqual(scheduler.late, 0)
+        self.assertEqual(scheduler.next_deadline, self.clock.now + 60)
+
+    def test_late_and_missed_cycles(self):
+        scheduler = DeadlineScheduler(
+            interval=60, align=False, clock=self.clock
+        )
+        scheduler.advance()
+
+        # The first cycle ran 10 seconds over the next deadline
+        self.clock.now += 70
+        self.assertEqual(scheduler.advance(), (0.0, 0))
+        # The second one ran over two slots
+        self.clock.now += 130
+        self.assertEqual(scheduler.advance(), (0.0, 1))
+
+        self.assertEqual(scheduler.late, 2)
+        self.assertEqual(scheduler.missed, 1)
+
+    def test_aligned_to_wall_clock(self):
+        scheduler = DeadlineScheduler(
+            interval=60, clock=self.clock, wall_clock=lambda: 1000.0
+        )
+
+        # Next wall-clock minute: 1020 seconds since epoch
+        self.assertEqual(scheduler.advance(), (20.0, 0))
+        self.assertEqual(scheduler.late, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()